@@ -0,0 +1,139 @@
+from __future__ import annotations
+from typing import Deque, Dict
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+import asyncio
+import math
+import os
+import time
+
+from .metrics import Counter, Gauge, Histogram
+
+# Admission control for model calls made inline by request handlers. At most
+# LLM_MAX_CONCURRENCY run at once; the rest wait in a bounded queue that is
+# served round-robin across users, so one learner retrying cannot crowd out
+# the others. Requests that cannot get a slot soon enough fail fast with
+# Overloaded, which the API turns into 429 + Retry-After.
+# Runs on the event loop only (no locks).
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "128"))
+LLM_MAX_QUEUE_WAIT_SECONDS = float(os.getenv("LLM_MAX_QUEUE_WAIT_SECONDS", "10"))
+LLM_MAX_PER_USER = int(os.getenv("LLM_MAX_PER_USER", "2"))
+
+admission_wait_seconds = Histogram("fluentz_llm_admission_wait_seconds", "Time requests waited for a model slot")
+admission_rejected = Counter("fluentz_llm_admission_rejected_total", "Requests turned away with 429",
+                             labels=("reason",))
+
+
+class Overloaded(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, max_queue: int = LLM_MAX_QUEUE,
+                 max_wait_seconds: float = LLM_MAX_QUEUE_WAIT_SECONDS, max_per_user: int = LLM_MAX_PER_USER):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.max_per_user = max_per_user
+        self._active = 0
+        self._queued = 0
+        self._per_user: Dict[int, int] = {}  # active + waiting
+        self._waiting: "OrderedDict[int, Deque[asyncio.Future]]" = OrderedDict()
+        self._hold_ema = 2.0  # seconds a slot is typically held
+
+    def active(self) -> int:
+        return self._active
+
+    def queued(self) -> int:
+        return self._queued
+
+    def retry_after(self) -> int:
+        waves = (self._queued + 1) / self.max_concurrency
+        return max(1, min(60, math.ceil(waves * self._hold_ema)))
+
+    def reject(self, reason: str) -> Overloaded:
+        admission_rejected.inc(reason=reason)
+        return Overloaded(reason, self.retry_after())
+
+    async def acquire(self, user_id: int) -> None:
+        if self._per_user.get(user_id, 0) >= self.max_per_user:
+            raise self.reject("per_user")
+        if self._active < self.max_concurrency and not self._queued:
+            self._active += 1
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+            admission_wait_seconds.observe(0.0)
+            return
+        if self._queued >= self.max_queue:
+            raise self.reject("queue_full")
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(user_id, deque()).append(fut)
+        self._queued += 1
+        self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(fut, self.max_wait_seconds)
+        except BaseException as e:
+            if fut.done() and not fut.cancelled():
+                self.release(user_id)  # granted just as we gave up
+            else:
+                self._drop_waiter(user_id, fut)
+            if isinstance(e, asyncio.TimeoutError):
+                raise self.reject("timeout")
+            raise
+        admission_wait_seconds.observe(time.monotonic() - started)
+
+    def release(self, user_id: int, held_seconds: float = 0.0) -> None:
+        self._active -= 1
+        self._forget(user_id)
+        if held_seconds:
+            self._hold_ema = 0.9 * self._hold_ema + 0.1 * held_seconds
+        # hand the slot to the next user in round-robin order
+        while self._waiting and self._active < self.max_concurrency:
+            uid, q = next(iter(self._waiting.items()))
+            fut = q.popleft()
+            if q:
+                self._waiting.move_to_end(uid)
+            else:
+                del self._waiting[uid]
+            self._queued -= 1
+            if fut.done():
+                continue
+            self._active += 1
+            fut.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, user_id: int):
+        await self.acquire(user_id)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(user_id, time.monotonic() - started)
+
+    def _drop_waiter(self, user_id: int, fut: asyncio.Future) -> None:
+        q = self._waiting.get(user_id)
+        if q is not None and fut in q:
+            q.remove(fut)
+            self._queued -= 1
+            if not q:
+                del self._waiting[user_id]
+        self._forget(user_id)
+
+    def _forget(self, user_id: int) -> None:
+        n = self._per_user.get(user_id, 0) - 1
+        if n > 0:
+            self._per_user[user_id] = n
+        else:
+            self._per_user.pop(user_id, None)
+
+
+admission = AdmissionController()
+
+Gauge("fluentz_llm_admission_in_flight", "Inline model calls holding a slot", fn=admission.active)
+Gauge("fluentz_llm_admission_queue_depth", "Requests waiting for a model slot", fn=admission.queued)
@@ -1,8 +1,152 @@
-import os, json
-from openai import OpenAI
+import re, json, asyncio, time
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple, TypeVar
+
+from .metrics import Counter, Gauge, Histogram
+from .llm_cache import llm_cache
+from .llm_client import llm_client, llm_calls, MODEL
+
+assessments_completed = Counter("fluentz_assessments_completed_total", "AI assessments that reached a final result")
+# what callers wait for, cache hits included (raw model requests: fluentz_llm_request_seconds)
+ai_call_seconds = Histogram("fluentz_ai_call_seconds", "ai_test call latency by fn and where the answer came from",
+                            labels=("fn", "source"))
+
+
+def _llm_calls_per_assessment() -> float:
+    done = assessments_completed.value()
+    total = sum(llm_calls.value(fn=fn) for fn in ("make_mcq", "make_writing_prompt", "grade_writing", "grade_writing_batch", "grade_writing_stream"))
+    return total / done if done else 0.0
+
+
+Gauge("fluentz_llm_calls_per_completed_assessment", "LLM spend: model calls per completed assessment",
+      fn=_llm_calls_per_assessment)
+
+T = TypeVar("T")
+
+
+# Every model call goes through the LLM cache (see llm_cache for the per-fn
+# policy) and then llm_client (deadlines, hedging, retries, breaker). Only
+# responses that parse are cached. When the model call fails, any cached
+# answer for the same prompt is used instead.
+
+def _fallback(fn: str, prompt: str, parse: Callable[[str], T], error: Exception) -> T:
+    stale = llm_cache.get_any(fn, MODEL, prompt)
+    if stale is None:
+        raise error
+    print(f"[ai_test] {fn} failed ({error}); serving a cached answer")
+    return parse(stale)
+
+
+async def _afallback(fn: str, prompt: str, parse: Callable[[str], T], error: Exception) -> T:
+    stale = await llm_cache.aget_any(fn, MODEL, prompt)
+    if stale is None:
+        raise error
+    print(f"[ai_test] {fn} failed ({error}); serving a cached answer")
+    return parse(stale)
+
+
+def _observe(fn: str, source: str, started: float) -> None:
+    ai_call_seconds.observe(time.monotonic() - started, fn=fn, source=source)
+
+
+def _complete(fn: str, prompt: str, parse: Callable[[str], T]) -> T:
+    started = time.monotonic()
+    cached = llm_cache.get(fn, MODEL, prompt)
+    if cached is not None:
+        _observe(fn, "cache", started)
+        return parse(cached)
+    try:
+        text, out = llm_client.complete(fn, prompt, parse)
+    except Exception as e:
+        source = "error"
+        try:
+            out = _fallback(fn, prompt, parse, e)
+            source = "fallback"
+            return out
+        finally:
+            _observe(fn, source, started)
+    llm_cache.put(fn, MODEL, prompt, text)
+    _observe(fn, "model", started)
+    return out
+
+
+async def _acomplete(fn: str, prompt: str, parse: Callable[[str], T]) -> T:
+    started = time.monotonic()
+    cached = await llm_cache.aget(fn, MODEL, prompt)
+    if cached is not None:
+        _observe(fn, "cache", started)
+        return parse(cached)
+    try:
+        text, out = await llm_client.acomplete(fn, prompt, parse)
+    except Exception as e:
+        source = "error"
+        try:
+            out = await _afallback(fn, prompt, parse, e)
+            source = "fallback"
+            return out
+        finally:
+            _observe(fn, source, started)
+    await llm_cache.aput(fn, MODEL, prompt, text)
+    _observe(fn, "model", started)
+    return out
+
+
+def _mcq_prompt(language_name: str, target_cefr: str) -> str:
+    return f"""
+Create ONE CEFR {target_cefr} placement question for {language_name}.
+It must be MIXED: short context (2-3 lines) + reading/vocab/grammar in context.
+Multiple-choice with 4 options A-D, exactly one correct.
+
+Return STRICT JSON with keys: prompt, options, correct, explanation.
+options must be an object with keys A,B,C,D.
+No markdown. No extra keys.
+"""
+
+
+def _writing_prompt_prompt(language_name: str, target_cefr: str) -> str:
+    return f"""
+Create ONE writing prompt for a CEFR {target_cefr} placement test in {language_name}.
+Return STRICT JSON:
+{{"prompt":"...", "min_words":int, "max_words":int}}
+No extra keys.
+"""
+
+
+def _grade_writing_prompt(language_name: str, target_cefr: str, prompt_text: str, user_text: str) -> str:
+    return f"""
+Grade this writing for a CEFR placement test in {language_name}.
+Target level: {target_cefr}
+
+Prompt: {prompt_text}
+User text: {user_text}
+
+Use rubric with 3 dimensions (0-5 each): grammar, vocab, coherence.
+Total score = 0..15.
+Return STRICT JSON with keys: score (int), feedback (string), rubric (object with grammar,vocab,coherence ints).
+No markdown. No extra keys.
+"""
+
+
+def _grade_writing_stream_prompt(language_name: str, target_cefr: str, prompt_text: str, user_text: str) -> str:
+    # same grading task; the key order puts the rubric before the long feedback
+    return f"""
+Grade this writing for a CEFR placement test in {language_name}.
+Target level: {target_cefr}
+
+Prompt: {prompt_text}
+User text: {user_text}
+
+Use rubric with 3 dimensions (0-5 each): grammar, vocab, coherence.
+Total score = 0..15.
+Return STRICT JSON with keys in this order: rubric (object with grammar,vocab,coherence ints), score (int), feedback (string).
+No markdown. No extra keys.
+"""
+
+
+def _parse_grade(text: str) -> dict:
+    data = json.loads(text)
+    data["score"] = int(data["score"])
+    return data
 
-client = OpenAI()
-MODEL = os.getenv("ASSESSMENT_MODEL", "gpt-5.2")
 
 def make_mcq(language_name: str, target_cefr: str) -> dict:
     """
@@ -14,17 +158,7 @@ def make_mcq(language_name: str, target_cefr: str) -> dict:
       "explanation": "..."
     }
     """
-    prompt = f"""
-Create ONE CEFR {target_cefr} placement question for {language_name}.
-It must be MIXED: short context (2-3 lines) + reading/vocab/grammar in context.
-Multiple-choice with 4 options A-D, exactly one correct.
-
-Return STRICT JSON with keys: prompt, options, correct, explanation.
-options must be an object with keys A,B,C,D.
-No markdown. No extra keys.
-"""
-    r = client.responses.create(model=MODEL, input=prompt)
-    return json.loads(r.output_text.strip())
+    return _complete("make_mcq", _mcq_prompt(language_name, target_cefr), json.loads)
 
 def grade_mcq(explanation: str, chosen: str, correct: str) -> dict:
     score = 10 if chosen == correct else 0
@@ -32,33 +166,196 @@ def grade_mcq(explanation: str, chosen: str, correct: str) -> dict:
     return {"score": score, "feedback": fb}
 
 def make_writing_prompt(language_name: str, target_cefr: str) -> dict:
-    prompt = f"""
-Create ONE writing prompt for a CEFR {target_cefr} placement test in {language_name}.
-Return STRICT JSON:
-{{"prompt":"...", "min_words":int, "max_words":int}}
-No extra keys.
-"""
-    r = client.responses.create(model=MODEL, input=prompt)
-    return json.loads(r.output_text.strip())
+    return _complete("make_writing_prompt", _writing_prompt_prompt(language_name, target_cefr), json.loads)
 
 def grade_writing(language_name: str, target_cefr: str, prompt_text: str, user_text: str) -> dict:
     """
     Return STRICT JSON:
     {"score": int 0..15, "feedback": "...", "rubric": {"grammar":0..5,"vocab":0..5,"coherence":0..5}}
     """
-    prompt = f"""
-Grade this writing for a CEFR placement test in {language_name}.
-Target level: {target_cefr}
+    return _complete("grade_writing", _grade_writing_prompt(language_name, target_cefr, prompt_text, user_text), _parse_grade)
+
+
+# Async variants for the async handlers: same prompts and parsing, but the
+# event loop keeps serving other requests while the model call is in flight.
+
+async def amake_mcq(language_name: str, target_cefr: str) -> dict:
+    return await _acomplete("make_mcq", _mcq_prompt(language_name, target_cefr), json.loads)
+
+async def amake_writing_prompt(language_name: str, target_cefr: str) -> dict:
+    return await _acomplete("make_writing_prompt", _writing_prompt_prompt(language_name, target_cefr), json.loads)
+
+async def agrade_writing(language_name: str, target_cefr: str, prompt_text: str, user_text: str) -> dict:
+    return await _acomplete("grade_writing", _grade_writing_prompt(language_name, target_cefr, prompt_text, user_text), _parse_grade)
+
+
+# (language_name, target_cefr, prompt_text, user_text)
+WritingSubmission = Tuple[str, str, str, str]
 
+
+def _grade_writing_batch_prompt(items: List[WritingSubmission]) -> str:
+    essays = "\n\n".join(
+        f"""--- Essay {i} ---
+Language: {language_name}
+Target level: {target_cefr}
 Prompt: {prompt_text}
-User text: {user_text}
+User text: {user_text}"""
+        for i, (language_name, target_cefr, prompt_text, user_text) in enumerate(items)
+    )
+    return f"""
+Grade each of these {len(items)} writings for a CEFR placement test independently.
+
+{essays}
 
 Use rubric with 3 dimensions (0-5 each): grammar, vocab, coherence.
 Total score = 0..15.
-Return STRICT JSON with keys: score (int), feedback (string), rubric (object with grammar,vocab,coherence ints).
+Return STRICT JSON: {{"results": [...]}} with exactly {len(items)} entries in essay order,
+each with keys: score (int), feedback (string), rubric (object with grammar,vocab,coherence ints).
 No markdown. No extra keys.
 """
-    r = client.responses.create(model=MODEL, input=prompt)
-    data = json.loads(r.output_text.strip())
-    data["score"] = int(data["score"])
-    return data
+
+
+def _parse_grade_batch(n: int) -> Callable[[str], List[dict]]:
+    def parse(text: str) -> List[dict]:
+        results = json.loads(text)["results"]
+        if len(results) != n:
+            raise ValueError(f"expected {n} grades, got {len(results)}")
+        for g in results:
+            g["score"] = int(g["score"])
+        return results
+    return parse
+
+
+async def agrade_writing_batch(items: List[WritingSubmission]) -> List[dict]:
+    """
+    Grades several essays with one model call. Essays with a cached grade are
+    not resent; if the batched answer does not parse, each remaining essay is
+    graded on its own.
+    """
+    grades: List[dict] = [None] * len(items)
+    todo = []
+    for i, item in enumerate(items):
+        cached = await llm_cache.aget("grade_writing", MODEL, _grade_writing_prompt(*item))
+        if cached is not None:
+            grades[i] = _parse_grade(cached)
+        else:
+            todo.append(i)
+
+    if len(todo) == 1:
+        grades[todo[0]] = await agrade_writing(*items[todo[0]])
+    elif todo:
+        batch = [items[i] for i in todo]
+        try:
+            results = await _acomplete("grade_writing_batch", _grade_writing_batch_prompt(batch),
+                                       _parse_grade_batch(len(batch)))
+        except Exception as e:
+            print(f"[ai_test] batched grading failed, grading one by one: {e}")
+            results = await asyncio.gather(*(agrade_writing(*item) for item in batch))
+        for i, g in zip(todo, results):
+            grades[i] = g
+            # a resubmission of the same text then hits the single-essay key
+            await llm_cache.aput("grade_writing", MODEL, _grade_writing_prompt(*items[i]), json.dumps(g))
+    return grades
+
+
+_RUBRIC_RE = re.compile(r'"rubric"\s*:\s*(\{[^{}]*\})')
+_SCORE_RE = re.compile(r'"score"\s*:\s*(-?\d+)')
+_FEEDBACK_RE = re.compile(r'"feedback"\s*:\s*"')
+
+
+class _GradeStreamParser:
+    """Picks the rubric/score and the feedback text out of a partial grade."""
+
+    def __init__(self):
+        self.text = ""
+        self.scores_sent = False
+        self._feedback_start: Optional[int] = None
+        self._feedback_sent = 0
+
+    def feed(self, delta: str) -> List[Tuple[str, Any]]:
+        self.text += delta
+        out: List[Tuple[str, Any]] = []
+        if not self.scores_sent:
+            rubric, score = _RUBRIC_RE.search(self.text), _SCORE_RE.search(self.text)
+            if rubric and score:
+                try:
+                    out.append(("scores", {"score": int(score.group(1)), "rubric": json.loads(rubric.group(1))}))
+                    self.scores_sent = True
+                except ValueError:
+                    pass
+        if self._feedback_start is None:
+            m = _FEEDBACK_RE.search(self.text)
+            if m:
+                self._feedback_start = m.end()
+        if self._feedback_start is not None:
+            decoded = self._decoded_feedback()
+            if len(decoded) > self._feedback_sent:
+                out.append(("feedback", decoded[self._feedback_sent:]))
+                self._feedback_sent = len(decoded)
+        return out
+
+    def _decoded_feedback(self) -> str:
+        # the longest prefix of the JSON string that ends on a whole character
+        raw = self.text[self._feedback_start:]
+        i = 0
+        while i < len(raw):
+            ch = raw[i]
+            if ch == '"':
+                break
+            if ch == "\\":
+                step = 6 if raw[i + 1:i + 2] == "u" else 2
+                if i + step > len(raw):
+                    break
+                i += step
+            else:
+                i += 1
+        try:
+            decoded = json.loads('"' + raw[:i] + '"')
+        except ValueError:
+            return ""
+        # hold back half of a surrogate pair until the other half arrives
+        if decoded and "\ud800" <= decoded[-1] <= "\udbff":
+            decoded = decoded[:-1]
+        return decoded
+
+
+async def agrade_writing_stream(language_name: str, target_cefr: str, prompt_text: str,
+                                user_text: str) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Yields ("scores", {score, rubric}) as soon as they are known, then
+    ("feedback", text delta)... and finally ("done", grade) with the same grade
+    dict agrade_writing returns. Its prompt asks for the rubric first, so its
+    grades are cached under their own fn, apart from agrade_writing's.
+    """
+    prompt = _grade_writing_stream_prompt(language_name, target_cefr, prompt_text, user_text)
+    cached = await llm_cache.aget("grade_writing_stream", MODEL, prompt)
+    if cached is not None:
+        g = _parse_grade(cached)
+        yield "scores", {"score": g["score"], "rubric": g.get("rubric", {})}
+        yield "feedback", g.get("feedback", "")
+        yield "done", g
+        return
+
+    parser = _GradeStreamParser()
+    try:
+        async for event in llm_client.astream("grade_writing_stream", prompt):
+            if event.type == "response.output_text.delta":
+                for item in parser.feed(event.delta):
+                    yield item
+        g = _parse_grade(parser.text.strip())
+    except Exception as e:
+        if parser.text:
+            raise  # part of the answer is already out
+        # nothing sent yet: grade the normal way (retries, cache fallback)
+        print(f"[ai_test] streamed grading failed ({e}); grading without streaming")
+        g = await agrade_writing(language_name, target_cefr, prompt_text, user_text)
+        yield "scores", {"score": g["score"], "rubric": g.get("rubric", {})}
+        yield "feedback", g.get("feedback", "")
+        yield "done", g
+        return
+
+
+    if not parser.scores_sent:
+        yield "scores", {"score": g["score"], "rubric": g.get("rubric", {})}
+    await llm_cache.aput("grade_writing_stream", MODEL, prompt, json.dumps(g))
+    yield "done", g
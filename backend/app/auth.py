@@ -0,0 +1,199 @@
+from __future__ import annotations
+from typing import Dict, NamedTuple, Optional, Tuple
+from collections import OrderedDict
+import os
+import threading
+import time
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import get_async_db
+from .models import User
+from .security import JWT_SECRET, JWT_ALG
+from .metrics import Counter, Gauge
+
+# Who is calling. Bearer tokens from /auth/login are verified once and their
+# claims kept until the token expires; the user row is served from a small
+# identity cache. Handlers that change a user's onboarding status call
+# user_cache.invalidate(); each entry also carries the user's version so a
+# load that raced an invalidation is not cached. Other API processes see the
+# change after USER_CACHE_TTL_SECONDS at most, so status-gated transitions
+# (starting or submitting an assessment) read the row instead. Only rows read
+# from the primary are cached: a lagging replica could hand back a stale status.
+#
+# The bearer token is optional for now (the mobile app does not send it):
+# without one, handlers fall back to the user_id in the request; with one,
+# that user_id must match the token.
+
+AUTH_CLAIMS_CACHE_ENTRIES = int(os.getenv("AUTH_CLAIMS_CACHE_ENTRIES", "10000"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+user_cache_hits = Counter("fluentz_user_cache_hits_total", "User identity cache hits")
+user_cache_misses = Counter("fluentz_user_cache_misses_total", "User identity cache misses")
+claims_cache_hits = Counter("fluentz_auth_claims_cache_hits_total", "Bearer tokens served from the verified-claims cache")
+
+
+class CurrentUser(NamedTuple):
+    id: int
+    email: str
+    full_name: str
+    role: str
+    onboarding_status: str
+    is_email_verified: bool
+
+
+def _snapshot(u: User) -> CurrentUser:
+    return CurrentUser(int(u.id), u.email, u.full_name, u.role, u.onboarding_status, bool(u.is_email_verified))
+
+
+class ClaimsCache:
+    def __init__(self, max_entries: int = AUTH_CLAIMS_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def verify(self, token: str) -> dict:
+        """Claims of a valid token; raises JWTError otherwise."""
+        now = time.time()
+        with self._lock:
+            claims = self._entries.get(token)
+            if claims is not None:
+                if claims["exp"] > now:
+                    self._entries.move_to_end(token)
+                    claims_cache_hits.inc()
+                    return claims
+                del self._entries[token]
+
+        claims = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
+        if "sub" not in claims or "exp" not in claims:
+            raise JWTError("token has no subject or expiry")
+        with self._lock:
+            self._entries[token] = claims
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return claims
+
+
+class UserCache:
+    def __init__(self, max_entries: int = USER_CACHE_MAX_ENTRIES, ttl_seconds: float = USER_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Tuple[float, int, CurrentUser]]" = OrderedDict()
+        self._versions: Dict[int, int] = {}  # only users invalidated since startup
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def version(self, user_id: int) -> int:
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def get(self, user_id: int) -> Optional[CurrentUser]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, version, user = entry
+            if expires_at <= time.monotonic() or version != self._versions.get(user_id, 0):
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def put(self, user: CurrentUser, version: int) -> None:
+        """Caches a row loaded when the user's version was `version`."""
+        with self._lock:
+            if version != self._versions.get(user.id, 0):
+                return  # changed while we were loading it
+            self._entries[user.id] = (time.monotonic() + self.ttl_seconds, version, user)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._entries.pop(user_id, None)
+
+
+claims_cache = ClaimsCache()
+user_cache = UserCache()
+
+Gauge("fluentz_user_cache_entries", "Users held in the identity cache", fn=lambda: len(user_cache))
+
+
+def load_user(db: Session, user_id: int, cache: bool = True) -> Optional[CurrentUser]:
+    """cache=False for replica sessions: cached entries are used, the row read is not kept."""
+    user = user_cache.get(user_id)
+    if user is not None:
+        user_cache_hits.inc()
+        return user
+    user_cache_misses.inc()
+    version = user_cache.version(user_id)
+    row = db.execute(select(User).where(User.id == user_id)).scalar_one_or_none()
+    if row is None:
+        return None
+    user = _snapshot(row)
+    if cache:
+        user_cache.put(user, version)
+    return user
+
+
+async def aload_user(db: AsyncSession, user_id: int, fresh: bool = False) -> Optional[CurrentUser]:
+    """fresh=True always reads the row (and refreshes the cached entry)."""
+    user = None if fresh else user_cache.get(user_id)
+    if user is not None:
+        user_cache_hits.inc()
+        return user
+    user_cache_misses.inc()
+    version = user_cache.version(user_id)
+    row = (await db.execute(select(User).where(User.id == user_id))).scalar_one_or_none()
+    if row is None:
+        return None
+    user = _snapshot(row)
+    user_cache.put(user, version)
+    return user
+
+
+# =========================
+# Dependencies
+# =========================
+_bearer = HTTPBearer(auto_error=False)
+
+
+def get_token_claims(creds: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)) -> Optional[dict]:
+    """Verified claims of the bearer token, or None when the request has none."""
+    if creds is None:
+        return None
+    try:
+        return claims_cache.verify(creds.credentials)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid or expired token",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+
+async def get_current_user(claims: Optional[dict] = Depends(get_token_claims),
+                           db: AsyncSession = Depends(get_async_db)) -> CurrentUser:
+    if claims is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    user = await aload_user(db, int(claims["sub"]))
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired token",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return user
+
+
+def check_subject(claims: Optional[dict], user_id: int) -> None:
+    """A request naming user_id may only come from that user's token (if it has one)."""
+    if claims is not None and int(claims["sub"]) != int(user_id):
+        raise HTTPException(status_code=403, detail="Token does not match user")
@@ -1,7 +1,14 @@
 import os
+import time
+from typing import Dict, Optional
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from .metrics import Counter, Gauge, Histogram
 
 load_dotenv()
 
@@ -11,14 +18,159 @@ DB_NAME = os.getenv("DB_NAME", "fluentz")
 DB_USER = os.getenv("DB_USER", "root")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "")
 
-DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4"
+# read replica for read-only endpoints (get_read_db); unset = reads go to the
+# primary. DATABASE_REPLICA_URL / ASYNC_DATABASE_REPLICA_URL override these.
+DB_REPLICA_HOST = os.getenv("DB_REPLICA_HOST", "")
+DB_REPLICA_PORT = os.getenv("DB_REPLICA_PORT", DB_PORT)
+DB_REPLICA_RETRY_SECONDS = float(os.getenv("DB_REPLICA_RETRY_SECONDS", "30"))
+
+# per engine (sync/async x primary/replica), per worker process
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
+
+
+def _url(driver: str, host: str, port: str) -> str:
+    return f"mysql+{driver}://{DB_USER}:{DB_PASSWORD}@{host}:{port}/{DB_NAME}?charset=utf8mb4"
+
+
+# full URLs override the DB_* parts (the tests point these at SQLite)
+DATABASE_URL = os.getenv("DATABASE_URL") or _url("pymysql", DB_HOST, DB_PORT)
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _url("aiomysql", DB_HOST, DB_PORT)
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL") or (
+    _url("pymysql", DB_REPLICA_HOST, DB_REPLICA_PORT) if DB_REPLICA_HOST else "")
+ASYNC_DATABASE_REPLICA_URL = os.getenv("ASYNC_DATABASE_REPLICA_URL") or (
+    _url("aiomysql", DB_REPLICA_HOST, DB_REPLICA_PORT) if DB_REPLICA_HOST else "")
+
+# =========================
+# Pools
+# =========================
+pool_checkout_wait = Histogram("fluentz_db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection",
+                               labels=("pool",), buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0))
+replica_fallbacks = Counter("fluentz_db_replica_fallbacks_total", "Reads sent to the primary because the replica failed")
+_pools: Dict[str, QueuePool] = {}
+
+
+class _TimedPool:
+    # checkout wait per pool; SQLAlchemy has no event for it
+    pool_name = ""
+
+    def _do_get(self):
+        started = time.monotonic()
+        try:
+            return super()._do_get()
+        finally:
+            pool_checkout_wait.observe(time.monotonic() - started, pool=self.pool_name)
+
+
+def _pool_class(base, name: str):
+    return type(f"Timed{base.__name__}", (_TimedPool, base), {"pool_name": name})
+
+
+def _pool_args(base, name: str) -> dict:
+    return dict(
+        poolclass=_pool_class(base, name),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_recycle=DB_POOL_RECYCLE_SECONDS,
+        pool_timeout=DB_POOL_TIMEOUT_SECONDS,
+        pool_pre_ping=True,
+    )
+
+
+def build_engine(url: str, name: str):
+    e = create_engine(url, **_pool_args(QueuePool, name))
+    _pools[name] = e.pool
+    return e
+
+
+def build_async_engine(url: str, name: str):
+    e = create_async_engine(url, **_pool_args(AsyncAdaptedQueuePool, name))
+    _pools[name] = e.pool
+    return e
+
+
+def _pool_stat(fn) -> Dict[tuple, float]:
+    return {(name,): fn(p) for name, p in list(_pools.items())}
+
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+Gauge("fluentz_db_pool_checked_out", "Connections in use", labels=("pool",),
+      fn=lambda: _pool_stat(lambda p: p.checkedout()))
+Gauge("fluentz_db_pool_utilization", "Connections in use / (pool size + max overflow)", labels=("pool",),
+      fn=lambda: _pool_stat(lambda p: p.checkedout() / (DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+
+
+engine = build_engine(DATABASE_URL, "primary")
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+# async handlers use their own pool so a slow query never parks a worker thread
+async_engine = build_async_engine(ASYNC_DATABASE_URL, "primary_async")
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+read_engine = build_engine(DATABASE_REPLICA_URL, "replica") if DATABASE_REPLICA_URL else engine
+async_read_engine = (build_async_engine(ASYNC_DATABASE_REPLICA_URL, "replica_async") if ASYNC_DATABASE_REPLICA_URL
+                     else async_engine)
+ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False)
+AsyncReadSessionLocal = async_sessionmaker(bind=async_read_engine, autoflush=False, expire_on_commit=False)
+
+# replica unreachable: reads go to the primary until this monotonic time
+_replica_down_until: Optional[float] = None
+
+
+def _use_replica(replica, primary) -> bool:
+    return replica is not primary and (_replica_down_until is None or time.monotonic() >= _replica_down_until)
+
+
+def _replica_failed(e: Exception) -> None:
+    global _replica_down_until
+    _replica_down_until = time.monotonic() + DB_REPLICA_RETRY_SECONDS
+    replica_fallbacks.inc()
+    print(f"[db] replica unavailable, reading from primary for {DB_REPLICA_RETRY_SECONDS:g}s: {e}")
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_read_db():
+    """Session for handlers that only read; may lag the primary slightly."""
+    db = None
+    if _use_replica(read_engine, engine):
+        db = ReadSessionLocal()
+        try:
+            db.connection()  # check out now so a dead replica falls back here
+        except OperationalError as e:
+            db.close()
+            db = None
+            _replica_failed(e)
+    if db is None:
+        db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db():
+    db = None
+    if _use_replica(async_read_engine, async_engine):
+        db = AsyncReadSessionLocal()
+        try:
+            await db.connection()
+        except OperationalError as e:
+            await db.close()
+            db = None
+            _replica_failed(e)
+    if db is None:
+        db = AsyncSessionLocal()
+    try:
+        yield db
+    finally:
+        await db.close()
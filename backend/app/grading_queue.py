@@ -0,0 +1,210 @@
+from __future__ import annotations
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import json
+import os
+import secrets
+
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import AsyncSessionLocal
+from .models import User, LanguageAssessment
+from .models_assessment import AssessmentGradingJob
+from .ai_test import agrade_writing_batch, assessments_completed
+from .cefr import writing_score_to_cefr
+from .metrics import Counter, Gauge
+from .auth import user_cache
+from .reference_data import reference_catalog
+
+# submit-writing stores an assessment_grading_jobs row and returns its id;
+# worker tasks on the event loop grade queued jobs, micro-batching whatever
+# arrives within GRADING_BATCH_WAIT_MS into one model call, and finalize the
+# assessment. Clients poll (or stream) GET /assessment/ai/grading/{job_id}.
+# Jobs live in the DB, so any API process can answer the poll; a job left
+# queued/running by a dead process is picked up again at startup.
+
+GRADING_WORKERS = int(os.getenv("GRADING_WORKERS", "4"))
+GRADING_BATCH_SIZE = int(os.getenv("GRADING_BATCH_SIZE", "4"))
+GRADING_BATCH_WAIT_MS = float(os.getenv("GRADING_BATCH_WAIT_MS", "200"))
+GRADING_JOB_TIMEOUT_SECONDS = float(os.getenv("GRADING_JOB_TIMEOUT_SECONDS", "300"))
+GRADING_MAX_QUEUE = int(os.getenv("GRADING_MAX_QUEUE", "500"))
+
+jobs_finished = Counter("fluentz_grading_jobs_total", "Writing grading jobs finished", labels=("status",))
+batches_run = Counter("fluentz_grading_batches_total", "Grading batches sent to the model")
+
+
+def new_job_id() -> str:
+    return secrets.token_urlsafe(16)
+
+
+def _final_result(job: AssessmentGradingJob, g: dict) -> Dict:
+    writing_score = int(g["score"])
+    writing_level = writing_score_to_cefr(writing_score)
+
+    cefr_order = ["A1", "A2", "B1", "B2", "C1", "C2"]
+    final_cefr = job.core_estimate
+    if cefr_order.index(writing_level) < cefr_order.index(final_cefr):
+        final_cefr = writing_level
+
+    # map CEFR to your enum
+    saved_level = "beginner" if final_cefr in ("A1", "A2") else ("intermediate" if final_cefr in ("B1", "B2") else "advanced")
+
+    return {
+        "message": "Assessment completed",
+        "core_estimate": job.core_estimate,
+        "writing_score": writing_score,
+        "writing_level": writing_level,
+        "final_cefr": final_cefr,
+        "saved_level": saved_level,
+        "user_status": "assessed",
+        "feedback": g.get("feedback", ""),
+    }
+
+
+async def finalize_job(db: AsyncSession, job: AssessmentGradingJob, g: dict) -> None:
+    """
+    Writes the assessment result for a graded job (caller commits, then
+    invalidates user_cache). A job that is already done, or a user already
+    assessed in the language, adds no second assessment row.
+    """
+    if job.status == "done":
+        return
+    result = _final_result(job, g)
+    assessed = (await db.execute(
+        select(LanguageAssessment.id)
+        .where(LanguageAssessment.user_id == job.user_id, LanguageAssessment.language_id == job.language_id)
+        .limit(1)
+    )).scalar_one_or_none()
+    if assessed is None:
+        db.add(LanguageAssessment(
+            user_id=job.user_id,
+            language_id=job.language_id,
+            level=result["saved_level"],
+            score=result["writing_score"],
+        ))
+    await db.execute(update(User).where(User.id == job.user_id).values(onboarding_status="assessed"))
+    job.status = "done"
+    job.result_json = json.dumps(result)
+    job.finished_at = datetime.utcnow()
+
+
+class GradingQueue:
+    def __init__(self, workers: int = GRADING_WORKERS, batch_size: int = GRADING_BATCH_SIZE,
+                 batch_wait_ms: float = GRADING_BATCH_WAIT_MS):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def full(self) -> bool:
+        """New submissions should be turned away (see admission)."""
+        return self.depth() >= GRADING_MAX_QUEUE
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        try:
+            async with AsyncSessionLocal() as db:
+                stale = datetime.utcnow() - timedelta(seconds=GRADING_JOB_TIMEOUT_SECONDS)
+                pending = (await db.execute(
+                    select(AssessmentGradingJob.id).where(or_(
+                        AssessmentGradingJob.status == "queued",
+                        and_(AssessmentGradingJob.status == "running", AssessmentGradingJob.started_at < stale),
+                    ))
+                )).scalars().all()
+                if pending:
+                    await db.execute(
+                        update(AssessmentGradingJob)
+                        .where(AssessmentGradingJob.id.in_(pending), AssessmentGradingJob.status == "running")
+                        .values(status="queued")
+                    )
+                    await db.commit()
+        except Exception as e:
+            print(f"[grading] recovery skipped: {e}")
+            return
+        for job_id in pending:
+            self.submit(job_id)
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job_id: str) -> None:
+        """Hand a committed job to the workers."""
+        self._queue.put_nowait(job_id)
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._run(batch)
+            except Exception as e:
+                print(f"[grading] batch {batch} failed: {e}")
+
+    async def _run(self, job_ids: List[str]) -> None:
+        async with AsyncSessionLocal() as db:
+            # claim one by one so two processes recovering the same job can't both grade it
+            claimed = []
+            for job_id in job_ids:
+                r = await db.execute(
+                    update(AssessmentGradingJob)
+                    .where(AssessmentGradingJob.id == job_id, AssessmentGradingJob.status == "queued")
+                    .values(status="running", started_at=datetime.utcnow())
+                )
+                if r.rowcount:
+                    claimed.append(job_id)
+            await db.commit()
+            if not claimed:
+                return
+
+            jobs = (await db.execute(
+                select(AssessmentGradingJob).where(AssessmentGradingJob.id.in_(claimed))
+            )).scalars().all()
+            if not reference_catalog.loaded:
+                await db.run_sync(reference_catalog.ensure_loaded)
+            names = {l.id: l.name for l in reference_catalog.languages()}
+
+            batches_run.inc()
+            try:
+                grades = await agrade_writing_batch([
+                    (names[j.language_id], j.core_estimate, j.prompt_text, j.user_text) for j in jobs
+                ])
+            except Exception as e:
+                for j in jobs:
+                    j.status = "failed"
+                    j.error = str(e)
+                    j.finished_at = datetime.utcnow()
+                await db.commit()
+                jobs_finished.inc(len(jobs), status="failed")
+                return
+
+            for j, g in zip(jobs, grades):
+                await finalize_job(db, j, g)
+            await db.commit()
+            for j in jobs:
+                user_cache.invalidate(j.user_id)
+        jobs_finished.inc(len(jobs), status="done")
+        assessments_completed.inc(len(jobs))
+
+
+grading_queue = GradingQueue()
+
+Gauge("fluentz_grading_queue_depth", "Writing grading jobs waiting for a worker", fn=grading_queue.depth)
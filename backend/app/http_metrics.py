@@ -0,0 +1,102 @@
+from __future__ import annotations
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .metrics import Counter, Gauge, Histogram
+
+# Per-request metrics: latency, status codes and requests in flight by route
+# template, plus how many DB statements each request ran and how long they
+# took (SQLAlchemy cursor events, all engines). A plain ASGI middleware, so
+# streamed responses are timed to their last byte and nothing is buffered.
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DB_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+http_request_seconds = Histogram("fluentz_http_request_seconds", "Request latency by route",
+                                 labels=("method", "route"), buckets=HTTP_BUCKETS)
+http_responses = Counter("fluentz_http_responses_total", "Responses by route and status code",
+                         labels=("method", "route", "status"))
+http_in_flight = Gauge("fluentz_http_requests_in_flight", "Requests being handled")
+request_db_statements = Histogram("fluentz_http_request_db_statements", "DB statements run per request",
+                                  labels=("route",), buckets=(0, 1, 2, 5, 10, 20, 50, 100))
+request_db_seconds = Histogram("fluentz_http_request_db_seconds", "Time per request spent in DB statements",
+                               labels=("route",), buckets=DB_BUCKETS)
+db_statements = Counter("fluentz_db_statements_total", "DB statements run (requests and background work)")
+db_statement_seconds = Histogram("fluentz_db_statement_seconds", "DB statement latency", buckets=DB_BUCKETS)
+
+# [statements, seconds] of the current request; threadpool handlers share
+# the list through the copied context
+_request_db: ContextVar[Optional[List[float]]] = ContextVar("fluentz_request_db", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._fluentz_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_fluentz_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    db_statements.inc()
+    db_statement_seconds.observe(elapsed)
+    stats = _request_db.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += elapsed
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self._routes: Dict[object, str] = {}  # endpoint -> path template
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"  # 404s: keep arbitrary paths out of the labels
+        route = self._routes.get(endpoint)
+        if route is None:
+            for r in scope["app"].routes:
+                if getattr(r, "endpoint", None) is endpoint:
+                    route = r.path
+                    break
+            else:
+                route = "unmatched"
+            self._routes[endpoint] = route
+        return route
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]  # if the app raises before responding
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        stats = [0, 0.0]
+        token = _request_db.set(stats)
+        http_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight.dec()
+            _request_db.reset(token)
+            method, route = scope["method"], self._route(scope)
+            http_request_seconds.observe(elapsed, method=method, route=route)
+            http_responses.inc(method=method, route=route, status=str(status[0]))
+            request_db_statements.observe(stats[0], route=route)
+            request_db_seconds.observe(stats[1], route=route)
@@ -0,0 +1,216 @@
+from __future__ import annotations
+from typing import Iterable, Optional, Set, Tuple
+from datetime import datetime
+import hashlib
+import json
+import os
+
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import select, update, func, case, and_, or_, bindparam
+
+from .db import SessionLocal
+from .models_assessment import AssessmentItem, AssessmentItemExposure
+from .metrics import Counter
+
+# Persistent bank of generated assessment items (assessment_items rows with
+# no session), keyed by language and target CEFR. The adaptive test serves
+# items the learner has not seen yet and only asks the model when the bank
+# runs dry; every generated item is banked for the next learner.
+#
+#   python -m app.item_bank      # recalibrate difficulty from real answers
+
+ITEM_BANK_MIN_RESPONSES = int(os.getenv("ITEM_BANK_MIN_RESPONSES", "20"))
+ITEM_BANK_MIN_DIFFICULTY = float(os.getenv("ITEM_BANK_MIN_DIFFICULTY", "0.05"))
+ITEM_BANK_MAX_DIFFICULTY = float(os.getenv("ITEM_BANK_MAX_DIFFICULTY", "0.95"))
+
+bank_hits = Counter("fluentz_item_bank_hits_total", "Items served from the bank", labels=("item_type",))
+bank_misses = Counter("fluentz_item_bank_misses_total", "Item requests the bank could not serve", labels=("item_type",))
+
+
+def _content_hash(item_type: str, language_id: int, target_cefr: str, body: dict) -> str:
+    raw = json.dumps([item_type, language_id, target_cefr, body], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _store(db: Session, item_type: str, language_id: int, target_cefr: str,
+           prompt_text: str, options_json: Optional[str], correct_option: Optional[str], body: dict) -> int:
+    h = _content_hash(item_type, language_id, target_cefr, body)
+    existing = db.execute(select(AssessmentItem.id).where(AssessmentItem.content_hash == h)).scalar_one_or_none()
+    if existing is not None:
+        return int(existing)
+    item = AssessmentItem(
+        item_type=item_type,
+        language_id=language_id,
+        target_cefr=target_cefr,
+        prompt_text=prompt_text,
+        options_json=options_json,
+        correct_option=correct_option,
+        content_hash=h,
+    )
+    try:
+        with db.begin_nested():
+            db.add(item)
+    except IntegrityError:
+        # banked by a concurrent request (e.g. both got the same cached
+        # variant); a locking read sees it even under REPEATABLE READ
+        return int(db.execute(
+            select(AssessmentItem.id).where(AssessmentItem.content_hash == h).with_for_update(read=True)
+        ).scalar_one())
+    return int(item.id)
+
+
+def store_mcq(db: Session, language_id: int, target_cefr: str, q: dict) -> int:
+    return _store(db, "mcq", language_id, target_cefr, q["prompt"], json.dumps(q["options"]), q["correct"],
+                  {"prompt": q["prompt"], "options": q["options"], "correct": q["correct"]})
+
+
+def store_writing_prompt(db: Session, language_id: int, target_cefr: str, wp: dict) -> int:
+    limits = {"min_words": int(wp["min_words"]), "max_words": int(wp["max_words"])}
+    return _store(db, "writing", language_id, target_cefr, wp["prompt"], json.dumps(limits), None,
+                  {"prompt": wp["prompt"], **limits})
+
+
+def _unseen(user_id: int, language_id: int, item_type: str):
+    seen = select(AssessmentItemExposure.item_id).where(AssessmentItemExposure.user_id == user_id)
+    usable = or_(
+        AssessmentItem.times_served < ITEM_BANK_MIN_RESPONSES,
+        AssessmentItem.difficulty.is_(None),
+        AssessmentItem.difficulty.between(ITEM_BANK_MIN_DIFFICULTY, ITEM_BANK_MAX_DIFFICULTY),
+    )
+    return and_(
+        AssessmentItem.session_id.is_(None),
+        AssessmentItem.item_type == item_type,
+        AssessmentItem.language_id == language_id,
+        AssessmentItem.id.not_in(seen),
+        usable,
+    )
+
+
+def _pick(db: Session, user_id: int, language_id: int, target_cefr: str, item_type: str,
+          seen_ok: bool = False) -> Optional[AssessmentItem]:
+    if seen_ok:
+        # fallback when the model is unavailable: a repeat beats an error
+        where = and_(
+            AssessmentItem.session_id.is_(None),
+            AssessmentItem.item_type == item_type,
+            AssessmentItem.language_id == language_id,
+        )
+    else:
+        where = _unseen(user_id, language_id, item_type)
+    item = db.execute(
+        select(AssessmentItem)
+        .where(where, AssessmentItem.target_cefr == target_cefr)
+        # spread exposure across the bank
+        .order_by(AssessmentItem.times_served, AssessmentItem.id)
+        .limit(1)
+    ).scalar_one_or_none()
+    (bank_hits if item else bank_misses).inc(item_type=item_type)
+    return item
+
+
+def pick_mcq(db: Session, user_id: int, language_id: int, target_cefr: str,
+             seen_ok: bool = False) -> Optional[Tuple[int, dict]]:
+    item = _pick(db, user_id, language_id, target_cefr, "mcq", seen_ok)
+    if not item:
+        return None
+    return int(item.id), {
+        "prompt": item.prompt_text,
+        "options": json.loads(item.options_json),
+        "correct": item.correct_option,
+    }
+
+
+def pick_writing_prompt(db: Session, user_id: int, language_id: int, target_cefr: str,
+                        seen_ok: bool = False) -> Optional[Tuple[int, dict]]:
+    item = _pick(db, user_id, language_id, target_cefr, "writing", seen_ok)
+    if not item:
+        return None
+    return int(item.id), {"prompt": item.prompt_text, **json.loads(item.options_json)}
+
+
+def unseen_levels(db: Session, user_id: int, language_id: int, levels: Iterable[str]) -> Set[str]:
+    """Which of `levels` still have an unseen MCQ for this user."""
+    rows = db.execute(
+        select(AssessmentItem.target_cefr)
+        .where(_unseen(user_id, language_id, "mcq"), AssessmentItem.target_cefr.in_(list(levels)))
+        .distinct()
+    ).scalars().all()
+    return set(rows)
+
+
+def record_exposure(db: Session, user_id: int, item_id: int) -> None:
+    if db.get(AssessmentItemExposure, (user_id, item_id)) is None:
+        db.add(AssessmentItemExposure(user_id=user_id, item_id=item_id))
+        db.flush()  # sessions don't autoflush; later picks must see it
+        # _pick serves the least-served item next; calibrate() recounts
+        db.execute(
+            update(AssessmentItem)
+            .where(AssessmentItem.id == item_id)
+            .values(times_served=AssessmentItem.times_served + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def record_answer(db: Session, user_id: int, item_id: int, is_correct: bool) -> None:
+    db.execute(
+        update(AssessmentItemExposure)
+        .where(
+            AssessmentItemExposure.user_id == user_id,
+            AssessmentItemExposure.item_id == item_id,
+            AssessmentItemExposure.answered_at.is_(None),
+        )
+        .values(is_correct=is_correct, answered_at=datetime.utcnow())
+    )
+
+
+def calibrate(db: Session) -> int:
+    """
+    Recomputes served/correct counts for every banked item that was served,
+    and difficulty for those with answers (Laplace-smoothed share of wrong
+    answers). Returns the number of items updated.
+    """
+    stats = db.execute(
+        select(
+            AssessmentItemExposure.item_id,
+            func.count(),
+            func.count(AssessmentItemExposure.answered_at),
+            func.sum(case((AssessmentItemExposure.is_correct.is_(True), 1), else_=0)),
+        )
+        .group_by(AssessmentItemExposure.item_id)
+    ).all()
+    if not stats:
+        return 0
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "b_id": int(item_id),
+            "b_served": int(served),
+            "b_correct": int(correct or 0),
+            "b_difficulty": 1.0 - (int(correct or 0) + 1) / (int(answered) + 2) if answered else None,
+            "b_now": now,
+        }
+        for item_id, served, answered, correct in stats
+    ]
+    db.execute(
+        update(AssessmentItem.__table__)
+        .where(AssessmentItem.__table__.c.id == bindparam("b_id"))
+        .values(
+            times_served=bindparam("b_served"),
+            times_correct=bindparam("b_correct"),
+            difficulty=bindparam("b_difficulty"),
+            calibrated_at=bindparam("b_now"),
+        ),
+        rows,
+    )
+    db.commit()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        print(f"[item_bank] calibrated {calibrate(db)} items")
+    finally:
+        db.close()
@@ -0,0 +1,225 @@
+from __future__ import annotations
+from typing import Dict, List, Optional
+from collections import OrderedDict
+import asyncio
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from .metrics import Counter, Gauge
+
+# Content-addressed cache in front of the model, keyed by sha256(model, prompt).
+# A small in-memory LRU sits over a size-bounded SQLite file that survives
+# restarts. What a hit means depends on the calling function:
+#
+#   exact     the stored response is returned (grading: same prompt, same
+#             learner text -> same grade)
+#   variants  up to LLM_CACHE_VARIANTS distinct responses are collected per
+#             prompt; once that many exist one is sampled at random instead of
+#             calling the model (generation)
+#   off       never cached
+#
+# Generated items are also banked (item_bank), so LLM_CACHE_VARIANTS should be
+# well above the number of items one learner sees per level; otherwise a
+# learner who exhausted the bank can be sampled a question they already had.
+#
+# Disk-tier hits do not write: their last_used times are kept in memory and
+# written with the next put() (eviction, the only reader, runs there). Async
+# callers use aget/aput/aget_any, which answer memory hits inline and do any
+# SQLite work in a worker thread.
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "2000"))
+LLM_CACHE_VARIANTS = int(os.getenv("LLM_CACHE_VARIANTS", "50"))
+
+# fn=policy pairs, e.g. "make_mcq=variants,grade_writing=exact"
+DEFAULT_POLICIES = "make_mcq=variants,make_writing_prompt=variants,grade_writing=exact,grade_writing_stream=exact"
+LLM_CACHE_POLICIES: Dict[str, str] = dict(
+    part.split("=", 1) for part in os.getenv("LLM_CACHE_POLICIES", DEFAULT_POLICIES).split(",") if "=" in part
+)
+
+cache_hits = Counter("fluentz_llm_cache_hits_total", "Model calls answered from the LLM cache", labels=("fn", "tier"))
+cache_misses = Counter("fluentz_llm_cache_misses_total", "Cacheable model calls that went to the model", labels=("fn",))
+
+
+def cache_key(model: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+class LlmCache:
+    def __init__(self, path: str = LLM_CACHE_PATH, max_entries: int = LLM_CACHE_MAX_ENTRIES,
+                 memory_entries: int = LLM_CACHE_MEMORY_ENTRIES, variants: int = LLM_CACHE_VARIANTS):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.variants = variants
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_rows = 0
+        self._touched: Dict[str, float] = {}  # key -> last_used not yet written
+
+    def policy(self, fn: str) -> str:
+        return LLM_CACHE_POLICIES.get(fn, "off")
+
+    def get(self, fn: str, model: str, prompt: str) -> Optional[str]:
+        """A cached response for this call, or None when the model must be asked."""
+        policy = self.policy(fn)
+        if policy == "off":
+            return None
+        key = cache_key(model, prompt)
+        with self._lock:
+            tier = "memory"
+            found = self._memory_get_locked(key)
+            if found is None:
+                tier = "disk"
+                found = self._load_locked(key)
+                if found:
+                    self._touched[key] = time.time()
+        return self._answer(fn, policy, found, tier)
+
+    async def aget(self, fn: str, model: str, prompt: str) -> Optional[str]:
+        """get() for the event loop: only a memory miss leaves it (to read SQLite)."""
+        policy = self.policy(fn)
+        if policy == "off":
+            return None
+        with self._lock:
+            found = self._memory_get_locked(cache_key(model, prompt))
+        if found is None:
+            return await asyncio.to_thread(self.get, fn, model, prompt)
+        return self._answer(fn, policy, found, "memory")
+
+    def _answer(self, fn: str, policy: str, found: Optional[List[str]], tier: str) -> Optional[str]:
+        if found and (policy == "exact" or len(found) >= self.variants):
+            cache_hits.inc(fn=fn, tier=tier)
+            return found[0] if policy == "exact" else random.choice(found)
+        cache_misses.inc(fn=fn)
+        return None
+
+    def get_any(self, fn: str, model: str, prompt: str) -> Optional[str]:
+        """Any stored response regardless of policy; the fallback when the model is down."""
+        key = cache_key(model, prompt)
+        with self._lock:
+            found = self._memory.get(key) or self._load_locked(key)
+        if not found:
+            return None
+        cache_hits.inc(fn=fn, tier="fallback")
+        return random.choice(found)
+
+    async def aget_any(self, fn: str, model: str, prompt: str) -> Optional[str]:
+        return await asyncio.to_thread(self.get_any, fn, model, prompt)
+
+    def put(self, fn: str, model: str, prompt: str, response: str) -> None:
+        """Stores a response that parsed successfully."""
+        policy = self.policy(fn)
+        if policy == "off":
+            return
+        key = cache_key(model, prompt)
+        with self._lock:
+            found = self._memory.get(key)
+            if found is None:
+                found = self._load_locked(key) or []
+            if policy == "exact":
+                found = [response]
+            elif response not in found and len(found) < self.variants:
+                found = found + [response]
+            else:
+                return
+            self._remember_locked(key, found)
+            try:
+                db = self._db_locked()
+                db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, variant, fn, response, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, len(found) - 1, fn, response, time.time()),
+                )
+                self._write_touches_locked(db)
+                db.commit()
+                self._disk_rows += 1
+                if self._disk_rows > self.max_entries:
+                    self._evict_locked(db)
+            except sqlite3.Error as e:
+                # the cache must never fail a model call
+                print(f"[llm_cache] write failed: {e}")
+
+    async def aput(self, fn: str, model: str, prompt: str, response: str) -> None:
+        if self.policy(fn) != "off":
+            await asyncio.to_thread(self.put, fn, model, prompt, response)
+
+    def memory_size(self) -> int:
+        with self._lock:
+            return len(self._memory)
+
+    def hit_ratio(self) -> float:
+        hits = sum(v for _, _, v in cache_hits.samples())
+        misses = sum(v for _, _, v in cache_misses.samples())
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    # ---- internals (self._lock held) ----
+
+    def _db_locked(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT NOT NULL, variant INTEGER NOT NULL, fn TEXT NOT NULL,"
+                " response TEXT NOT NULL, last_used REAL NOT NULL,"
+                " PRIMARY KEY (key, variant))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_used ON llm_cache (last_used)")
+            self._disk_rows = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return self._conn
+
+    def _load_locked(self, key: str) -> Optional[List[str]]:
+        try:
+            rows = self._db_locked().execute(
+                "SELECT response FROM llm_cache WHERE key = ? ORDER BY variant", (key,)
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"[llm_cache] read failed: {e}")
+            return None
+        if not rows:
+            return None
+        found = [r[0] for r in rows]
+        self._remember_locked(key, found)
+        return found
+
+    def _memory_get_locked(self, key: str) -> Optional[List[str]]:
+        found = self._memory.get(key)
+        if found is not None:
+            self._memory.move_to_end(key)
+        return found
+
+    def _write_touches_locked(self, db: sqlite3.Connection) -> None:
+        # part of the caller's transaction
+        if self._touched:
+            db.executemany("UPDATE llm_cache SET last_used = ? WHERE key = ?",
+                           [(t, k) for k, t in self._touched.items()])
+            self._touched.clear()
+
+    def _remember_locked(self, key: str, found: List[str]) -> None:
+        self._memory[key] = found
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_locked(self, db: sqlite3.Connection) -> None:
+        # trim to 90% so eviction runs once per batch of inserts, not per insert
+        keep = int(self.max_entries * 0.9)
+        db.execute(
+            "DELETE FROM llm_cache WHERE rowid IN"
+            " (SELECT rowid FROM llm_cache ORDER BY last_used LIMIT ?)",
+            (self._disk_rows - keep,),
+        )
+        db.commit()
+        self._disk_rows = db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        # evicted keys may still sit in the memory tier; that is harmless
+
+
+llm_cache = LlmCache()
+
+Gauge("fluentz_llm_cache_memory_entries", "Prompts held in the in-memory LLM cache tier", fn=llm_cache.memory_size)
+Gauge("fluentz_llm_cache_hit_ratio", "Share of cacheable model calls answered from the cache", fn=llm_cache.hit_ratio)
@@ -0,0 +1,293 @@
+from __future__ import annotations
+from typing import Callable, Deque, Dict, Optional, Tuple, TypeVar
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import asyncio
+import os
+import random
+import threading
+import time
+
+from openai import OpenAI, AsyncOpenAI
+
+from .metrics import Counter, Gauge, Histogram
+
+# Wrapper around the OpenAI clients used by ai_test. Every call gets:
+#   - a deadline (LLM_DEADLINES, per fn); each request's timeout is what is
+#     left of it
+#   - a hedged duplicate request once the call has run longer than the
+#     fn's recent LLM_HEDGE_PERCENTILE latency; the first answer wins
+#   - jittered-backoff retries when the answer does not parse
+#   - a circuit breaker: after LLM_BREAKER_FAILURES consecutive timeouts or
+#     API errors, calls fail fast with LlmUnavailable for
+#     LLM_BREAKER_COOLDOWN_SECONDS, then one trial call is let through.
+# Callers fall back to cached/banked items when a call fails.
+
+MODEL = os.getenv("ASSESSMENT_MODEL", "gpt-5.2")
+
+DEFAULT_DEADLINES = "make_mcq=20,make_writing_prompt=20,grade_writing=45,grade_writing_batch=90,grade_writing_stream=60"
+LLM_DEADLINES: Dict[str, float] = {
+    k: float(v) for k, v in (
+        part.split("=", 1) for part in os.getenv("LLM_DEADLINES", DEFAULT_DEADLINES).split(",") if "=" in part
+    )
+}
+LLM_DEFAULT_DEADLINE_SECONDS = float(os.getenv("LLM_DEFAULT_DEADLINE_SECONDS", "30"))
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+LLM_HEDGE_MIN_SECONDS = float(os.getenv("LLM_HEDGE_MIN_SECONDS", "2"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_PARSE_RETRIES = int(os.getenv("LLM_PARSE_RETRIES", "2"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.25"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+LLM_HEDGE_WORKERS = int(os.getenv("LLM_HEDGE_WORKERS", "16"))
+
+T = TypeVar("T")
+
+llm_calls = Counter("fluentz_llm_calls_total", "Model calls made by ai_test", labels=("fn",))
+llm_request_seconds = Histogram("fluentz_llm_request_seconds", "Model request latency by outcome",
+                                labels=("fn", "outcome"))
+llm_hedges = Counter("fluentz_llm_hedged_requests_total", "Duplicate requests sent for slow model calls", labels=("fn",))
+llm_retries = Counter("fluentz_llm_parse_retries_total", "Model calls retried after an unparseable answer", labels=("fn",))
+llm_rejected = Counter("fluentz_llm_breaker_rejections_total", "Model calls failed fast by the open circuit breaker",
+                       labels=("fn",))
+
+
+class LlmUnavailable(Exception):
+    """The circuit breaker is open or the deadline ran out."""
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, cooldown_seconds: float = LLM_BREAKER_COOLDOWN_SECONDS):
+        self.failures = failures
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+
+    def state(self) -> int:
+        with self._lock:
+            if self._opened_at is None:
+                return self.CLOSED
+            if time.monotonic() - self._opened_at < self.cooldown_seconds:
+                return self.OPEN
+            return self.HALF_OPEN
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown_seconds or self._trial_running:
+                return False
+            self._trial_running = True  # half-open: one trial call
+            return True
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            self._trial_running = False
+            if ok:
+                self._consecutive = 0
+                self._opened_at = None
+                return
+            self._consecutive += 1
+            if self._consecutive >= self.failures:
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """The call was cancelled before an outcome: free the half-open trial, count nothing."""
+        with self._lock:
+            self._trial_running = False
+
+
+class LlmClient:
+    def __init__(self):
+        self.client = OpenAI(max_retries=0)
+        self.async_client = AsyncOpenAI(max_retries=0)
+        self.breaker = CircuitBreaker()
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=LLM_HEDGE_WORKERS, thread_name_prefix="llm-hedge")
+
+    # ---- policy ----
+
+    def deadline(self, fn: str) -> float:
+        return LLM_DEADLINES.get(fn, LLM_DEFAULT_DEADLINE_SECONDS)
+
+    def hedge_after(self, fn: str) -> Optional[float]:
+        """Seconds before a duplicate request is sent, or None (not enough data yet)."""
+        with self._lock:
+            recent = sorted(self._latencies.get(fn, ()))
+        if len(recent) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return max(LLM_HEDGE_MIN_SECONDS, recent[min(len(recent) - 1, int(len(recent) * LLM_HEDGE_PERCENTILE))])
+
+    def _observe(self, fn: str, started: float, outcome: str) -> None:
+        elapsed = time.monotonic() - started
+        llm_request_seconds.observe(elapsed, fn=fn, outcome=outcome)
+        if outcome == "ok":
+            with self._lock:
+                self._latencies.setdefault(fn, deque(maxlen=200)).append(elapsed)
+
+    def _backoff(self, attempt: int, remaining: float) -> float:
+        # full jitter, never past the deadline
+        return min(remaining, random.uniform(0, LLM_RETRY_BASE_SECONDS * (2 ** attempt)))
+
+    def _check_breaker(self, fn: str) -> None:
+        if not self.breaker.allow():
+            llm_rejected.inc(fn=fn)
+            raise LlmUnavailable(f"{fn}: circuit breaker open")
+
+    # ---- sync ----
+
+    def _request(self, fn: str, prompt: str, timeout: float) -> str:
+        llm_calls.inc(fn=fn)
+        started = time.monotonic()
+        try:
+            r = self.client.with_options(timeout=timeout).responses.create(model=MODEL, input=prompt)
+        except Exception as e:
+            self._observe(fn, started, "timeout" if "timeout" in type(e).__name__.lower() else "error")
+            raise
+        self._observe(fn, started, "ok")
+        return r.output_text.strip()
+
+    def _hedged(self, fn: str, prompt: str, deadline_at: float) -> str:
+        remaining = deadline_at - time.monotonic()
+        first = self._executor.submit(self._request, fn, prompt, remaining)
+        pending = {first}
+        hedge_after = self.hedge_after(fn)
+        if hedge_after is not None and hedge_after < remaining:
+            done, _ = wait(pending, timeout=hedge_after)
+            if not done:
+                llm_hedges.inc(fn=fn)
+                pending.add(self._executor.submit(self._request, fn, prompt, deadline_at - time.monotonic()))
+
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline_at - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for f in done:
+                if f.exception() is None:
+                    return f.result()  # the other request finishes on its own
+                error = f.exception()
+        raise error or LlmUnavailable(f"{fn}: deadline exceeded")
+
+    def complete(self, fn: str, prompt: str, parse: Callable[[str], T]) -> Tuple[str, T]:
+        """(raw text, parsed value) for prompt, within the fn's deadline."""
+        deadline_at = time.monotonic() + self.deadline(fn)
+        for attempt in range(LLM_PARSE_RETRIES + 1):
+            self._check_breaker(fn)
+            try:
+                text = self._hedged(fn, prompt, deadline_at)
+            except Exception:
+                self.breaker.record(False)
+                raise
+            except BaseException:
+                self.breaker.release()
+                raise
+            self.breaker.record(True)
+            try:
+                return text, parse(text)
+            except Exception:
+                remaining = deadline_at - time.monotonic()
+                if attempt == LLM_PARSE_RETRIES or remaining <= 0:
+                    raise
+                llm_retries.inc(fn=fn)
+                time.sleep(self._backoff(attempt, remaining))
+        raise AssertionError("unreachable")
+
+    # ---- async ----
+
+    async def _arequest(self, fn: str, prompt: str, timeout: float) -> str:
+        llm_calls.inc(fn=fn)
+        started = time.monotonic()
+        try:
+            r = await self.async_client.with_options(timeout=timeout).responses.create(model=MODEL, input=prompt)
+        except asyncio.CancelledError:
+            raise  # lost the hedge race
+        except Exception as e:
+            self._observe(fn, started, "timeout" if "timeout" in type(e).__name__.lower() else "error")
+            raise
+        self._observe(fn, started, "ok")
+        return r.output_text.strip()
+
+    async def _ahedged(self, fn: str, prompt: str, deadline_at: float) -> str:
+        remaining = deadline_at - time.monotonic()
+        pending = {asyncio.ensure_future(self._arequest(fn, prompt, remaining))}
+        hedge_after = self.hedge_after(fn)
+        try:
+            if hedge_after is not None and hedge_after < remaining:
+                done, _ = await asyncio.wait(pending, timeout=hedge_after)
+                if not done:
+                    llm_hedges.inc(fn=fn)
+                    pending.add(asyncio.ensure_future(self._arequest(fn, prompt, deadline_at - time.monotonic())))
+
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0.0, deadline_at - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    break
+                for t in done:
+                    if t.exception() is None:
+                        return t.result()
+                    error = t.exception()
+            raise error or LlmUnavailable(f"{fn}: deadline exceeded")
+        finally:
+            for t in pending:
+                t.cancel()
+
+    async def acomplete(self, fn: str, prompt: str, parse: Callable[[str], T]) -> Tuple[str, T]:
+        deadline_at = time.monotonic() + self.deadline(fn)
+        for attempt in range(LLM_PARSE_RETRIES + 1):
+            self._check_breaker(fn)
+            try:
+                text = await self._ahedged(fn, prompt, deadline_at)
+            except Exception:
+                self.breaker.record(False)
+                raise
+            except BaseException:
+                self.breaker.release()  # cancelled
+                raise
+            self.breaker.record(True)
+            try:
+                return text, parse(text)
+            except Exception:
+                remaining = deadline_at - time.monotonic()
+                if attempt == LLM_PARSE_RETRIES or remaining <= 0:
+                    raise
+                llm_retries.inc(fn=fn)
+                await asyncio.sleep(self._backoff(attempt, remaining))
+        raise AssertionError("unreachable")
+
+    async def astream(self, fn: str, prompt: str):
+        """Streaming response events; deadline and breaker apply, no hedging or retries."""
+        self._check_breaker(fn)
+        llm_calls.inc(fn=fn)
+        started = time.monotonic()
+        try:
+            stream = await self.async_client.with_options(timeout=self.deadline(fn)).responses.create(
+                model=MODEL, input=prompt, stream=True
+            )
+            async for event in stream:
+                yield event
+        except Exception as e:
+            self.breaker.record(False)
+            self._observe(fn, started, "timeout" if "timeout" in type(e).__name__.lower() else "error")
+            raise
+        except BaseException:
+            self.breaker.release()  # cancelled, or closed early (client disconnected)
+            raise
+        self.breaker.record(True)
+        self._observe(fn, started, "ok")
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+llm_client = LlmClient()
+
+Gauge("fluentz_llm_breaker_state", "LLM circuit breaker: 0 closed, 1 open, 2 half-open", fn=llm_client.breaker.state)
@@ -1,18 +1,30 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Response, Header
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import select, desc
-from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, insert, tuple_, func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from datetime import datetime
 import json
-from .matching_service import get_recommendations
+import asyncio
+from .matching_service import get_recommendations, encode_cursor, decode_cursor
+from .matching_index import matching_index, matching_index_sync, refresh_matching_index
+from .matching_cache import recommendation_cache, MATCH_CACHE_DEPTH
+from .matching_batch import load_materialized, mark_pairs_touched, MATCH_BATCH_TOP_K
+from .metrics import render_all
+from .http_metrics import MetricsMiddleware
 
 # NEW for stateless assessment
 import os
 import base64
 import hmac
 import hashlib
-from pydantic import BaseModel
+import time
+from typing import Optional, Set, Tuple
+from pydantic import BaseModel, Field
 
-from .db import get_db
+from .db import get_db, get_async_db, get_read_db, get_async_read_db, SessionLocal, AsyncSessionLocal
 from .models import (
     User,
     EmailOtpCode,
@@ -20,8 +32,7 @@ from .models import (
     LearnerProfile,
     UserLanguage,
     UserInterest,
-    Language,
-    Interest,
+    MatchRecommendation,
 )
 from .schemas import (
     RegisterIn, RegisterOut,
@@ -32,62 +43,149 @@ from .schemas import (
 )
 
 from .security import (
-    hash_password, verify_password,
+    ahash_password, averify_password, shutdown_hash_pool,
     create_access_token,
-    generate_otp, otp_hash
+    otp_hash
 )
 from .emailer import send_otp_email
+from .otp import issue_otp, otp_purger
+from .auth import get_token_claims, get_current_user, check_subject, load_user, aload_user, user_cache, CurrentUser
+from .reference_data import reference_catalog, reference_catalog_sync, LanguageRef, etag_matches
 
 from .cefr import harder, easier, writing_score_to_cefr
-from .ai_test import make_mcq, make_writing_prompt, grade_writing
+from .ai_test import amake_mcq, amake_writing_prompt, agrade_writing_stream, assessments_completed
+from .admission import admission, Overloaded
+from .llm_client import llm_client
+from .grading_queue import grading_queue, new_job_id, finalize_job, jobs_finished
+from .writing_prescore import prescore
+from .models_assessment import AssessmentGradingJob
+from .mcq_pool import mcq_pool
+from .mcq_speculation import speculator
+from . import item_bank
 
 
 app = FastAPI(title="Fluentz API")
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request, exc: Overloaded):
+    # fail fast so clients back off instead of piling onto the model
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many assessments in progress, please retry shortly"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.on_event("startup")
+def load_reference_catalog():
+    db = SessionLocal()
+    try:
+        reference_catalog.reload(db)
+    except Exception as e:
+        # loaded on first use instead
+        print(f"[reference] catalog load failed: {e}")
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+def build_matching_index():
+    try:
+        refresh_matching_index()
+    except Exception as e:
+        # /matching/recommend falls back to the DB until the resync task builds it
+        print(f"[matching] index rebuild failed: {e}")
+
+
+@app.on_event("startup")
+async def start_matching_index_sync():
+    matching_index_sync.start()
+
+
+@app.on_event("startup")
+async def start_reference_catalog_sync():
+    reference_catalog_sync.start()
 
-OTP_EXPIRE_MINUTES = 10
-OTP_ATTEMPTS = 5
+
+@app.on_event("startup")
+def warm_mcq_pool():
+    db = SessionLocal()
+    try:
+        reference_catalog.ensure_loaded(db)
+        names = [l.name for l in reference_catalog.languages()]
+    except Exception as e:
+        print(f"[mcq_pool] warm-up skipped: {e}")
+        return
+    finally:
+        db.close()
+    # every assessment starts at B1; neighbours are warmed as levels get used
+    mcq_pool.warm(names, levels=("B1",))
+
+
+@app.on_event("startup")
+async def start_grading_queue():
+    await grading_queue.start()
+
+
+@app.on_event("startup")
+async def start_otp_purge():
+    otp_purger.start()
+
+
+@app.on_event("shutdown")
+def stop_mcq_pool():
+    speculator.shutdown()
+    mcq_pool.shutdown()
+    llm_client.shutdown()
+    shutdown_hash_pool()
+
+
+@app.on_event("shutdown")
+async def stop_grading_queue():
+    await grading_queue.stop()
+    await otp_purger.stop()
+    await matching_index_sync.stop()
+    await reference_catalog_sync.stop()
 
 # =========================
 # Health
 # =========================
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+async def metrics():
+    return Response(content=render_all(), media_type="text/plain; version=0.0.4")
+
+
 # =========================
 # Auth: Register
 # =========================
 @app.post("/auth/register", response_model=RegisterOut)
-def register(payload: RegisterIn, db: Session = Depends(get_db)):
-    existing = db.execute(select(User).where(User.email == payload.email)).scalar_one_or_none()
+async def register(payload: RegisterIn, db: AsyncSession = Depends(get_async_db)):
+    existing = (await db.execute(select(User).where(User.email == payload.email))).scalar_one_or_none()
     if existing:
         raise HTTPException(status_code=409, detail="Email already exists")
 
     user = User(
         full_name=payload.full_name,
         email=payload.email,
-        password_hash=hash_password(payload.password),
+        password_hash=await ahash_password(payload.password),
         role="learner",
         is_email_verified=False,
         onboarding_status="registered"
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
 
-    otp = generate_otp()
-    code = EmailOtpCode(
-        user_id=user.id,
-        otp_hash=otp_hash(int(user.id), otp),
-        expires_at=datetime.utcnow() + timedelta(minutes=OTP_EXPIRE_MINUTES),
-        used_at=None,
-        attempts_left=OTP_ATTEMPTS
-    )
-    db.add(code)
-    db.commit()
+    otp, _ = await issue_otp(db, int(user.id))
 
-    send_otp_email(user.email, otp)
+    await run_in_threadpool(send_otp_email, user.email, otp)
     return {"user_id": int(user.id), "message": "Registered. OTP sent."}
 
 
@@ -95,26 +193,21 @@ def register(payload: RegisterIn, db: Session = Depends(get_db)):
 # Auth: Resend OTP
 # =========================
 @app.post("/auth/resend-otp")
-def resend_otp(payload: ResendOtpIn, db: Session = Depends(get_db)):
-    user = db.execute(select(User).where(User.email == payload.email)).scalar_one_or_none()
+async def resend_otp(payload: ResendOtpIn, db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(select(User).where(User.email == payload.email))).scalar_one_or_none()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     if user.is_email_verified:
         return {"message": "Email already verified"}
 
-    otp = generate_otp()
-    code = EmailOtpCode(
-        user_id=user.id,
-        otp_hash=otp_hash(int(user.id), otp),
-        expires_at=datetime.utcnow() + timedelta(minutes=OTP_EXPIRE_MINUTES),
-        used_at=None,
-        attempts_left=OTP_ATTEMPTS
-    )
-    db.add(code)
-    db.commit()
+    email = user.email
+    otp, wait = await issue_otp(db, int(user.id))
+    if otp is None:
+        raise HTTPException(status_code=429, detail=f"OTP already sent. Try again in {wait} seconds.",
+                            headers={"Retry-After": str(wait)})
 
-    send_otp_email(user.email, otp)
+    await run_in_threadpool(send_otp_email, email, otp)
     return {"message": "OTP resent"}
 
 
@@ -134,15 +227,12 @@ def verify_otp(payload: VerifyOtpIn, db: Session = Depends(get_db)):
             "next_step": "profile_setup"
         }
 
+    # one row per user (see otp.py)
     otp_row = db.execute(
-        select(EmailOtpCode)
-        .where(EmailOtpCode.user_id == user.id)
-        .where(EmailOtpCode.used_at.is_(None))
-        .order_by(desc(EmailOtpCode.created_at), desc(EmailOtpCode.id))
-        .limit(1)
+        select(EmailOtpCode).where(EmailOtpCode.user_id == user.id)
     ).scalar_one_or_none()
 
-    if not otp_row:
+    if not otp_row or otp_row.used_at is not None:
         raise HTTPException(status_code=400, detail="No active OTP. Resend OTP.")
 
     if datetime.utcnow() > otp_row.expires_at:
@@ -156,10 +246,11 @@ def verify_otp(payload: VerifyOtpIn, db: Session = Depends(get_db)):
         db.commit()
         raise HTTPException(status_code=400, detail=f"Invalid OTP. Attempts left: {otp_row.attempts_left}")
 
-    otp_row.used_at = datetime.utcnow()
+    db.delete(otp_row)
     user.is_email_verified = True
     user.onboarding_status = "verified"
     db.commit()
+    user_cache.invalidate(int(user.id))
 
     return {
         "message": "Email verified",
@@ -175,10 +266,17 @@ def verify_otp(payload: VerifyOtpIn, db: Session = Depends(get_db)):
 # Auth: Login
 # =========================
 @app.post("/auth/login", response_model=LoginOut)
-def login(payload: LoginIn, db: Session = Depends(get_db)):
-    user = db.execute(select(User).where(User.email == payload.email)).scalar_one_or_none()
-    if not user or not verify_password(payload.password, user.password_hash):
+async def login(payload: LoginIn, db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(select(User).where(User.email == payload.email))).scalar_one_or_none()
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    ok, new_hash = await averify_password(payload.password, user.password_hash)
+    if not ok:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:
+        # stored hash uses outdated Argon2 parameters
+        user.password_hash = new_hash
+        await db.commit()
 
     if not user.is_email_verified:
         raise HTTPException(status_code=403, detail="Email not verified")
@@ -195,15 +293,30 @@ from pydantic import BaseModel
 
 class MatchingRequest(BaseModel):
     user_id: int
+    limit: int = Field(default=20, ge=1, le=100)
+    cursor: Optional[str] = None  # "next_cursor" from the previous page
 
 
 @app.post("/matching/recommend")
-def matching_recommend(payload: MatchingRequest, db: Session = Depends(get_db)):
+def matching_recommend(payload: MatchingRequest, db: Session = Depends(get_read_db),
+                       claims: Optional[dict] = Depends(get_token_claims)):
     user_id = payload.user_id
+    check_subject(claims, user_id)
 
-    user = db.execute(
-        select(User).where(User.id == user_id)
-    ).scalar_one_or_none()
+    after = None
+    if payload.cursor:
+        try:
+            after = decode_cursor(payload.cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # indexed users have a completed profile, so the status check holds;
+    # the extra row tells us whether there is a next page
+    recommendations = _indexed_recommendations(db, user_id, payload.limit + 1, after)
+    if recommendations is not None:
+        return _matching_response(user_id, recommendations, payload.limit)
+
+    user = load_user(db, user_id, cache=False)  # db may be the replica
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -214,10 +327,52 @@ def matching_recommend(payload: MatchingRequest, db: Session = Depends(get_db)):
             detail="User must complete profile first"
         )
 
-    recommendations = get_recommendations(db, user_id=user_id, limit=20)
+    recommendations = get_recommendations(db, user_id=user_id, limit=payload.limit + 1, after=after)
+    return _matching_response(user_id, recommendations, payload.limit)
+
+
+def _indexed_recommendations(db: Session, user_id: int, limit: int, after) -> Optional[list]:
+    page = recommendation_cache.get_page(user_id, limit, after)
+    if page is not None:
+        return page
+
+    pool = matching_index.pool_of(user_id)
+    if pool is None:
+        return None
+
+    # deeper pages than the cache holds are computed live
+    if after is not None or limit > MATCH_CACHE_DEPTH:
+        return matching_index.recommend(user_id, limit=limit, after=after)
+
+    generation = recommendation_cache.generation()
+
+    # nightly materialized ranking while its pair is fresh, else live
+    rows = load_materialized(db, user_id, pool)
+    if rows is not None:
+        complete = len(rows) < MATCH_BATCH_TOP_K
+    else:
+        rows = matching_index.recommend(user_id, limit=MATCH_CACHE_DEPTH + 1)
+        if rows is None:
+            return None
+        complete = len(rows) <= MATCH_CACHE_DEPTH
+
+    rows = rows[:MATCH_CACHE_DEPTH]
+    recommendation_cache.put(user_id, pool, rows, complete, generation)
+    if len(rows) < limit and not complete:
+        return matching_index.recommend(user_id, limit=limit)
+    return [dict(r) for r in rows[:limit]]
+
+
+def _matching_response(user_id: int, recommendations: list, limit: int) -> dict:
+    next_cursor = None
+    if len(recommendations) > limit:
+        recommendations = recommendations[:limit]
+        last = recommendations[-1]
+        next_cursor = encode_cursor(last["score"], last["user_id"])
 
     return {
         "user_id": user_id,
+        "next_cursor": next_cursor,
         "recommended_matches": [
             {
                 "id": r["user_id"],
@@ -235,7 +390,9 @@ def matching_recommend(payload: MatchingRequest, db: Session = Depends(get_db)):
 # (Optional) Simple assessment submit (manual)
 # =========================
 @app.post("/assessment/submit")
-def submit_assessment(user_id: int, payload: SubmitAssessmentIn, db: Session = Depends(get_db)):
+def submit_assessment(user_id: int, payload: SubmitAssessmentIn, db: Session = Depends(get_db),
+                      claims: Optional[dict] = Depends(get_token_claims)):
+    check_subject(claims, user_id)
     user = db.execute(select(User).where(User.id == user_id)).scalar_one_or_none()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -249,6 +406,7 @@ def submit_assessment(user_id: int, payload: SubmitAssessmentIn, db: Session = D
     db.add(a)
     user.onboarding_status = "assessed"
     db.commit()
+    user_cache.invalidate(int(user.id))
 
     return {"message": "Assessment saved", "status": user.onboarding_status}
 
@@ -257,7 +415,9 @@ def submit_assessment(user_id: int, payload: SubmitAssessmentIn, db: Session = D
 # Profile: Complete
 # =========================
 @app.post("/profile/complete")
-def complete_profile(payload: CompleteProfileIn, db: Session = Depends(get_db)):
+def complete_profile(payload: CompleteProfileIn, db: Session = Depends(get_db),
+                     claims: Optional[dict] = Depends(get_token_claims)):
+    check_subject(claims, payload.user_id)
     user = db.execute(select(User).where(User.id == payload.user_id)).scalar_one_or_none()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -267,69 +427,122 @@ def complete_profile(payload: CompleteProfileIn, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="User must verify email first")
 
     # Upsert learner_profile
-    lp = db.execute(select(LearnerProfile).where(LearnerProfile.user_id == user.id)).scalar_one_or_none()
-    if not lp:
-        lp = LearnerProfile(
-            user_id=user.id,
-            date_of_birth=payload.date_of_birth,
-            gender=payload.gender,
-            short_description=payload.short_description,
-            profile_photo_url=payload.profile_photo_url
-        )
-        db.add(lp)
-    else:
-        lp.date_of_birth = payload.date_of_birth
-        lp.gender = payload.gender
-        lp.short_description = payload.short_description
-        lp.profile_photo_url = payload.profile_photo_url
-
-    # Reset languages/interests (MVP)
-    db.query(UserLanguage).filter(UserLanguage.user_id == user.id).delete()
-    db.query(UserInterest).filter(UserInterest.user_id == user.id).delete()
-    db.flush()
-
-    # Languages
-    db.add(UserLanguage(user_id=user.id, language_id=payload.native_language_id, type="native"))
-
-    for lid in payload.fluent_language_ids:
-        if lid != payload.native_language_id:
-            db.add(UserLanguage(user_id=user.id, language_id=lid, type="fluent"))
-
-    for lid in payload.target_language_ids:
-        if lid == payload.native_language_id:
-            continue
-        db.add(UserLanguage(
-            user_id=user.id,
-            language_id=lid,
-            type="target",
-            proficiency_level=None
+    profile = dict(
+        date_of_birth=payload.date_of_birth,
+        gender=payload.gender,
+        short_description=payload.short_description,
+        profile_photo_url=payload.profile_photo_url,
+    )
+    stmt = mysql_insert(LearnerProfile).values(user_id=user.id, **profile)
+    # always move updated_at (MySQL keeps it when no column changes): other
+    # workers resync their matching index from it, and languages/interests
+    # may have changed even if the profile row did not
+    db.execute(stmt.on_duplicate_key_update(updated_at=func.now(), **{k: stmt.inserted[k] for k in profile}))
+
+    # Languages/interests: only write what changed, one statement per kind
+    wanted_languages = {(payload.native_language_id, "native")}
+    wanted_languages |= {(lid, "fluent") for lid in payload.fluent_language_ids if lid != payload.native_language_id}
+    wanted_languages |= {(lid, "target") for lid in payload.target_language_ids if lid != payload.native_language_id}
+    stored_languages = {
+        (int(lid), t) for lid, t in db.execute(
+            select(UserLanguage.language_id, UserLanguage.type).where(UserLanguage.user_id == user.id)
+        ).all()
+    }
+    wanted_interests = set(payload.interest_ids)
+    stored_interests = set(db.execute(
+        select(UserInterest.interest_id).where(UserInterest.user_id == user.id)
+    ).scalars().all())
+
+    gone = stored_languages - wanted_languages
+    if gone:
+        db.execute(delete(UserLanguage).where(
+            UserLanguage.user_id == user.id,
+            tuple_(UserLanguage.language_id, UserLanguage.type).in_(sorted(gone)),
         ))
-
-    # Interests
-    for iid in sorted(set(payload.interest_ids)):
-        db.add(UserInterest(user_id=user.id, interest_id=iid))
+    new = wanted_languages - stored_languages
+    if new:
+        db.execute(insert(UserLanguage).values([
+            {"user_id": user.id, "language_id": lid, "type": t} for lid, t in sorted(new)
+        ]))
+
+    gone = stored_interests - wanted_interests
+    if gone:
+        db.execute(delete(UserInterest).where(
+            UserInterest.user_id == user.id, UserInterest.interest_id.in_(sorted(gone))
+        ))
+    new = wanted_interests - stored_interests
+    if new:
+        db.execute(insert(UserInterest).values([{"user_id": user.id, "interest_id": iid} for iid in sorted(new)]))
 
     # ✅ Only set profile_completed if not already assessed
     if user.onboarding_status != "assessed":
         user.onboarding_status = "profile_completed"
+    # read before commit expires them
+    user_id, full_name, status = int(user.id), user.full_name, user.onboarding_status
 
     db.commit()
-    return {"message": "Profile completed", "status": user.onboarding_status}
+    user_cache.invalidate(user_id)
+
+    touched_pairs = matching_index.upsert_user(
+        user_id=user_id,
+        full_name=full_name,
+        date_of_birth=payload.date_of_birth,
+        profile_photo_url=payload.profile_photo_url,
+        native_language_id=payload.native_language_id,
+        target_language_ids=payload.target_language_ids,
+        interest_ids=payload.interest_ids,
+    )
+    recommendation_cache.invalidate(user_id, touched_pairs)
+
+    # the nightly job recomputes these pairs; this user's own stored
+    # ranking is stale right away
+    mark_pairs_touched(db, touched_pairs)
+    db.execute(delete(MatchRecommendation).where(MatchRecommendation.user_id == user_id))
+    db.commit()
+    return {"message": "Profile completed", "status": status}
 
 
 # =========================
 # Meta
 # =========================
+# served from reference_catalog; clients revalidate with If-None-Match
+def _meta_response(body: bytes, etag: str, if_none_match: Optional[str]) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @app.get("/meta/languages")
-def list_languages(db: Session = Depends(get_db)):
-    rows = db.execute(select(Language).order_by(Language.name)).scalars().all()
-    return [{"id": int(r.id), "code": r.code, "name": r.name} for r in rows]
+async def list_languages(db: AsyncSession = Depends(get_async_read_db), if_none_match: Optional[str] = Header(None)):
+    if not reference_catalog.loaded:
+        await db.run_sync(reference_catalog.ensure_loaded)
+    return _meta_response(*reference_catalog.languages_response(), if_none_match)
 
 
 @app.get("/meta/interests")
-def list_interests(db: Session = Depends(get_db)):
-    rows = db.execute(select(Interest).order_by(Interest.name)).scalars().all()
-    return [{"id": int(r.id), "name": r.name} for r in rows]
+async def list_interests(db: AsyncSession = Depends(get_async_read_db), if_none_match: Optional[str] = Header(None)):
+    if not reference_catalog.loaded:
+        await db.run_sync(reference_catalog.ensure_loaded)
+    return _meta_response(*reference_catalog.interests_response(), if_none_match)
+
+
+@app.post("/meta/reload")
+async def reload_meta(user: CurrentUser = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    """
+    Re-reads languages and interests after the tables were edited. Other
+    workers pick the edit up within REFERENCE_SYNC_SECONDS.
+    """
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+    await db.run_sync(reference_catalog.reload)
+    return {"message": "Reference data reloaded", "version": reference_catalog.version()}
+
+
+async def _language(db: AsyncSession, language_id: int) -> Optional[LanguageRef]:
+    if not reference_catalog.loaded:
+        await db.run_sync(reference_catalog.ensure_loaded)
+    return reference_catalog.language(language_id)
 
 
 # ============================================================
@@ -337,6 +550,7 @@ def list_interests(db: Session = Depends(get_db)):
 # ============================================================
 
 MAX_CORE_QUESTIONS = 8
+GRADING_SSE_POLL_SECONDS = float(os.getenv("GRADING_SSE_POLL_SECONDS", "1"))
 
 # Put this in your .env:
 # ASSESSMENT_SECRET=some-long-random-string
@@ -387,23 +601,62 @@ class AiAssessmentWritingIn(BaseModel):
     text: str
 
 
+# item_bank is sync; AsyncSession.run_sync runs it on the session's connection.
+
+async def _serve_mcq(db: AsyncSession, user_id: int, lang: LanguageRef, level: str, spec: Optional[str] = None):
+    """Unseen banked item first, then the speculated branch, then pool/inline."""
+    picked = await db.run_sync(item_bank.pick_mcq, user_id, int(lang.id), level)
+    if picked:
+        speculator.release(spec)
+        item_id, q = picked
+    else:
+        try:
+            q = (await speculator.aclaim(spec, level) if spec else None) or mcq_pool.take(lang.name, level)
+            if q is None:
+                async with admission.slot(user_id):
+                    q = await amake_mcq(lang.name, level)
+        except Overloaded:
+            raise
+        except Exception as e:
+            # model unavailable: repeat a banked question rather than fail the step
+            picked = await db.run_sync(item_bank.pick_mcq, user_id, int(lang.id), level, True)
+            if not picked:
+                raise HTTPException(status_code=503, detail="Question generator unavailable, please retry") from e
+            item_id, q = picked
+        else:
+            item_id = await db.run_sync(item_bank.store_mcq, int(lang.id), level, q)
+    await db.run_sync(item_bank.record_exposure, user_id, item_id)
+    return item_id, q
+
+
+async def _speculate_next(db: AsyncSession, user_id: int, lang: LanguageRef, level: str) -> Optional[str]:
+    # generate both possible next questions while the learner reads this one,
+    # except for levels the bank can already serve
+    banked = await db.run_sync(item_bank.unseen_levels, user_id, int(lang.id), (harder(level), easier(level)))
+    return speculator.speculate(lang.name, level, skip=banked)
+
+
 @app.post("/assessment/ai/start")
-def ai_assessment_start(payload: AiAssessmentStartIn, db: Session = Depends(get_db)):
-    user = db.execute(select(User).where(User.id == payload.user_id)).scalar_one_or_none()
+async def ai_assessment_start(payload: AiAssessmentStartIn, db: AsyncSession = Depends(get_async_db),
+                              claims: Optional[dict] = Depends(get_token_claims)):
+    check_subject(claims, payload.user_id)
+    user = await aload_user(db, payload.user_id, fresh=True)  # status gate: not another worker's stale entry
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     if user.onboarding_status != "profile_completed":
         raise HTTPException(status_code=400, detail="User must complete profile first")
 
-    lang = db.execute(select(Language).where(Language.id == payload.language_id)).scalar_one_or_none()
+    lang = await _language(db, payload.language_id)
     if not lang:
         raise HTTPException(status_code=400, detail="Invalid language_id")
 
     estimated = "B1"
     step = 1
 
-    q = make_mcq(lang.name, estimated)
+    item_id, q = await _serve_mcq(db, int(user.id), lang, estimated)
+    spec = await _speculate_next(db, int(user.id), lang, estimated) if step < MAX_CORE_QUESTIONS else None
+    await db.commit()
 
     state_token = sign_json({
         "user_id": int(user.id),
@@ -411,6 +664,7 @@ def ai_assessment_start(payload: AiAssessmentStartIn, db: Session = Depends(get_
         "step": step,
         "estimated": estimated,
         "phase": "mcq",
+        "spec": spec,
         "ts": int(datetime.utcnow().timestamp())
     })
 
@@ -418,6 +672,7 @@ def ai_assessment_start(payload: AiAssessmentStartIn, db: Session = Depends(get_
         "user_id": int(user.id),
         "language_id": int(lang.id),
         "step": step,
+        "item_id": item_id,
         "correct": q["correct"]
     })
 
@@ -433,9 +688,11 @@ def ai_assessment_start(payload: AiAssessmentStartIn, db: Session = Depends(get_
 
 
 @app.post("/assessment/ai/answer-mcq")
-def ai_assessment_answer(payload: AiAssessmentAnswerIn, db: Session = Depends(get_db)):
+async def ai_assessment_answer(payload: AiAssessmentAnswerIn, db: AsyncSession = Depends(get_async_db),
+                               claims: Optional[dict] = Depends(get_token_claims)):
     state = verify_json(payload.state_token)
     key = verify_json(payload.answer_key)
+    check_subject(claims, state.get("user_id"))
 
     # token consistency
     if key.get("user_id") != state.get("user_id") or key.get("language_id") != state.get("language_id") or key.get("step") != state.get("step"):
@@ -446,7 +703,7 @@ def ai_assessment_answer(payload: AiAssessmentAnswerIn, db: Session = Depends(ge
     step = int(state["step"])
     estimated = str(state["estimated"])
 
-    lang = db.execute(select(Language).where(Language.id == language_id)).scalar_one_or_none()
+    lang = await _language(db, language_id)
     if not lang:
         raise HTTPException(status_code=400, detail="Invalid language_id")
 
@@ -456,12 +713,31 @@ def ai_assessment_answer(payload: AiAssessmentAnswerIn, db: Session = Depends(ge
     is_correct = choice == correct
     prev_feedback = "Correct ✅" if is_correct else f"Incorrect ❌. Correct answer is {correct}."
 
+    if key.get("item_id"):
+        await db.run_sync(item_bank.record_answer, user_id, int(key["item_id"]), is_correct)
+
     estimated = harder(estimated) if is_correct else easier(estimated)
     next_step = step + 1
 
     # done core -> writing prompt
     if next_step > MAX_CORE_QUESTIONS:
-        wp = make_writing_prompt(lang.name, estimated)
+        picked = await db.run_sync(item_bank.pick_writing_prompt, user_id, language_id, estimated)
+        if picked:
+            writing_item_id, wp = picked
+        else:
+            try:
+                async with admission.slot(user_id):
+                    wp = await amake_writing_prompt(lang.name, estimated)
+                writing_item_id = await db.run_sync(item_bank.store_writing_prompt, language_id, estimated, wp)
+            except Overloaded:
+                raise
+            except Exception as e:
+                picked = await db.run_sync(item_bank.pick_writing_prompt, user_id, language_id, estimated, True)
+                if not picked:
+                    raise HTTPException(status_code=503, detail="Prompt generator unavailable, please retry") from e
+                writing_item_id, wp = picked
+        await db.run_sync(item_bank.record_exposure, user_id, writing_item_id)
+        await db.commit()
 
         next_state_token = sign_json({
             "user_id": user_id,
@@ -469,6 +745,10 @@ def ai_assessment_answer(payload: AiAssessmentAnswerIn, db: Session = Depends(ge
             "step": next_step,
             "estimated": estimated,
             "phase": "writing",
+            # graded against exactly what the learner saw
+            "writing_item_id": writing_item_id,
+            "writing_prompt": wp["prompt"],
+            "writing_limits": [int(wp["min_words"]), int(wp["max_words"])],
             "ts": int(datetime.utcnow().timestamp())
         })
 
@@ -483,7 +763,9 @@ def ai_assessment_answer(payload: AiAssessmentAnswerIn, db: Session = Depends(ge
         }
 
     # otherwise next MCQ
-    q = make_mcq(lang.name, estimated)
+    item_id, q = await _serve_mcq(db, user_id, lang, estimated, spec=state.get("spec"))
+    spec = await _speculate_next(db, user_id, lang, estimated) if next_step < MAX_CORE_QUESTIONS else None
+    await db.commit()
 
     next_state_token = sign_json({
         "user_id": user_id,
@@ -491,6 +773,7 @@ def ai_assessment_answer(payload: AiAssessmentAnswerIn, db: Session = Depends(ge
         "step": next_step,
         "estimated": estimated,
         "phase": "mcq",
+        "spec": spec,
         "ts": int(datetime.utcnow().timestamp())
     })
 
@@ -498,6 +781,7 @@ def ai_assessment_answer(payload: AiAssessmentAnswerIn, db: Session = Depends(ge
         "user_id": user_id,
         "language_id": language_id,
         "step": next_step,
+        "item_id": item_id,
         "correct": q["correct"]
     })
 
@@ -514,61 +798,255 @@ def ai_assessment_answer(payload: AiAssessmentAnswerIn, db: Session = Depends(ge
     }
 
 
-@app.post("/assessment/ai/submit-writing")
-def ai_assessment_submit_writing(payload: AiAssessmentWritingIn, db: Session = Depends(get_db)):
+async def _writing_submission(db: AsyncSession, payload: AiAssessmentWritingIn, claims: Optional[dict]
+                              ) -> Tuple[AssessmentGradingJob, LanguageRef, Optional[dict], bool]:
+    """
+    Validates a writing submission. Returns its (unsaved) grading job, the
+    language, the local pre-score grade when the text needs no model call,
+    and False. For a retried submission (double tap, client gave up polling)
+    it returns the user's queued or running job for the language and True.
+    """
     state = verify_json(payload.state_token)
 
     if state.get("phase") != "writing":
         raise HTTPException(status_code=400, detail="Not in writing phase")
 
     user_id = int(state["user_id"])
+    check_subject(claims, user_id)
     language_id = int(state["language_id"])
     estimated = str(state["estimated"])
+    writing_prompt = state.get("writing_prompt")
+    if not writing_prompt:
+        raise HTTPException(status_code=400, detail="Invalid or tampered token")
 
-    user = db.execute(select(User).where(User.id == user_id)).scalar_one_or_none()
-    if not user:
+    lang = await _language(db, language_id)
+    if not lang:
+        raise HTTPException(status_code=400, detail="Invalid language_id")
+
+    # two submissions at once: the second waits on the user row until the
+    # first has committed its job, then finds it below. The status comes from
+    # the row, not user_cache: another worker may have just changed it.
+    status = (await db.execute(
+        select(User.onboarding_status).where(User.id == user_id).with_for_update()
+    )).scalar_one_or_none()
+    if status is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    if user.onboarding_status != "profile_completed":
+    if status != "profile_completed":
         raise HTTPException(status_code=400, detail="User must complete profile first")
 
-    lang = db.execute(select(Language).where(Language.id == language_id)).scalar_one_or_none()
-    if not lang:
-        raise HTTPException(status_code=400, detail="Invalid language_id")
+    open_job = (await db.execute(
+        select(AssessmentGradingJob)
+        .where(AssessmentGradingJob.user_id == user_id, AssessmentGradingJob.language_id == language_id,
+               AssessmentGradingJob.status.in_(("queued", "running")))
+        .order_by(AssessmentGradingJob.created_at.desc())
+        .limit(1)
+    )).scalar_one_or_none()
+    if open_job is not None:
+        await db.commit()  # nothing written; releases the row lock
+        return open_job, lang, None, True
 
-    # regenerate prompt (stateless)
-    wp = make_writing_prompt(lang.name, estimated)
+    job = AssessmentGradingJob(
+        id=new_job_id(),
+        user_id=user_id,
+        language_id=language_id,
+        core_estimate=estimated,
+        writing_item_id=state.get("writing_item_id"),
+        prompt_text=writing_prompt,
+        user_text=payload.text,
+    )
+    min_words, max_words = state.get("writing_limits") or (None, None)
+    return job, lang, prescore(lang.code, writing_prompt, payload.text, min_words, max_words), False
 
-    g = grade_writing(lang.name, estimated, wp["prompt"], payload.text)
-    writing_score = int(g["score"])
-    writing_level = writing_score_to_cefr(writing_score)
 
-    cefr_order = ["A1", "A2", "B1", "B2", "C1", "C2"]
-    final_cefr = estimated
-    if cefr_order.index(writing_level) < cefr_order.index(final_cefr):
-        final_cefr = writing_level
+async def _finish_prescored(db: AsyncSession, job: AssessmentGradingJob, g: dict) -> dict:
+    db.add(job)
+    await finalize_job(db, job, g)
+    await db.commit()
+    user_cache.invalidate(job.user_id)
+    jobs_finished.inc(status="done")
+    assessments_completed.inc()
+    return {"job_id": job.id, "status": "done", "result": json.loads(job.result_json)}
 
-    # map CEFR to your enum
-    saved_level = "beginner" if final_cefr in ("A1", "A2") else ("intermediate" if final_cefr in ("B1", "B2") else "advanced")
 
-    # save final result in existing table
-    db.add(LanguageAssessment(
-        user_id=user_id,
-        language_id=language_id,
-        level=saved_level,
-        score=writing_score
-    ))
+@app.post("/assessment/ai/submit-writing")
+async def ai_assessment_submit_writing(payload: AiAssessmentWritingIn, db: AsyncSession = Depends(get_async_db),
+                                       claims: Optional[dict] = Depends(get_token_claims)):
+    job, _, pre, existing = await _writing_submission(db, payload, claims)
+    if existing:
+        return {"message": "Grading queued", "job_id": job.id, "status": job.status}
+    if pre is not None:
+        return {"message": "Assessment completed", **await _finish_prescored(db, job, pre)}
 
-    user.onboarding_status = "assessed"
-    db.commit()
+    if grading_queue.full():
+        raise admission.reject("grading_queue")
+
+    # grading is slow; hand it to the queue and let the client poll for the result
+    db.add(job)
+    await db.commit()
+    grading_queue.submit(job.id)
 
     return {
-        "message": "Assessment completed",
-        "core_estimate": estimated,
-        "writing_score": writing_score,
-        "writing_level": writing_level,
-        "final_cefr": final_cefr,
-        "saved_level": saved_level,
-        "user_status": user.onboarding_status,
-        "feedback": g.get("feedback", "")
-    }
\ No newline at end of file
+        "message": "Grading queued",
+        "job_id": job.id,
+        "status": "queued",
+    }
+
+
+# streamed gradings in progress (the event loop only keeps weak references)
+_stream_grading_tasks: Set[asyncio.Task] = set()
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/assessment/ai/submit-writing/stream")
+async def ai_assessment_submit_writing_stream(payload: AiAssessmentWritingIn, db: AsyncSession = Depends(get_async_db),
+                                              claims: Optional[dict] = Depends(get_token_claims)):
+    """
+    Grades inline over server-sent events: `scores` (rubric + total) as soon
+    as the model has produced them, `feedback` text deltas, then `result`
+    with the same body the grading job endpoints return.
+    """
+    job, lang, pre, existing = await _writing_submission(db, payload, claims)
+    if existing:
+        job_id = job.id
+
+        async def resumed():
+            # the first submission's events went to its own response
+            out = None
+            async for out in _job_updates(job_id):
+                pass
+            yield _sse("result", out)
+
+        return StreamingResponse(resumed(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+    if pre is not None:
+        done = await _finish_prescored(db, job, pre)
+
+        async def prescored():
+            yield _sse("scores", {"score": pre["score"], "rubric": pre["rubric"]})
+            yield _sse("feedback", {"delta": pre["feedback"]})
+            yield _sse("result", done)
+
+        return StreamingResponse(prescored(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    # take the model slot before anything is persisted so overload is a clean 429
+    user_id = job.user_id
+    await admission.acquire(user_id)
+    held = {"since": time.monotonic()}
+
+    def release_slot():
+        since = held.pop("since", None)
+        if since is not None:
+            admission.release(user_id, time.monotonic() - since)  # feeds Retry-After
+
+    lang_name = lang.name
+    job.status = "running"
+    job.started_at = datetime.utcnow()
+    db.add(job)
+    try:
+        await db.commit()
+    except Exception:
+        release_slot()
+        raise
+    job_id = job.id
+
+    # grading and saving run in their own task, so a client that disconnects
+    # mid-stream (which cancels the response) still gets its job finished
+    out: asyncio.Queue = asyncio.Queue()
+
+    async def grade():
+        g = None
+        try:
+            try:
+                async for kind, data in agrade_writing_stream(lang_name, job.core_estimate, job.prompt_text, job.user_text):
+                    if kind == "scores":
+                        out.put_nowait(_sse("scores", data))
+                    elif kind == "feedback":
+                        out.put_nowait(_sse("feedback", {"delta": data}))
+                    else:
+                        g = data
+            except Exception as e:
+                print(f"[grading] streamed grading {job_id} failed: {e}")
+            finally:
+                release_slot()
+
+            # persisted exactly like a queued job
+            async with AsyncSessionLocal() as wdb:
+                row = (await wdb.execute(select(AssessmentGradingJob).where(AssessmentGradingJob.id == job_id))).scalar_one()
+                if g is None:
+                    row.status = "failed"
+                    row.error = "streamed grading failed"
+                    row.finished_at = datetime.utcnow()
+                else:
+                    await finalize_job(wdb, row, g)
+                await wdb.commit()
+                if g is not None:
+                    user_cache.invalidate(row.user_id)
+                jobs_finished.inc(status=row.status)
+                if g is not None:
+                    assessments_completed.inc()
+                out.put_nowait(_sse("result", await _grading_status(wdb, job_id)))
+        except Exception as e:
+            # left running; GradingQueue.start picks it up again
+            print(f"[grading] streamed grading {job_id} not saved: {e}")
+        finally:
+            out.put_nowait(None)
+
+    task = asyncio.create_task(grade())
+    _stream_grading_tasks.add(task)
+    task.add_done_callback(_stream_grading_tasks.discard)
+
+    async def events():
+        while True:
+            event = await out.get()
+            if event is None:
+                return
+            yield event
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+async def _grading_status(db: AsyncSession, job_id: str) -> dict:
+    job = (await db.execute(select(AssessmentGradingJob).where(AssessmentGradingJob.id == job_id))).scalar_one_or_none()
+    if not job:
+        raise HTTPException(status_code=404, detail="Grading job not found")
+    out = {"job_id": job.id, "status": job.status}
+    if job.status == "done":
+        out["result"] = json.loads(job.result_json)
+    elif job.status == "failed":
+        out["detail"] = "Grading failed. Please submit your writing again."
+    return out
+
+
+@app.get("/assessment/ai/grading/{job_id}")
+async def ai_assessment_grading_status(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    return await _grading_status(db, job_id)
+
+
+async def _job_updates(job_id: str):
+    """The job's status on every change, ending with the final one."""
+    last = None
+    while True:
+        async with AsyncSessionLocal() as db:
+            out = await _grading_status(db, job_id)
+        if out["status"] != last:
+            last = out["status"]
+            yield out
+        if last in ("done", "failed"):
+            return
+        await asyncio.sleep(GRADING_SSE_POLL_SECONDS)
+
+
+@app.get("/assessment/ai/grading/{job_id}/events")
+async def ai_assessment_grading_events(job_id: str):
+    """Server-sent events: a `status` event on every change, ending with the final one."""
+    async with AsyncSessionLocal() as db:
+        await _grading_status(db, job_id)  # 404 before the stream starts
+
+    async def events():
+        async for out in _job_updates(job_id):
+            yield _sse("status", out)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
\ No newline at end of file
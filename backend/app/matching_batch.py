@@ -0,0 +1,251 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+import argparse
+import os
+
+from sqlalchemy.orm import Session
+from sqlalchemy import select, delete, insert, update, or_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from .db import engine, SessionLocal
+from .models import (
+    User, LearnerProfile, UserLanguage, UserInterest,
+    MatchPair, MatchRecommendation,
+)
+from .matching_service import WEIGHT_INTERESTS, WEIGHT_AGE, _calculate_age
+from .matching_scorer import CandidateBatch, rank
+from .reference_data import reference_catalog
+
+# Offline job that materializes each user's top-K recommendations into
+# match_recommendations, one language pair per process-pool task:
+#
+#   python -m app.matching_batch            # pairs touched since last run
+#   python -m app.matching_batch --full     # every pair
+#
+# /profile/complete marks the pairs a user entered or left in match_pairs;
+# /matching/recommend reads the table only while the pair is fresh.
+
+MATCH_BATCH_TOP_K = int(os.getenv("MATCH_BATCH_TOP_K", "100"))
+MATCH_BATCH_MAX_AGE_HOURS = float(os.getenv("MATCH_BATCH_MAX_AGE_HOURS", "26"))
+MATCH_BATCH_INSERT_ROWS = int(os.getenv("MATCH_BATCH_INSERT_ROWS", "5000"))
+
+Pair = Tuple[int, int]
+
+
+# =========================
+# Online side (API process)
+# =========================
+def mark_pairs_touched(db: Session, pairs: Iterable[Pair]) -> None:
+    rows = [{"native_language_id": n, "target_language_id": t, "touched_at": datetime.utcnow()} for n, t in pairs]
+    if not rows:
+        return
+    stmt = mysql_insert(MatchPair).values(rows)
+    db.execute(stmt.on_duplicate_key_update(touched_at=stmt.inserted.touched_at))
+
+
+def load_materialized(db: Session, user_id: int, pool: Pair) -> Optional[List[Dict]]:
+    """
+    The stored ranking for user_id in the same shape as get_recommendations,
+    or None when the pair was touched after the last refresh or is too old.
+    """
+    state = db.execute(
+        select(MatchPair.touched_at, MatchPair.refreshed_at)
+        .where(MatchPair.native_language_id == pool[0], MatchPair.target_language_id == pool[1])
+    ).first()
+    if not state or state.refreshed_at is None or state.touched_at > state.refreshed_at:
+        return None
+    if state.refreshed_at < datetime.utcnow() - timedelta(hours=MATCH_BATCH_MAX_AGE_HOURS):
+        return None
+
+    stored = db.execute(
+        select(MatchRecommendation.candidate_user_id, MatchRecommendation.score, MatchRecommendation.computed_at)
+        .where(MatchRecommendation.user_id == user_id)
+        .order_by(MatchRecommendation.rank)
+    ).all()
+    # rows from an older run belong to a viewer that has since changed pools
+    if not stored or stored[0].computed_at < state.refreshed_at:
+        return None
+
+    ids = [int(r.candidate_user_id) for r in stored]
+    people = {
+        int(u.id): (u, prof)
+        for u, prof in db.execute(
+            select(User, LearnerProfile)
+            .join(LearnerProfile, LearnerProfile.user_id == User.id)
+            .where(User.id.in_(ids))
+        ).all()
+    }
+
+    reference_catalog.ensure_loaded(db)
+    names = reference_catalog.all_interest_names()
+    interests: Dict[int, Dict[int, str]] = {}
+    for uid, iid in db.execute(
+        select(UserInterest.user_id, UserInterest.interest_id)
+        .where(UserInterest.user_id.in_(ids + [user_id]))
+    ).all():
+        if int(iid) in names:
+            interests.setdefault(int(uid), {})[int(iid)] = names[int(iid)]
+    mine = interests.get(user_id, {})
+
+    out = []
+    for r in stored:
+        cid = int(r.candidate_user_id)
+        if cid not in people:
+            continue  # deleted since the run
+        u, prof = people[cid]
+        out.append({
+            "user_id": cid,
+            "full_name": u.full_name,
+            "email": u.email,
+            "age": _calculate_age(prof.date_of_birth) if prof.date_of_birth else None,
+            "profile_photo_url": prof.profile_photo_url,
+            "shared_interests": [n for i, n in sorted(mine.items()) if i in interests.get(cid, {})],
+            "score": float(r.score),
+        })
+    return out
+
+
+# =========================
+# Batch side
+# =========================
+def _init_worker() -> None:
+    # connections inherited from the parent must not be reused after fork
+    engine.dispose(close=False)
+
+
+def _load_profiles(db: Session, user_ids: List[int]) -> Dict[int, Tuple[Optional[date], int]]:
+    dobs = {
+        int(uid): dob
+        for uid, dob in db.execute(
+            select(LearnerProfile.user_id, LearnerProfile.date_of_birth).where(LearnerProfile.user_id.in_(user_ids))
+        ).all()
+    }
+    bits: Dict[int, int] = {}
+    for uid, iid in db.execute(
+        select(UserInterest.user_id, UserInterest.interest_id).where(UserInterest.user_id.in_(user_ids))
+    ).all():
+        bits[int(uid)] = bits.get(int(uid), 0) | (1 << int(iid))
+    return {uid: (dob, bits.get(uid, 0)) for uid, dob in dobs.items()}
+
+
+def _users_with(db: Session, lang_type: str, language_id: int) -> Set[int]:
+    return set(
+        int(x) for x in db.execute(
+            select(UserLanguage.user_id).where(UserLanguage.type == lang_type, UserLanguage.language_id == language_id)
+        ).scalars().all()
+    )
+
+
+def refresh_pair(pair: Pair, top_k: int = MATCH_BATCH_TOP_K) -> int:
+    """
+    Recomputes the rankings of every user whose candidates come from `pair`
+    (native N, target T): viewers are natives of T whose first target is N.
+    Returns the number of viewers written. Runs in a worker process.
+    """
+    native, target = pair
+    started = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        candidate_ids = sorted(_users_with(db, "native", native) & _users_with(db, "target", target))
+        viewer_ids = sorted(_users_with(db, "native", target) & _users_with(db, "target", native))
+
+        # viewers whose lowest target is not `native` are served from another pair
+        first_target: Dict[int, int] = {}
+        for uid, lid in db.execute(
+            select(UserLanguage.user_id, UserLanguage.language_id)
+            .where(UserLanguage.type == "target", UserLanguage.user_id.in_(viewer_ids))
+        ).all():
+            first_target[int(uid)] = min(first_target.get(int(uid), int(lid)), int(lid))
+        viewer_ids = [v for v in viewer_ids if first_target.get(v) == native]
+
+        candidates = _load_profiles(db, candidate_ids)
+        batch = CandidateBatch([(uid, dob, bits) for uid, (dob, bits) in candidates.items()])
+        viewers = _load_profiles(db, viewer_ids)
+
+        buffer: List[Dict] = []
+        flushed_viewers: List[int] = []
+
+        def flush() -> None:
+            if flushed_viewers:
+                db.execute(delete(MatchRecommendation).where(MatchRecommendation.user_id.in_(flushed_viewers)))
+            if buffer:
+                db.execute(insert(MatchRecommendation), buffer)
+            db.commit()
+            buffer.clear()
+            flushed_viewers.clear()
+
+        for uid, (dob, bits) in viewers.items():
+            my_age = _calculate_age(dob) if dob else None
+            for pos, (i, score) in enumerate(rank(batch, bits, my_age, top_k, WEIGHT_INTERESTS, WEIGHT_AGE,
+                                                   exclude_user_id=uid)):
+                buffer.append({
+                    "user_id": uid,
+                    "rank": pos,
+                    "candidate_user_id": int(batch.user_ids[i]),
+                    "score": score,
+                    "computed_at": started,
+                })
+            flushed_viewers.append(uid)
+            if len(buffer) >= MATCH_BATCH_INSERT_ROWS:
+                flush()
+        flush()
+
+        db.execute(
+            update(MatchPair)
+            .where(MatchPair.native_language_id == native, MatchPair.target_language_id == target)
+            .values(refreshed_at=started)
+        )
+        db.commit()
+        return len(viewers)
+    finally:
+        db.close()
+
+
+def dirty_pairs(db: Session, full: bool = False) -> List[Pair]:
+    # register pairs that have never been seen (first run, new languages)
+    native = UserLanguage.__table__.alias("n")
+    target = UserLanguage.__table__.alias("t")
+    existing = db.execute(
+        select(native.c.language_id, target.c.language_id)
+        .join(target, (target.c.user_id == native.c.user_id) & (target.c.type == "target"))
+        .where(native.c.type == "native")
+        .distinct()
+    ).all()
+    known = set(
+        (int(n), int(t)) for n, t in db.execute(select(MatchPair.native_language_id, MatchPair.target_language_id)).all()
+    )
+    mark_pairs_touched(db, [(int(n), int(t)) for n, t in existing if (int(n), int(t)) not in known])
+    db.commit()
+
+    q = select(MatchPair.native_language_id, MatchPair.target_language_id)
+    if not full:
+        q = q.where(or_(MatchPair.refreshed_at.is_(None), MatchPair.touched_at > MatchPair.refreshed_at))
+    return [(int(n), int(t)) for n, t in db.execute(q).all()]
+
+
+def run(full: bool = False, workers: Optional[int] = None, top_k: int = MATCH_BATCH_TOP_K) -> Dict[Pair, int]:
+    db = SessionLocal()
+    try:
+        pairs = dirty_pairs(db, full=full)
+    finally:
+        db.close()
+    if not pairs:
+        return {}
+
+    # fork after the parent's connections are released
+    engine.dispose()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        return dict(zip(pairs, pool.map(refresh_pair, pairs, [top_k] * len(pairs))))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Materialize top-K match recommendations.")
+    parser.add_argument("--full", action="store_true", help="refresh every pair, not only touched ones")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--top-k", type=int, default=MATCH_BATCH_TOP_K)
+    args = parser.parse_args()
+
+    done = run(full=args.full, workers=args.workers, top_k=args.top_k)
+    print(f"[matching_batch] refreshed {len(done)} pairs, {sum(done.values())} users")
@@ -0,0 +1,131 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from collections import OrderedDict
+import os
+import threading
+import time
+
+from .metrics import Counter, Gauge
+
+# Bounded LRU/TTL cache of each user's ranked recommendation list (the first
+# MATCH_CACHE_DEPTH rows). An entry depends on the user's own profile and on
+# the language pair its candidates come from, so it is dropped when either
+# changes (see invalidate()).
+
+MATCH_CACHE_MAX_ENTRIES = int(os.getenv("MATCH_CACHE_MAX_ENTRIES", "10000"))
+MATCH_CACHE_TTL_SECONDS = float(os.getenv("MATCH_CACHE_TTL_SECONDS", "600"))
+MATCH_CACHE_DEPTH = int(os.getenv("MATCH_CACHE_DEPTH", "100"))
+
+Pair = Tuple[int, int]
+
+cache_hits = Counter("fluentz_match_cache_hits_total", "Recommendation cache hits")
+cache_misses = Counter("fluentz_match_cache_misses_total", "Recommendation cache misses")
+cache_invalidations = Counter("fluentz_match_cache_invalidations_total", "Recommendation cache entries dropped by profile changes")
+
+
+class _Entry:
+    __slots__ = ("expires_at", "pool", "rows", "complete")
+
+    def __init__(self, expires_at: float, pool: Pair, rows: List[Dict], complete: bool):
+        self.expires_at = expires_at
+        self.pool = pool          # (native, target) pair the candidates come from
+        self.rows = rows          # ranked: score desc, user id asc
+        self.complete = complete  # rows hold the whole pool, not just the top
+
+
+def _after_position(rows: List[Dict], after: Tuple[float, int]) -> int:
+    last_score, last_id = after
+    lo, hi = 0, len(rows)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        r = rows[mid]
+        if r["score"] > last_score or (r["score"] == last_score and r["user_id"] <= last_id):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class RecommendationCache:
+    def __init__(self, max_entries: int = MATCH_CACHE_MAX_ENTRIES, ttl_seconds: float = MATCH_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._by_pool: Dict[Pair, Set[int]] = {}
+        self._generation = 0  # bumped by every invalidation
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_page(self, user_id: int, limit: int, after: Optional[Tuple[float, int]] = None) -> Optional[List[Dict]]:
+        """Page of the cached ranking, or None on a miss (or a page past the cached depth)."""
+        with self._lock:
+            e = self._entries.get(user_id)
+            if e is not None and e.expires_at < time.monotonic():
+                self._drop_locked(user_id)
+                e = None
+            if e is None:
+                cache_misses.inc()
+                return None
+            start = _after_position(e.rows, after) if after else 0
+            if start + limit > len(e.rows) and not e.complete:
+                cache_misses.inc()
+                return None
+            self._entries.move_to_end(user_id)
+            cache_hits.inc()
+            return [dict(r) for r in e.rows[start:start + limit]]
+
+    def generation(self) -> int:
+        """Read before computing a ranking and pass to put(), so a ranking that
+        raced with a profile change is not cached."""
+        return self._generation
+
+    def put(self, user_id: int, pool: Pair, rows: List[Dict], complete: bool, generation: int) -> None:
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._drop_locked(user_id)
+            self._entries[user_id] = _Entry(time.monotonic() + self.ttl_seconds, pool, rows, complete)
+            self._by_pool.setdefault(pool, set()).add(user_id)
+            while len(self._entries) > self.max_entries:
+                self._drop_locked(next(iter(self._entries)))
+
+    def invalidate(self, user_id: Optional[int] = None, pairs: Iterable[Pair] = ()) -> None:
+        """
+        Drops the user's own entry and every entry whose candidates come from
+        one of `pairs` (a profile entered or left those pairs).
+        """
+        with self._lock:
+            self._generation += 1
+            dropped = 0
+            if user_id is not None and user_id in self._entries:
+                self._drop_locked(user_id)
+                dropped += 1
+            for p in pairs:
+                for uid in list(self._by_pool.get(p, ())):
+                    self._drop_locked(uid)
+                    dropped += 1
+        if dropped:
+            cache_invalidations.inc(dropped)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_pool.clear()
+
+    def _drop_locked(self, user_id: int) -> None:
+        e = self._entries.pop(user_id, None)
+        if e is None:
+            return
+        users = self._by_pool.get(e.pool)
+        if users is not None:
+            users.discard(user_id)
+            if not users:
+                del self._by_pool[e.pool]
+
+
+recommendation_cache = RecommendationCache()
+
+Gauge("fluentz_match_cache_entries", "Users with a cached recommendation list", fn=lambda: len(recommendation_cache))
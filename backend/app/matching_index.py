@@ -0,0 +1,321 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from datetime import date, datetime, timedelta
+import asyncio
+import os
+import threading
+import time
+
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from starlette.concurrency import run_in_threadpool
+
+from .db import SessionLocal
+from .models import User, LearnerProfile, UserLanguage, UserInterest
+from .reference_data import reference_catalog
+from .matching_service import WEIGHT_INTERESTS, WEIGHT_AGE, _calculate_age
+from .matching_scorer import CandidateBatch, rank, interests_to_bits, bits_to_interests
+from .matching_cache import recommendation_cache
+from .metrics import Counter
+
+# Process-resident copy of everything matching needs, so /matching/recommend
+# can answer without touching MySQL. Each worker process keeps its own copy:
+# it is built on startup and updated right away by /profile/complete in the
+# process that served it. Every MATCH_INDEX_SYNC_SECONDS a background task
+# reloads the profiles whose learner_profile.updated_at moved (edits served by
+# other workers) and drops their cached rankings; it also retries the build
+# until it succeeds and rebuilds from scratch every
+# MATCH_INDEX_REBUILD_SECONDS (this catches deleted users).
+
+MATCH_INDEX_SYNC_SECONDS = float(os.getenv("MATCH_INDEX_SYNC_SECONDS", "30"))
+MATCH_INDEX_REBUILD_SECONDS = float(os.getenv("MATCH_INDEX_REBUILD_SECONDS", "3600"))
+# updated_at is set when the statement runs, not at commit; re-read this far
+# back so a slow transaction committing late is still picked up
+MATCH_INDEX_SYNC_OVERLAP_SECONDS = int(os.getenv("MATCH_INDEX_SYNC_OVERLAP_SECONDS", "120"))
+
+index_rebuilds = Counter("fluentz_matching_index_rebuilds_total", "Full matching index builds", labels=("outcome",))
+index_synced_users = Counter("fluentz_matching_index_synced_users_total", "Profiles changed by other workers and reloaded into the index")
+
+Entry = Tuple[int, Tuple[int, ...], "MatchRecord"]
+
+
+class MatchRecord:
+    __slots__ = ("user_id", "full_name", "date_of_birth", "interests", "profile_photo_url")
+
+    def __init__(self, user_id: int, full_name: str, date_of_birth: Optional[date],
+                 interests: int, profile_photo_url: Optional[str]):
+        self.user_id = user_id
+        self.full_name = full_name
+        self.date_of_birth = date_of_birth
+        self.interests = interests  # bitset: bit i set <=> interest id i
+        self.profile_photo_url = profile_photo_url
+
+    def key(self) -> tuple:
+        return (self.user_id, self.full_name, self.date_of_birth, self.interests, self.profile_photo_url)
+
+
+class MatchingIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ready = False
+        # (native_language_id, target_language_id) -> {user_id: record}
+        self._by_pair: Dict[Tuple[int, int], Dict[int, MatchRecord]] = {}
+        # user_id -> (native, targets, record)
+        self._users: Dict[int, Tuple[int, Tuple[int, ...], MatchRecord]] = {}
+        self._interest_names: Dict[int, str] = {}
+        # pair -> (scoring batch, records in batch row order); built lazily
+        self._batches: Dict[Tuple[int, int], Tuple[CandidateBatch, List[MatchRecord]]] = {}
+        self.synced_to: Optional[datetime] = None  # max learner_profile.updated_at seen
+        self.built_at = 0.0  # monotonic
+
+    # ---------- writes ----------
+
+    def rebuild(self, db: Session) -> None:
+        # read the watermark first: anything written while we load is synced later
+        synced_to = db.execute(select(func.max(LearnerProfile.updated_at))).scalar()
+        users = _load_entries(db)
+
+        reference_catalog.ensure_loaded(db)
+        names = reference_catalog.all_interest_names()
+
+        by_pair: Dict[Tuple[int, int], Dict[int, MatchRecord]] = {}
+        for uid, (native, tgts, rec) in users.items():
+            for t in tgts:
+                by_pair.setdefault((native, t), {})[uid] = rec
+
+        with self._lock:
+            self._by_pair = by_pair
+            self._users = users
+            self._interest_names = names
+            self._batches = {}
+            self.synced_to = synced_to
+            self.built_at = time.monotonic()
+            self.ready = True
+
+    def sync(self, db: Session) -> Dict[int, Set[Tuple[int, int]]]:
+        """
+        Reloads profiles updated since the last build/sync. Returns
+        {user_id: pairs left or entered} for the users that changed.
+        """
+        synced_to = db.execute(select(func.max(LearnerProfile.updated_at))).scalar()
+        since = self.synced_to
+        if synced_to is None or since is None:
+            return {}
+        ids = [int(u) for u in db.execute(
+            select(LearnerProfile.user_id)
+            .where(LearnerProfile.updated_at >= since - timedelta(seconds=MATCH_INDEX_SYNC_OVERLAP_SECONDS))
+        ).scalars().all()]
+        loaded = _load_entries(db, ids) if ids else {}
+
+        changed: Dict[int, Set[Tuple[int, int]]] = {}
+        with self._lock:
+            for uid in ids:
+                new, old = loaded.get(uid), self._users.get(uid)
+                if _same_entry(new, old):
+                    continue
+                touched = self._remove_locked(uid)
+                if new is not None:
+                    native, tgts, rec = new
+                    self._users[uid] = new
+                    for t in tgts:
+                        self._by_pair.setdefault((native, t), {})[uid] = rec
+                        self._batches.pop((native, t), None)
+                        touched.add((native, t))
+                changed[uid] = touched
+            self.synced_to = max(synced_to, since)
+        return changed
+
+    def upsert_user(self, user_id: int, full_name: str, date_of_birth: Optional[date],
+                    profile_photo_url: Optional[str], native_language_id: int,
+                    target_language_ids: Iterable[int], interest_ids: Iterable[int]) -> Set[Tuple[int, int]]:
+        """Returns the (native, target) pairs the user left or entered."""
+        tgts = tuple(sorted(set(int(t) for t in target_language_ids if int(t) != native_language_id)))
+        rec = MatchRecord(int(user_id), full_name, date_of_birth, interests_to_bits(interest_ids), profile_photo_url)
+        with self._lock:
+            touched = self._remove_locked(int(user_id))
+            if not tgts:
+                return touched
+            self._users[rec.user_id] = (int(native_language_id), tgts, rec)
+            for t in tgts:
+                pair = (int(native_language_id), t)
+                self._by_pair.setdefault(pair, {})[rec.user_id] = rec
+                self._batches.pop(pair, None)
+                touched.add(pair)
+            return touched
+
+    def remove_user(self, user_id: int) -> Set[Tuple[int, int]]:
+        with self._lock:
+            return self._remove_locked(int(user_id))
+
+    def _remove_locked(self, user_id: int) -> Set[Tuple[int, int]]:
+        old = self._users.pop(user_id, None)
+        if not old:
+            return set()
+        native, tgts, _ = old
+        for t in tgts:
+            self._batches.pop((native, t), None)
+            bucket = self._by_pair.get((native, t))
+            if bucket is not None:
+                bucket.pop(user_id, None)
+                if not bucket:
+                    del self._by_pair[(native, t)]
+        return {(native, t) for t in tgts}
+
+    def set_interest_names(self, names: Dict[int, str]) -> None:
+        with self._lock:
+            self._interest_names = dict(names)
+
+    # ---------- reads ----------
+
+    def contains(self, user_id: int) -> bool:
+        return self.ready and int(user_id) in self._users
+
+    def pool_of(self, user_id: int) -> Optional[Tuple[int, int]]:
+        """The (native, target) pair this user's candidates come from."""
+        if not self.ready:
+            return None
+        me = self._users.get(int(user_id))
+        if not me:
+            return None
+        my_native, my_targets, _ = me
+        return (my_targets[0], my_native)
+
+    def recommend(self, user_id: int, limit: int = 20,
+                  after: Optional[Tuple[float, int]] = None) -> Optional[List[Dict]]:
+        """
+        Same rules and ranking as matching_service.get_recommendations.
+        Returns None when the index cannot answer (not built / unknown user),
+        so the caller falls back to the DB path.
+        """
+        if not self.ready:
+            return None
+        with self._lock:
+            me = self._users.get(int(user_id))
+            if not me:
+                return None
+            my_native, my_targets, my_rec = me
+            # same "first target" choice as the DB path (lowest language id)
+            pair = (my_targets[0], my_native)  # == pool_of(user_id)
+            cached = self._batches.get(pair)
+            if cached is None:
+                records = sorted(self._by_pair.get(pair, {}).values(), key=lambda r: r.user_id)
+                batch = CandidateBatch([(r.user_id, r.date_of_birth, r.interests) for r in records])
+                cached = self._batches[pair] = (batch, records)
+            names = self._interest_names
+
+        batch, records = cached
+        my_bits = my_rec.interests
+        my_age = _calculate_age(my_rec.date_of_birth) if my_rec.date_of_birth else None
+
+        out = []
+        for i, score in rank(batch, my_bits, my_age, limit, WEIGHT_INTERESTS, WEIGHT_AGE,
+                             exclude_user_id=my_rec.user_id, after=after):
+            rec = records[i]
+            out.append({
+                "user_id": rec.user_id,
+                "full_name": rec.full_name,
+                "age": _calculate_age(rec.date_of_birth) if rec.date_of_birth else None,
+                "profile_photo_url": rec.profile_photo_url,
+                "shared_interests": [names[n] for n in bits_to_interests(my_bits & rec.interests) if n in names],
+                "score": score,
+            })
+        return out
+
+
+def _load_entries(db: Session, user_ids: Optional[List[int]] = None) -> Dict[int, Entry]:
+    """Index entries of the given users (all users when None) that can be matched."""
+    def only(q, col):
+        return q if user_ids is None else q.where(col.in_(user_ids))
+
+    profiles = db.execute(only(
+        select(User.id, User.full_name, LearnerProfile.date_of_birth, LearnerProfile.profile_photo_url)
+        .join(LearnerProfile, LearnerProfile.user_id == User.id),
+        User.id,
+    )).all()
+
+    natives: Dict[int, int] = {}
+    targets: Dict[int, List[int]] = {}
+    for uid, lid, t in db.execute(only(
+        select(UserLanguage.user_id, UserLanguage.language_id, UserLanguage.type)
+        .where(UserLanguage.type.in_(("native", "target"))),
+        UserLanguage.user_id,
+    )).all():
+        if t == "native":
+            natives[int(uid)] = min(natives.get(int(uid), int(lid)), int(lid))
+        else:
+            targets.setdefault(int(uid), []).append(int(lid))
+
+    bits: Dict[int, int] = {}
+    for uid, iid in db.execute(only(select(UserInterest.user_id, UserInterest.interest_id), UserInterest.user_id)).all():
+        bits[int(uid)] = bits.get(int(uid), 0) | (1 << int(iid))
+
+    users: Dict[int, Entry] = {}
+    for uid, full_name, dob, photo in profiles:
+        uid = int(uid)
+        if uid not in natives or uid not in targets:
+            continue
+        users[uid] = (natives[uid], tuple(sorted(set(targets[uid]))),
+                      MatchRecord(uid, full_name, dob, bits.get(uid, 0), photo))
+    return users
+
+
+def _same_entry(a: Optional[Entry], b: Optional[Entry]) -> bool:
+    if a is None or b is None:
+        return a is b
+    return a[0] == b[0] and a[1] == b[1] and a[2].key() == b[2].key()
+
+
+matching_index = MatchingIndex()
+# interest names change with the catalog (POST /meta/reload or its periodic sync)
+reference_catalog.on_reload(lambda: matching_index.set_interest_names(reference_catalog.all_interest_names()))
+
+
+# =========================
+# Background resync
+# =========================
+def refresh_matching_index() -> None:
+    """Build the index if it is missing or old, else pull other workers' edits."""
+    db = SessionLocal()
+    try:
+        if not matching_index.ready or time.monotonic() - matching_index.built_at >= MATCH_INDEX_REBUILD_SECONDS:
+            try:
+                matching_index.rebuild(db)
+            except Exception:
+                index_rebuilds.inc(outcome="failed")
+                raise
+            index_rebuilds.inc(outcome="ok")
+            recommendation_cache.clear()
+            return
+        changed = matching_index.sync(db)
+    finally:
+        db.close()
+    for uid, pairs in changed.items():
+        recommendation_cache.invalidate(uid, pairs)
+    if changed:
+        index_synced_users.inc(len(changed))
+
+
+class MatchingIndexSync:
+    def __init__(self, interval_seconds: float = MATCH_INDEX_SYNC_SECONDS):
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await run_in_threadpool(refresh_matching_index)
+            except Exception as e:
+                print(f"[matching] index refresh failed: {e}")
+
+
+matching_index_sync = MatchingIndexSync()
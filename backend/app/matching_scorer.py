@@ -0,0 +1,146 @@
+from __future__ import annotations
+from typing import Iterable, List, Optional, Sequence, Tuple
+from datetime import date
+
+import numpy as np
+
+# Batch version of the matching score (see matching_service.get_recommendations):
+# candidate interests are packed bit rows, birth dates are int arrays, and the
+# whole pool is scored in one vectorized pass.
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.int32)
+
+
+def interests_to_bits(interest_ids: Iterable[int]) -> int:
+    bits = 0
+    for i in interest_ids:
+        bits |= 1 << int(i)
+    return bits
+
+
+def bits_to_interests(bits: int) -> List[int]:
+    out = []
+    i = 0
+    while bits:
+        if bits & 1:
+            out.append(i)
+        bits >>= 1
+        i += 1
+    return out
+
+
+def _pack(bits: int, nbytes: int) -> np.ndarray:
+    return np.frombuffer(bits.to_bytes(nbytes, "little"), dtype=np.uint8)
+
+
+def _popcount_rows(packed: np.ndarray) -> np.ndarray:
+    return _POPCOUNT8[packed].sum(axis=1)
+
+
+class CandidateBatch:
+    """
+    Immutable columnar view of a candidate pool, ordered by user id.
+    rows: (user_id, date_of_birth or None, interest bitset)
+    """
+
+    def __init__(self, rows: Sequence[Tuple[int, Optional[date], int]]):
+        rows = sorted(rows, key=lambda r: r[0])
+        n = len(rows)
+        max_bits = max((r[2].bit_length() for r in rows), default=0)
+        self.nbytes = max(1, (max_bits + 7) // 8)
+
+        self.user_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=n)
+        self.interests = np.zeros((n, self.nbytes), dtype=np.uint8)
+        for i, r in enumerate(rows):
+            if r[2]:
+                self.interests[i] = _pack(r[2], self.nbytes)
+        self.interest_counts = _popcount_rows(self.interests)
+
+        self.has_dob = np.fromiter((r[1] is not None for r in rows), dtype=bool, count=n)
+        self.birth_year = np.fromiter((r[1].year if r[1] else 0 for r in rows), dtype=np.int32, count=n)
+        self.birth_month = np.fromiter((r[1].month if r[1] else 0 for r in rows), dtype=np.int32, count=n)
+        self.birth_day = np.fromiter((r[1].day if r[1] else 0 for r in rows), dtype=np.int32, count=n)
+        self._ages_for: Optional[date] = None
+        self._ages: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def ages(self, today: Optional[date] = None) -> np.ndarray:
+        """Same rule as matching_service._calculate_age; cached per day."""
+        today = today or date.today()
+        if self._ages_for != today:
+            before_birthday = (self.birth_month > today.month) | (
+                (self.birth_month == today.month) & (self.birth_day > today.day)
+            )
+            self._ages = today.year - self.birth_year - before_birthday.astype(np.int32)
+            self._ages_for = today
+        return self._ages
+
+    def score(self, my_bits: int, my_age: Optional[int],
+              weight_interests: float, weight_age: float) -> np.ndarray:
+        n = len(self)
+        if n == 0:
+            return np.zeros(0, dtype=np.float64)
+
+        # interests: Jaccard, 0 if either side is empty
+        mine = np.zeros(self.nbytes, dtype=np.uint8)
+        if my_bits:
+            mine = _pack(my_bits & ((1 << (8 * self.nbytes)) - 1), self.nbytes)
+            # interests the pool does not use still count towards the union
+            extra = bin(my_bits >> (8 * self.nbytes)).count("1")
+        else:
+            extra = 0
+        inter = _popcount_rows(self.interests & mine)
+        union = _popcount_rows(self.interests | mine) + extra
+        valid = (self.interest_counts > 0) & bool(my_bits)
+        i_score = np.zeros(n, dtype=np.float64)
+        np.divide(inter, union, out=i_score, where=valid)
+
+        # age: 1/(1+diff); age missing => only interests
+        if my_age is None:
+            return i_score
+        a_score = 1.0 / (1.0 + np.abs(my_age - self.ages()).astype(np.float64))
+        return np.where(self.has_dob, (weight_interests * i_score) + (weight_age * a_score), i_score)
+
+
+def top_k(scores: np.ndarray, user_ids: np.ndarray, limit: int) -> np.ndarray:
+    """
+    Indices of the best `limit` scores, ordered by score desc then user id asc
+    (the order a stable sort over an id-ordered pool produces).
+    """
+    n = len(scores)
+    if limit <= 0 or n == 0:
+        return np.zeros(0, dtype=np.int64)
+    if n > limit:
+        kth = np.partition(scores, n - limit)[n - limit]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)
+        ties = ties[np.argsort(user_ids[ties], kind="stable")][: limit - len(above)]
+        idx = np.concatenate([above, ties])
+    else:
+        idx = np.arange(n)
+    order = np.lexsort((user_ids[idx], -scores[idx]))
+    return idx[order]
+
+
+def rank(batch: CandidateBatch, my_bits: int, my_age: Optional[int], limit: int,
+         weight_interests: float, weight_age: float,
+         exclude_user_id: Optional[int] = None,
+         after: Optional[Tuple[float, int]] = None) -> List[Tuple[int, float]]:
+    """
+    Returns [(row index, score)] for the top `limit` candidates.
+    after=(score, user_id) is a keyset position: only candidates ranked
+    strictly below it are considered (next page).
+    """
+    scores = batch.score(my_bits, my_age, weight_interests, weight_age)
+    drop = np.zeros(len(batch), dtype=bool)
+    if exclude_user_id is not None:
+        drop |= batch.user_ids == exclude_user_id
+    if after is not None:
+        last_score, last_id = after
+        drop |= (scores > last_score) | ((scores == last_score) & (batch.user_ids <= last_id))
+    if drop.any():
+        scores = np.where(drop, -np.inf, scores)
+        limit = min(limit, len(batch) - int(drop.sum()))
+    return [(int(i), float(scores[i])) for i in top_k(scores, batch.user_ids, limit)]
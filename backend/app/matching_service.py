@@ -1,11 +1,15 @@
 from __future__ import annotations
 from typing import Dict, List, Optional, Tuple
 from datetime import date
+import base64
+import json
 
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, aliased
 from sqlalchemy import select, and_
 
-from .models import User, LearnerProfile, UserLanguage, UserInterest, Interest
+from .models import User, LearnerProfile, UserLanguage, UserInterest
+from .matching_scorer import CandidateBatch, rank, interests_to_bits
+from .reference_data import reference_catalog
 
 WEIGHT_INTERESTS = 0.60
 WEIGHT_AGE = 0.40
@@ -34,18 +38,22 @@ def _interest_score(a: set[int], b: set[int]) -> float:
     return inter / union if union else 0.0  # 0..1
 
 
-def _get_single_language(db: Session, user_id: int, lang_type: str) -> Optional[int]:
-    row = db.execute(
-        select(UserLanguage.language_id)
+def _get_my_languages(db: Session, user_id: int) -> Tuple[Optional[int], Optional[int]]:
+    rows = db.execute(
+        select(UserLanguage.type, UserLanguage.language_id)
         .where(
             and_(
                 UserLanguage.user_id == user_id,
-                UserLanguage.type == lang_type
+                UserLanguage.type.in_(("native", "target"))
             )
         )
-        .limit(1)
-    ).scalar_one_or_none()
-    return int(row) if row is not None else None
+        .order_by(UserLanguage.language_id)
+    ).all()
+    # the lowest id of each type, as matching_index.pool_of picks
+    found: Dict[str, int] = {}
+    for t, lid in rows:
+        found.setdefault(t, int(lid))
+    return found.get("native"), found.get("target")
 
 
 def _get_user_interest_ids(db: Session, user_id: int) -> set[int]:
@@ -55,17 +63,52 @@ def _get_user_interest_ids(db: Session, user_id: int) -> set[int]:
     return set(int(x) for x in rows)
 
 
-def _get_interest_names(db: Session, interest_ids: set[int]) -> List[str]:
+def _get_interest_names(db: Session, interest_ids: set[int]) -> Dict[int, str]:
     if not interest_ids:
-        return []
-    rows = db.execute(
-        select(Interest.id, Interest.name).where(Interest.id.in_(list(interest_ids)))
-    ).all()
-    mp = {int(i): n for i, n in rows}
-    return [mp[i] for i in interest_ids if i in mp]
+        return {}
+    reference_catalog.ensure_loaded(db)
+    return reference_catalog.interest_names(interest_ids)
+
+
+def _candidate_ids_query(user_id: int, my_native: int, my_target: int):
+    # user.native == other.target AND user.target == other.native
+    ul_native = aliased(UserLanguage)
+    ul_target = aliased(UserLanguage)
+    return (
+        select(ul_native.user_id)
+        .join(
+            ul_target,
+            and_(
+                ul_target.user_id == ul_native.user_id,
+                ul_target.type == "target",
+                ul_target.language_id == my_native,
+            ),
+        )
+        .where(
+            ul_native.type == "native",
+            ul_native.language_id == my_target,
+            ul_native.user_id != user_id,
+        )
+    )
+
+
+def encode_cursor(score: float, user_id: int) -> str:
+    raw = json.dumps({"s": score, "u": user_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    """Inverse of encode_cursor; raises ValueError on anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw.decode())
+        return float(data["s"]), int(data["u"])
+    except Exception:
+        raise ValueError("invalid cursor")
 
 
-def get_recommendations(db: Session, user_id: int, limit: int = 20) -> List[Dict]:
+def get_recommendations(db: Session, user_id: int, limit: int = 20,
+                        after: Optional[Tuple[float, int]] = None) -> List[Dict]:
     """
     Returns a list of recommended matches for user_id.
     Language is a CONDITION:
@@ -74,86 +117,79 @@ def get_recommendations(db: Session, user_id: int, limit: int = 20) -> List[Dict
       interests: 0.60 (Jaccard)
       age:       0.40 (1/(1+diff))
       if age missing => only interests
+    after=(score, user_id) returns the page that follows that position.
+
+    Runs a fixed number of queries (5 once the reference catalog is loaded)
+    no matter how many candidates match.
     """
 
-    user = db.execute(select(User).where(User.id == user_id)).scalar_one_or_none()
-    if not user:
+    row = db.execute(
+        select(User, LearnerProfile)
+        .outerjoin(LearnerProfile, LearnerProfile.user_id == User.id)
+        .where(User.id == user_id)
+    ).first()
+    if not row:
         return []
 
     # require profile row
-    me_profile = db.execute(select(LearnerProfile).where(LearnerProfile.user_id == user_id)).scalar_one_or_none()
+    _, me_profile = row
     if not me_profile:
         return []
 
-    my_native = _get_single_language(db, user_id, "native")
-    my_target = _get_single_language(db, user_id, "target")
+    my_native, my_target = _get_my_languages(db, user_id)
     if my_native is None or my_target is None:
         return []
 
     my_interests = _get_user_interest_ids(db, user_id)
     my_age = _calculate_age(me_profile.date_of_birth) if me_profile.date_of_birth else None
 
-    # candidates: opposite language condition
-    candidate_ids = db.execute(
-        select(UserLanguage.user_id)
-        .where(UserLanguage.type == "native", UserLanguage.language_id == my_target)
-    ).scalars().all()
-
-    candidate_ids = set(int(x) for x in candidate_ids if int(x) != user_id)
-
-    # must also have target == my_native
-    target_match_ids = db.execute(
-        select(UserLanguage.user_id)
-        .where(UserLanguage.type == "target", UserLanguage.language_id == my_native)
-    ).scalars().all()
-
-    target_match_ids = set(int(x) for x in target_match_ids)
-    candidate_ids = candidate_ids & target_match_ids
-
-    if not candidate_ids:
-        return []
+    candidate_ids = _candidate_ids_query(user_id, my_native, my_target)
 
     # fetch candidate profiles/users
     candidates = db.execute(
         select(User, LearnerProfile)
         .join(LearnerProfile, LearnerProfile.user_id == User.id)
-        .where(User.id.in_(list(candidate_ids)))
+        .where(User.id.in_(candidate_ids))
+        .order_by(User.id)
     ).all()
 
-    results: List[Tuple[Dict, float]] = []
+    if not candidates:
+        return []
 
-    for u, prof in candidates:
-        other_id = int(u.id)
+    # all candidate interests in one round trip
+    interests_by_user: Dict[int, set[int]] = {}
+    for uid, iid in db.execute(
+        select(UserInterest.user_id, UserInterest.interest_id)
+        .where(UserInterest.user_id.in_(candidate_ids))
+    ).all():
+        interests_by_user.setdefault(int(uid), set()).add(int(iid))
+
+    # shared interests are always a subset of mine
+    interest_names = _get_interest_names(db, my_interests)
+
+    batch = CandidateBatch([
+        (int(u.id), prof.date_of_birth, interests_to_bits(interests_by_user.get(int(u.id), ())))
+        for u, prof in candidates
+    ])
+    rows = {int(u.id): (u, prof) for u, prof in candidates}
 
-        other_interests = _get_user_interest_ids(db, other_id)
-        other_age = _calculate_age(prof.date_of_birth) if prof.date_of_birth else None
-
-        i_score = _interest_score(my_interests, other_interests)
-        a_score = _age_score(my_age, other_age)
-
-        if a_score is None:
-            final = i_score
-        else:
-            final = (WEIGHT_INTERESTS * i_score) + (WEIGHT_AGE * a_score)
-
-        shared_ids = my_interests & other_interests
-        shared_names = _get_interest_names(db, shared_ids)
-
-        results.append((
-            {
-                "user_id": other_id,
-                "full_name": u.full_name,
-                "email": u.email,
-                "age": other_age,
-                "profile_photo_url": prof.profile_photo_url,
-                "shared_interests": shared_names,
-            },
-            float(final)
-        ))
-
-    results.sort(key=lambda x: x[1], reverse=True)
     out = []
-    for item, score in results[:limit]:
-        item["score"] = score
-        out.append(item)
-    return out
\ No newline at end of file
+    for i, score in rank(batch, interests_to_bits(my_interests), my_age, limit, WEIGHT_INTERESTS, WEIGHT_AGE,
+                         after=after):
+        u, prof = rows[int(batch.user_ids[i])]
+        other_id = int(u.id)
+
+        # by interest id, like the index and the materialized rankings
+        shared_ids = sorted(my_interests & interests_by_user.get(other_id, set()))
+        shared_names = [interest_names[iid] for iid in shared_ids if iid in interest_names]
+
+        out.append({
+            "user_id": other_id,
+            "full_name": u.full_name,
+            "email": u.email,
+            "age": _calculate_age(prof.date_of_birth) if prof.date_of_birth else None,
+            "profile_photo_url": prof.profile_photo_url,
+            "shared_interests": shared_names,
+            "score": score,
+        })
+    return out
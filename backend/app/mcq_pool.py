@@ -0,0 +1,116 @@
+from __future__ import annotations
+from typing import Dict, Iterable, Optional, Set, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+
+from .ai_test import make_mcq, amake_mcq
+from .cefr import CEFR, harder, easier
+from .metrics import Counter, Gauge
+
+# In-process pool of already-generated MCQs per (language, CEFR level), so an
+# assessment step pops a question instead of waiting on the model. Background
+# threads top a key back up to the high-water mark once it drops below the
+# low-water mark.
+
+MCQ_POOL_LOW_WATER = int(os.getenv("MCQ_POOL_LOW_WATER", "3"))
+MCQ_POOL_HIGH_WATER = int(os.getenv("MCQ_POOL_HIGH_WATER", "8"))
+MCQ_POOL_WORKERS = int(os.getenv("MCQ_POOL_WORKERS", "4"))
+
+Key = Tuple[str, str]
+
+pool_hits = Counter("fluentz_mcq_pool_hits_total", "MCQs served from the warm pool")
+pool_misses = Counter("fluentz_mcq_pool_misses_total", "MCQs generated inline because the pool was empty")
+pool_refill_errors = Counter("fluentz_mcq_pool_refill_errors_total", "Failed background MCQ generations")
+
+
+class McqPool:
+    def __init__(self, low_water: int = MCQ_POOL_LOW_WATER, high_water: int = MCQ_POOL_HIGH_WATER,
+                 workers: int = MCQ_POOL_WORKERS):
+        self.low_water = low_water
+        self.high_water = high_water
+        self._lock = threading.Lock()
+        self._queues: Dict[Key, deque] = {}
+        self._refilling: Set[Key] = set()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mcq-pool")
+
+    def size(self) -> int:
+        with self._lock:
+            return sum(len(q) for q in self._queues.values())
+
+    def take(self, language_name: str, target_cefr: str) -> Optional[dict]:
+        """A pooled question, or None when the pool is empty. Never blocks."""
+        key = (language_name, target_cefr)
+        with self._lock:
+            q = self._queues.setdefault(key, deque())
+            item = q.popleft() if q else None
+        # the next step is one level up or down; keep those warm too
+        for k in {key, (language_name, harder(target_cefr)), (language_name, easier(target_cefr))}:
+            self._maybe_refill(k)
+        if item is None:
+            pool_misses.inc()
+        else:
+            pool_hits.inc()
+        return item
+
+    def get(self, language_name: str, target_cefr: str) -> dict:
+        """Pop from the pool; generate inline only when it is empty."""
+        item = self.take(language_name, target_cefr)
+        return item if item is not None else make_mcq(language_name, target_cefr)
+
+    async def aget(self, language_name: str, target_cefr: str) -> dict:
+        """get() for async handlers."""
+        item = self.take(language_name, target_cefr)
+        return item if item is not None else await amake_mcq(language_name, target_cefr)
+
+    def put(self, language_name: str, target_cefr: str, item: dict) -> bool:
+        """Return an unused question to the pool (dropped if the key is full)."""
+        with self._lock:
+            q = self._queues.setdefault((language_name, target_cefr), deque())
+            if len(q) >= self.high_water:
+                return False
+            q.append(item)
+            return True
+
+    def warm(self, language_names: Iterable[str], levels: Iterable[str] = CEFR) -> None:
+        for name in language_names:
+            for level in levels:
+                with self._lock:
+                    self._queues.setdefault((name, level), deque())
+                self._maybe_refill((name, level))
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _maybe_refill(self, key: Key) -> None:
+        with self._lock:
+            q = self._queues.setdefault(key, deque())
+            if len(q) >= self.low_water or key in self._refilling:
+                return
+            self._refilling.add(key)
+        self._executor.submit(self._refill, key)
+
+    def _refill(self, key: Key) -> None:
+        try:
+            while True:
+                with self._lock:
+                    if len(self._queues[key]) >= self.high_water:
+                        return
+                try:
+                    item = make_mcq(*key)
+                except Exception as e:
+                    # give up for now; the next take() schedules another try
+                    pool_refill_errors.inc()
+                    print(f"[mcq_pool] refill {key} failed: {e}")
+                    return
+                with self._lock:
+                    self._queues[key].append(item)
+        finally:
+            with self._lock:
+                self._refilling.discard(key)
+
+
+mcq_pool = McqPool()
+
+Gauge("fluentz_mcq_pool_size", "Pre-generated MCQs waiting in the pool", fn=mcq_pool.size)
@@ -0,0 +1,136 @@
+from __future__ import annotations
+from typing import Dict, Iterable, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+import asyncio
+import os
+import secrets
+import threading
+import time
+
+from .ai_test import make_mcq
+from .cefr import harder, easier
+from .mcq_pool import mcq_pool
+from .metrics import Counter
+
+# While the learner reads question N at level L, question N+1 will be at
+# harder(L) or easier(L) depending only on the answer. speculate() starts both
+# in the background; claim() hands out the branch the answer picked and
+# recycles the other one into mcq_pool. Speculations live in this process
+# only; an answer routed to another worker simply misses.
+
+MCQ_SPEC_WORKERS = int(os.getenv("MCQ_SPEC_WORKERS", "8"))
+MCQ_SPEC_TTL_SECONDS = float(os.getenv("MCQ_SPEC_TTL_SECONDS", "900"))
+MCQ_SPEC_WAIT_SECONDS = float(os.getenv("MCQ_SPEC_WAIT_SECONDS", "30"))
+
+spec_started = Counter("fluentz_mcq_spec_started_total", "Speculative next-question generations started")
+spec_hits = Counter("fluentz_mcq_spec_hits_total", "Answers served by a speculated question")
+spec_misses = Counter("fluentz_mcq_spec_misses_total", "Answers with no usable speculation")
+spec_recycled = Counter("fluentz_mcq_spec_recycled_total", "Losing branches returned to the MCQ pool")
+spec_discarded = Counter("fluentz_mcq_spec_discarded_total", "Losing or expired branches thrown away")
+
+
+def _fetch(language_name: str, level: str) -> dict:
+    item = mcq_pool.take(language_name, level)
+    return item if item is not None else make_mcq(language_name, level)
+
+
+class Speculator:
+    def __init__(self, workers: int = MCQ_SPEC_WORKERS, ttl_seconds: float = MCQ_SPEC_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # spec id -> (language name, started at, {level: future})
+        self._pending: Dict[str, Tuple[str, float, Dict[str, Future]]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mcq-spec")
+
+    def speculate(self, language_name: str, level: str, skip: Iterable[str] = ()) -> Optional[str]:
+        """
+        Starts the harder/easier branches (minus levels in `skip`, e.g. ones
+        the item bank can serve). Returns the id to claim with, or None.
+        """
+        self._expire()
+        branches: Dict[str, Future] = {}
+        for nxt in (harder(level), easier(level)):
+            if nxt not in branches and nxt not in skip:  # A1/C2 have a single neighbour
+                branches[nxt] = self._executor.submit(_fetch, language_name, nxt)
+                spec_started.inc()
+        if not branches:
+            return None
+        spec_id = secrets.token_urlsafe(12)
+        with self._lock:
+            self._pending[spec_id] = (language_name, time.monotonic(), branches)
+        return spec_id
+
+    def claim(self, spec_id: Optional[str], level: str, wait_seconds: float = MCQ_SPEC_WAIT_SECONDS) -> Optional[dict]:
+        """The speculated question for `level`, or None (caller generates one)."""
+        fut = self._take_branch(spec_id, level)
+        if fut is None:
+            return None
+        try:
+            item = fut.result(timeout=wait_seconds)
+        except Exception:
+            spec_misses.inc()
+            return None
+        spec_hits.inc()
+        return item
+
+    async def aclaim(self, spec_id: Optional[str], level: str, wait_seconds: float = MCQ_SPEC_WAIT_SECONDS) -> Optional[dict]:
+        """claim() for async handlers: waits without blocking the event loop."""
+        fut = self._take_branch(spec_id, level)
+        if fut is None:
+            return None
+        try:
+            item = await asyncio.wait_for(asyncio.wrap_future(fut), timeout=wait_seconds)
+        except Exception:
+            spec_misses.inc()
+            return None
+        spec_hits.inc()
+        return item
+
+    def _take_branch(self, spec_id: Optional[str], level: str) -> Optional[Future]:
+        with self._lock:
+            entry = self._pending.pop(spec_id, None) if spec_id else None
+        if entry is None:
+            spec_misses.inc()
+            return None
+
+        language_name, _, branches = entry
+        for other, fut in branches.items():
+            if other != level:
+                self._recycle(language_name, other, fut)
+
+        fut = branches.get(level)
+        if fut is None:
+            spec_misses.inc()
+        return fut
+
+    def release(self, spec_id: Optional[str]) -> None:
+        """The answer was served some other way; recycle every branch."""
+        with self._lock:
+            entry = self._pending.pop(spec_id, None) if spec_id else None
+        if entry is not None:
+            language_name, _, branches = entry
+            for level, fut in branches.items():
+                self._recycle(language_name, level, fut)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _recycle(self, language_name: str, level: str, fut: Future) -> None:
+        def done(f: Future) -> None:
+            if not f.cancelled() and f.exception() is None and mcq_pool.put(language_name, level, f.result()):
+                spec_recycled.inc()
+            else:
+                spec_discarded.inc()
+        fut.add_done_callback(done)
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        with self._lock:
+            stale = [k for k, (_, started, _) in self._pending.items() if started < cutoff]
+            entries = [self._pending.pop(k) for k in stale]
+        for language_name, _, branches in entries:
+            for level, fut in branches.items():
+                self._recycle(language_name, level, fut)
+
+
+speculator = Speculator()
@@ -0,0 +1,136 @@
+from __future__ import annotations
+from typing import Callable, Dict, List, Optional, Tuple
+import threading
+
+# Tiny in-process metrics registry rendered in Prometheus text format
+# (served by GET /metrics). Counters/gauges/histograms are per worker process.
+
+_lock = threading.Lock()
+_registry: List["_Metric"] = []
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names: Tuple[str, ...], values: LabelKey) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[LabelKey, float] = {}
+        with _lock:
+            _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        with _lock:
+            return [("", k, v) for k, v in self._values.items()]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, v in self.samples():
+            lines.append(f"{self.name}{suffix}{_fmt_labels(self.labels, key)} {v:g}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        k = self._key(labels)
+        with _lock:
+            self._values[k] = self._values.get(k, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with _lock:
+            return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 fn: Optional[Callable[[], object]] = None):
+        super().__init__(name, help, labels)
+        # computed on scrape: a number, or {label values: number} for labelled gauges
+        self._fn = fn
+
+    def set(self, value: float, **labels: str) -> None:
+        with _lock:
+            self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        k = self._key(labels)
+        with _lock:
+            self._values[k] = self._values.get(k, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        if self._fn is not None:
+            v = self._fn()
+            if isinstance(v, dict):
+                return [("", k, float(x)) for k, x in v.items()]
+            return [("", (), float(v))]
+        return super().samples()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: cumulative bucket counts, then sum, then count
+        self._hist: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        k = self._key(labels)
+        with _lock:
+            h = self._hist.get(k)
+            if h is None:
+                h = self._hist[k] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    h[i] += 1
+            h[-2] += value
+            h[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with _lock:
+            hists = [(k, list(h)) for k, h in self._hist.items()]
+        le_names = self.labels + ("le",)
+        for key, h in hists:
+            for b, c in zip(self.buckets, h):
+                lines.append(f"{self.name}_bucket{_fmt_labels(le_names, key + (f'{b:g}',))} {c:g}")
+            lines.append(f"{self.name}_bucket{_fmt_labels(le_names, key + ('+Inf',))} {h[-1]:g}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {h[-2]:g}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {h[-1]:g}")
+        return lines
+
+
+def render_all() -> str:
+    with _lock:
+        metrics = list(_registry)
+    lines: List[str] = []
+    for m in metrics:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
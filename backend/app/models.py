@@ -1,6 +1,6 @@
 from sqlalchemy import (
     Column, String, BigInteger, Boolean, Date, Enum, ForeignKey,
-    SmallInteger, Integer, DateTime, TIMESTAMP, text
+    SmallInteger, Integer, Float, DateTime, TIMESTAMP, Index, text
 )
 from sqlalchemy.orm import DeclarativeBase, relationship
 
@@ -44,6 +44,11 @@ class EmailOtpCode(Base):
 
     user = relationship("User", back_populates="otp_codes")
 
+    __table_args__ = (
+        # one active code per user, overwritten on resend (see otp.py)
+        Index("ux_email_otp_codes_user", "user_id", unique=True),
+    )
+
 class Language(Base):
     __tablename__ = "languages"
 
@@ -86,6 +91,11 @@ class UserLanguage(Base):
 
     created_at = Column(TIMESTAMP, nullable=False, server_default=text("CURRENT_TIMESTAMP"))
 
+    __table_args__ = (
+        # matching candidates: everyone with a given native/target language
+        Index("ix_user_languages_type_language", "type", "language_id", "user_id"),
+    )
+
 
 class Interest(Base):
     __tablename__ = "interests"
@@ -98,4 +108,25 @@ class UserInterest(Base):
     __tablename__ = "user_interests"
 
     user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
-    interest_id = Column(Integer, ForeignKey("interests.id", ondelete="RESTRICT"), primary_key=True)
\ No newline at end of file
+    interest_id = Column(Integer, ForeignKey("interests.id", ondelete="RESTRICT"), primary_key=True)
+
+class MatchPair(Base):
+    __tablename__ = "match_pairs"
+
+    # candidate bucket: users with this native language learning this target
+    native_language_id = Column(SmallInteger, ForeignKey("languages.id", ondelete="CASCADE"), primary_key=True)
+    target_language_id = Column(SmallInteger, ForeignKey("languages.id", ondelete="CASCADE"), primary_key=True)
+
+    touched_at = Column(DateTime, nullable=False)
+    refreshed_at = Column(DateTime, nullable=True)
+
+
+class MatchRecommendation(Base):
+    __tablename__ = "match_recommendations"
+
+    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    candidate_user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    score = Column(Float(precision=53), nullable=False)
+
+    computed_at = Column(DateTime, nullable=False)
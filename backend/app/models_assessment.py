@@ -1,4 +1,4 @@
-from sqlalchemy import Column, BigInteger, SmallInteger, Integer, Enum, Text, DateTime, TIMESTAMP, ForeignKey, text
+from sqlalchemy import Column, BigInteger, SmallInteger, Integer, Boolean, Float, String, Enum, Text, DateTime, TIMESTAMP, ForeignKey, Index, text
 from .models import Base  # uses your existing Base
 
 class AssessmentSession(Base):
@@ -20,8 +20,11 @@ class AssessmentItem(Base):
     __tablename__ = "assessment_items"
 
     id = Column(BigInteger, primary_key=True, autoincrement=True)
-    session_id = Column(BigInteger, ForeignKey("assessment_sessions.id", ondelete="CASCADE"), nullable=False)
-    step = Column(Integer, nullable=False)
+    # NULL session => reusable item bank entry (see item_bank.py)
+    session_id = Column(BigInteger, ForeignKey("assessment_sessions.id", ondelete="CASCADE"), nullable=True)
+    step = Column(Integer, nullable=True)
+    language_id = Column(SmallInteger, ForeignKey("languages.id", ondelete="RESTRICT"), nullable=True)
+    content_hash = Column(String(64), nullable=True, unique=True)
 
     item_type = Column(Enum("mcq","writing"), nullable=False, server_default="mcq")
     target_cefr = Column(Enum("A1","A2","B1","B2","C1","C2"), nullable=False)
@@ -34,5 +37,55 @@ class AssessmentItem(Base):
     score = Column(Integer, nullable=True)
     feedback = Column(Text, nullable=True)
 
+    # calibration (bank items): filled by item_bank.calibrate();
+    # times_served also goes up with every new exposure
+    times_served = Column(Integer, nullable=False, server_default=text("0"))
+    times_correct = Column(Integer, nullable=False, server_default=text("0"))
+    difficulty = Column(Float, nullable=True)  # smoothed share of wrong answers, 0..1
+    calibrated_at = Column(DateTime, nullable=True)
+
+    created_at = Column(TIMESTAMP, nullable=False, server_default=text("CURRENT_TIMESTAMP"))
+    answered_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # item_bank._pick: least-served bank item of a language/type/level
+        Index("ix_assessment_items_bank", "language_id", "item_type", "target_cefr", "times_served"),
+    )
+
+
+class AssessmentItemExposure(Base):
+    __tablename__ = "assessment_item_exposures"
+
+    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    item_id = Column(BigInteger, ForeignKey("assessment_items.id", ondelete="CASCADE"), primary_key=True)
+
+    is_correct = Column(Boolean, nullable=True)  # NULL until answered (always NULL for writing)
+
     created_at = Column(TIMESTAMP, nullable=False, server_default=text("CURRENT_TIMESTAMP"))
     answered_at = Column(DateTime, nullable=True)
+
+
+class AssessmentGradingJob(Base):
+    __tablename__ = "assessment_grading_jobs"
+
+    id = Column(String(32), primary_key=True)  # random, handed to the client
+    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    language_id = Column(SmallInteger, ForeignKey("languages.id", ondelete="RESTRICT"), nullable=False)
+
+    status = Column(Enum("queued","running","done","failed"), nullable=False, server_default="queued")
+    core_estimate = Column(Enum("A1","A2","B1","B2","C1","C2"), nullable=False)
+    writing_item_id = Column(BigInteger, ForeignKey("assessment_items.id", ondelete="SET NULL"), nullable=True)
+    prompt_text = Column(Text, nullable=False)
+    user_text = Column(Text, nullable=False)
+
+    result_json = Column(Text, nullable=True)  # the submit-writing response once done
+    error = Column(Text, nullable=True)
+
+    created_at = Column(TIMESTAMP, nullable=False, server_default=text("CURRENT_TIMESTAMP"))
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # GradingQueue.start: queued jobs and running ones started too long ago
+        Index("ix_assessment_grading_jobs_status", "status", "started_at"),
+    )
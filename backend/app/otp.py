@@ -0,0 +1,125 @@
+from __future__ import annotations
+from typing import Optional, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import os
+
+from sqlalchemy import select, update, delete, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import AsyncSessionLocal
+from .models import EmailOtpCode
+from .security import generate_otp, otp_hash
+from .metrics import Counter
+
+# Email OTP codes. A user has at most one email_otp_codes row (unique
+# user_id): issuing a code overwrites it in place, unless the current code
+# was sent less than OTP_RESEND_COOLDOWN_SECONDS ago. Verified codes are
+# deleted right away; a background task deletes expired ones in batches of
+# OTP_PURGE_BATCH_SIZE (one short transaction each), so the table only
+# holds pending verifications.
+
+OTP_EXPIRE_MINUTES = int(os.getenv("OTP_EXPIRE_MINUTES", "10"))
+OTP_ATTEMPTS = int(os.getenv("OTP_ATTEMPTS", "5"))
+OTP_RESEND_COOLDOWN_SECONDS = int(os.getenv("OTP_RESEND_COOLDOWN_SECONDS", "60"))
+OTP_PURGE_INTERVAL_SECONDS = float(os.getenv("OTP_PURGE_INTERVAL_SECONDS", "300"))
+OTP_PURGE_BATCH_SIZE = int(os.getenv("OTP_PURGE_BATCH_SIZE", "500"))
+
+otp_issued = Counter("fluentz_otp_issued_total", "OTP codes issued", labels=("outcome",))
+otp_purged = Counter("fluentz_otp_purged_total", "Expired or used OTP rows deleted by the purge")
+
+
+async def issue_otp(db: AsyncSession, user_id: int) -> Tuple[Optional[str], int]:
+    """
+    (code, 0) after storing a new code for user_id (caller sends it), or
+    (None, seconds to wait) while the resend cooldown is running. Commits.
+    """
+    now = datetime.utcnow()
+    otp = generate_otp()
+    values = dict(
+        otp_hash=otp_hash(int(user_id), otp),
+        expires_at=now + timedelta(minutes=OTP_EXPIRE_MINUTES),
+        used_at=None,
+        attempts_left=OTP_ATTEMPTS,
+        created_at=now,
+    )
+    cooled = now - timedelta(seconds=OTP_RESEND_COOLDOWN_SECONDS)
+
+    # reuse the row if its code is old enough; one statement, so two
+    # concurrent resends cannot both win
+    r = await db.execute(
+        update(EmailOtpCode)
+        .where(EmailOtpCode.user_id == user_id)
+        .where(or_(EmailOtpCode.created_at <= cooled, EmailOtpCode.used_at.is_not(None)))
+        .values(**values)
+    )
+    if not r.rowcount:
+        sent_at = (await db.execute(
+            select(EmailOtpCode.created_at).where(EmailOtpCode.user_id == user_id)
+        )).scalar_one_or_none()
+        if sent_at is None:
+            db.add(EmailOtpCode(user_id=user_id, **values))
+            try:
+                await db.flush()
+            except IntegrityError:
+                await db.rollback()  # a concurrent request created it first
+                otp_issued.inc(outcome="cooldown")
+                return None, OTP_RESEND_COOLDOWN_SECONDS
+        else:
+            await db.rollback()
+            otp_issued.inc(outcome="cooldown")
+            wait = OTP_RESEND_COOLDOWN_SECONDS - int((now - sent_at).total_seconds())
+            return None, max(1, wait)
+    await db.commit()
+    otp_issued.inc(outcome="sent")
+    return otp, 0
+
+
+async def purge_expired(batch_size: int = OTP_PURGE_BATCH_SIZE) -> int:
+    """Deletes expired and used codes, batch by batch. Returns the row count."""
+    total = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            ids = (await db.execute(
+                select(EmailOtpCode.id)
+                .where(or_(EmailOtpCode.expires_at < datetime.utcnow(), EmailOtpCode.used_at.is_not(None)))
+                .limit(batch_size)
+            )).scalars().all()
+            if not ids:
+                return total
+            await db.execute(delete(EmailOtpCode).where(EmailOtpCode.id.in_(ids)))
+            await db.commit()
+        total += len(ids)
+        otp_purged.inc(len(ids))
+        if len(ids) < batch_size:
+            return total
+        await asyncio.sleep(0)  # let requests in between batches
+
+
+class OtpPurger:
+    def __init__(self, interval_seconds: float = OTP_PURGE_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                n = await purge_expired()
+                if n:
+                    print(f"[otp] purged {n} expired codes")
+            except Exception as e:
+                print(f"[otp] purge failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+
+otp_purger = OtpPurger()
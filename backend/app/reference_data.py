@@ -0,0 +1,189 @@
+from __future__ import annotations
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import unicodedata
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .db import SessionLocal
+from .models import Language, Interest
+from .metrics import Counter, Gauge
+
+# Languages and interests, loaded at startup and kept in memory. They
+# change only when someone edits the tables by hand; POST /meta/reload
+# applies the edit at once in the worker that handles it, and every worker
+# re-reads the (small) tables each REFERENCE_SYNC_SECONDS and swaps in the
+# new data if it differs. The /meta responses are serialized once per load
+# and served with a strong ETag derived from the content, so all workers
+# agree on it. A reload swaps in a whole new snapshot, so readers never see
+# a half-built one.
+
+REFERENCE_SYNC_SECONDS = float(os.getenv("REFERENCE_SYNC_SECONDS", "60"))
+
+catalog_reloads = Counter("fluentz_reference_reloads_total", "Reference data catalog loads")
+
+
+class LanguageRef(NamedTuple):
+    id: int
+    code: str
+    name: str
+
+
+class InterestRef(NamedTuple):
+    id: int
+    name: str
+
+
+def _serialize(content) -> bytes:
+    # same bytes FastAPI's JSONResponse would produce
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def _collation_key(name: str):
+    # what ORDER BY name gave under MySQL's utf8mb4_0900_ai_ci: accents and
+    # case ignored; the exact name breaks ties
+    base = "".join(c for c in unicodedata.normalize("NFKD", name) if not unicodedata.combining(c))
+    return base.casefold(), name
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+class _Snapshot:
+    def __init__(self, version: int, languages: List[LanguageRef], interests: List[InterestRef]):
+        self.version = version
+        self.languages = {l.id: l for l in languages}
+        self.interests = {i.id: i for i in interests}
+        self.languages_body = _serialize([l._asdict() for l in sorted(languages, key=lambda l: _collation_key(l.name))])
+        self.interests_body = _serialize([i._asdict() for i in sorted(interests, key=lambda i: _collation_key(i.name))])
+        self.languages_etag = _etag(self.languages_body)
+        self.interests_etag = _etag(self.interests_body)
+
+
+class ReferenceCatalog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snap: Optional[_Snapshot] = None
+        self._listeners: List[Callable[[], None]] = []
+
+    @property
+    def loaded(self) -> bool:
+        return self._snap is not None
+
+    def version(self) -> int:
+        snap = self._snap
+        return snap.version if snap else 0
+
+    def on_reload(self, fn: Callable[[], None]) -> None:
+        """fn runs after every load that swapped in new data."""
+        self._listeners.append(fn)
+
+    def reload(self, db: Session, only_if_changed: bool = False) -> bool:
+        """Re-reads the tables; returns whether a new snapshot was swapped in."""
+        languages = [LanguageRef(int(i), c, n) for i, c, n in db.execute(select(Language.id, Language.code, Language.name))]
+        interests = [InterestRef(int(i), n) for i, n in db.execute(select(Interest.id, Interest.name))]
+        with self._lock:
+            snap = _Snapshot(self.version() + 1, languages, interests)
+            current = self._snap
+            if (only_if_changed and current is not None and current.languages_etag == snap.languages_etag
+                    and current.interests_etag == snap.interests_etag):
+                return False
+            self._snap = snap
+        catalog_reloads.inc()
+        for fn in self._listeners:
+            fn()
+        return True
+
+    def ensure_loaded(self, db: Session) -> None:
+        """Loads on first use if the startup load failed (DB not up yet)."""
+        if self._snap is None:
+            self.reload(db)
+
+    def _current(self) -> _Snapshot:
+        snap = self._snap
+        if snap is None:
+            raise RuntimeError("reference catalog not loaded")
+        return snap
+
+    # ---- lookups ----
+
+    def language(self, language_id: int) -> Optional[LanguageRef]:
+        return self._current().languages.get(int(language_id))
+
+    def languages(self) -> List[LanguageRef]:
+        return list(self._current().languages.values())
+
+    def all_interest_names(self) -> Dict[int, str]:
+        return {i.id: i.name for i in self._current().interests.values()}
+
+    def interest_names(self, interest_ids: Iterable[int]) -> Dict[int, str]:
+        interests = self._current().interests
+        return {int(i): interests[int(i)].name for i in interest_ids if int(i) in interests}
+
+    # ---- pre-serialized /meta bodies ----
+
+    def languages_response(self):
+        """(body, etag) of /meta/languages."""
+        snap = self._current()
+        return snap.languages_body, snap.languages_etag
+
+    def interests_response(self):
+        snap = self._current()
+        return snap.interests_body, snap.interests_etag
+
+
+class ReferenceCatalogSync:
+    """Picks up edits reloaded by another worker (or not reloaded at all)."""
+
+    def __init__(self, interval_seconds: float = REFERENCE_SYNC_SECONDS):
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await run_in_threadpool(refresh_reference_catalog)
+            except Exception as e:
+                print(f"[reference] catalog refresh failed: {e}")
+
+
+reference_catalog = ReferenceCatalog()
+reference_catalog_sync = ReferenceCatalogSync()
+
+
+def refresh_reference_catalog() -> bool:
+    db = SessionLocal()
+    try:
+        return reference_catalog.reload(db, only_if_changed=True)
+    finally:
+        db.close()
+
+
+Gauge("fluentz_reference_version", "Reference data catalog version (bumped by every reload)", fn=reference_catalog.version)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 asks for GET)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return any((t[2:] if t.startswith("W/") else t) == etag for t in tags)
@@ -1,9 +1,29 @@
-import os, hashlib
+import os, hashlib, asyncio, multiprocessing
+from typing import Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
 from passlib.context import CryptContext
 from jose import jwt
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# Argon2 cost; hashes made with other parameters are upgraded on login.
+# Defaults are passlib's, so existing hashes stay valid as-is.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+
+# Hashing is CPU-bound; async handlers run it in this pool so a login burst
+# does not stall the event loop. At most PASSWORD_HASH_MAX_PENDING hashes are
+# queued per API process.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__time_cost=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM,
+)
 
 JWT_SECRET = os.getenv("JWT_SECRET", "CHANGE_ME")
 OTP_SECRET = os.getenv("OTP_SECRET", "CHANGE_ME_TOO")
@@ -15,6 +35,46 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, password_hash: str) -> bool:
     return pwd_context.verify(password, password_hash)
 
+def _verify_and_rehash(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    if not pwd_context.verify(password, password_hash):
+        return False, None
+    if pwd_context.needs_update(password_hash):
+        return True, pwd_context.hash(password)
+    return True, None
+
+_hash_pool: Optional[ProcessPoolExecutor] = None
+_hash_slots: Optional[asyncio.Semaphore] = None
+
+def _pool() -> ProcessPoolExecutor:
+    global _hash_pool
+    if _hash_pool is None:
+        # not fork: the server has threads (and their locks) that must not be copied
+        # into the workers; forkserver/spawn workers import this module fresh
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _hash_pool = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS,
+                                         mp_context=multiprocessing.get_context(method))
+    return _hash_pool
+
+async def _run_hashing(fn, *args):
+    global _hash_slots
+    if _hash_slots is None:
+        _hash_slots = asyncio.Semaphore(PASSWORD_HASH_MAX_PENDING)
+    async with _hash_slots:
+        return await asyncio.get_running_loop().run_in_executor(_pool(), fn, *args)
+
+async def ahash_password(password: str) -> str:
+    return await _run_hashing(hash_password, password)
+
+async def averify_password(password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    """(valid, new hash) -- new hash is set when the stored one uses outdated parameters."""
+    return await _run_hashing(_verify_and_rehash, password, password_hash)
+
+def shutdown_hash_pool() -> None:
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False, cancel_futures=True)
+        _hash_pool = None
+
 def create_access_token(user_id: int, role: str, minutes: int = 120) -> str:
     now = datetime.now(timezone.utc)
     payload = {
@@ -0,0 +1,53 @@
+"""
+Runs the MySQL schema on SQLite, for the tests and the benchmarks (which
+point DATABASE_URL at a throwaway SQLite file). The app never imports this.
+
+SQLite only auto-increments INTEGER PRIMARY KEY columns, has no ON UPDATE
+clause and spells ON DUPLICATE KEY UPDATE as ON CONFLICT DO UPDATE;
+everything else in the schema maps as is.
+"""
+from sqlalchemy import BigInteger, literal_column, text
+from sqlalchemy.dialects.mysql.dml import OnDuplicateClause
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import coercions, elements, visitors
+
+from .models import Base
+from . import models_assessment  # noqa: F401  (registers the assessment tables)
+
+_installed = False
+
+
+def _sqlite_bigint(type_, compiler, **kw):
+    return "INTEGER"
+
+
+def _sqlite_on_duplicate(clause, compiler, **kw):
+    table = compiler.current_executable.table
+    sets = []
+    for key, val in clause.update.items():
+        column = table.c[key if isinstance(key, str) else key.key]
+        if coercions._is_literal(val):
+            val = elements.BindParameter(None, val, type_=column.type)
+        else:
+            # stmt.inserted[...] is the row that failed to insert: excluded.<col>
+            val = visitors.replacement_traverse(val, {}, lambda e, **_: (
+                literal_column(f"excluded.{compiler.preparer.quote(e.name)}")
+                if isinstance(e, elements.ColumnClause) and e.table is clause.inserted_alias else None
+            ))
+        sets.append(f"{compiler.preparer.quote(column.name)} = {compiler.process(val.self_group(), use_schema=False)}")
+    return "ON CONFLICT DO UPDATE SET " + ", ".join(sets)
+
+
+def use_sqlite_schema() -> None:
+    """Adapts Base.metadata and the SQLite compiler; safe to call more than once."""
+    global _installed
+    if _installed:
+        return
+    compiles(BigInteger, "sqlite")(_sqlite_bigint)
+    compiles(OnDuplicateClause, "sqlite")(_sqlite_on_duplicate)
+    for table in Base.metadata.tables.values():
+        for col in table.columns:
+            default = col.server_default
+            if default is not None and "ON UPDATE" in str(getattr(default, "arg", "")):
+                col.server_default = type(default)(text("CURRENT_TIMESTAMP"))
+    _installed = True
@@ -0,0 +1,135 @@
+from __future__ import annotations
+from typing import Dict, List, Optional
+import os
+import re
+import unicodedata
+
+from .metrics import Counter, Gauge
+
+# Cheap local checks run before a writing submission is sent to the model.
+# They only catch non-attempts (empty, far outside the word limits, wrong
+# language or script, the prompt copied back, one word repeated), which are
+# graded 0 without a model call; every other text goes to grade_writing.
+# A result has the same shape as a model grade.
+
+PRESCORE_SHORT_RATIO = float(os.getenv("PRESCORE_SHORT_RATIO", "0.5"))   # < min_words * ratio
+PRESCORE_LONG_RATIO = float(os.getenv("PRESCORE_LONG_RATIO", "2.0"))     # > max_words * ratio
+PRESCORE_MIN_SCRIPT_SHARE = float(os.getenv("PRESCORE_MIN_SCRIPT_SHARE", "0.3"))
+PRESCORE_MAX_PROMPT_OVERLAP = float(os.getenv("PRESCORE_MAX_PROMPT_OVERLAP", "0.8"))
+PRESCORE_MIN_DIVERSITY = float(os.getenv("PRESCORE_MIN_DIVERSITY", "0.2"))
+
+prescore_outcomes = Counter("fluentz_writing_prescore_total", "Writing submissions by pre-scorer outcome",
+                            labels=("outcome",))
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+# language code -> Unicode script prefix (unicodedata.name) its letters use.
+# Only languages written in exactly one script; the script check is skipped
+# for anything not listed (e.g. Serbian, written in Cyrillic and Latin).
+_SCRIPTS = {
+    "ar": "ARABIC", "fa": "ARABIC", "ur": "ARABIC",
+    "ru": "CYRILLIC", "uk": "CYRILLIC", "bg": "CYRILLIC", "mk": "CYRILLIC",
+    "el": "GREEK", "he": "HEBREW", "hi": "DEVANAGARI", "mr": "DEVANAGARI", "ne": "DEVANAGARI",
+    "bn": "BENGALI", "hy": "ARMENIAN", "ka": "GEORGIAN", "ta": "TAMIL", "te": "TELUGU",
+    "th": "THAI", "ko": "HANGUL",
+    "zh": "CJK", "ja": "CJK",  # kana counted as CJK too
+    "en": "LATIN", "es": "LATIN", "fr": "LATIN", "de": "LATIN", "it": "LATIN", "pt": "LATIN",
+    "nl": "LATIN", "pl": "LATIN", "sv": "LATIN", "da": "LATIN", "no": "LATIN", "fi": "LATIN",
+    "cs": "LATIN", "ro": "LATIN", "hu": "LATIN", "tr": "LATIN", "id": "LATIN", "vi": "LATIN",
+}
+# written without spaces: word counts are meaningless, only the script is checked
+_UNSPACED = {"zh", "ja", "th"}
+
+# frequent function words for telling Latin-script languages apart
+_STOPWORDS = {
+    "en": {"the", "and", "is", "are", "of", "to", "in", "it", "that", "was", "with", "for", "this", "have", "not"},
+    "es": {"el", "la", "los", "las", "y", "es", "de", "que", "en", "un", "una", "por", "con", "para", "muy"},
+    "fr": {"le", "la", "les", "et", "est", "de", "que", "en", "un", "une", "pour", "avec", "dans", "pas", "très"},
+    "de": {"der", "die", "das", "und", "ist", "zu", "ich", "nicht", "ein", "eine", "mit", "auf", "für", "sehr", "auch"},
+    "it": {"il", "la", "gli", "e", "è", "di", "che", "in", "un", "una", "per", "con", "non", "molto", "sono"},
+    "pt": {"o", "a", "os", "as", "e", "é", "de", "que", "em", "um", "uma", "para", "com", "não", "muito"},
+}
+
+
+def _words(text: str) -> List[str]:
+    return [w.lower() for w in _WORD_RE.findall(text)]
+
+
+def _script_of(ch: str) -> str:
+    name = unicodedata.name(ch, "")
+    if name.startswith(("HIRAGANA", "KATAKANA")):
+        return "CJK"
+    return name.split(" ", 1)[0]
+
+
+def _script_share(text: str, script: str) -> float:
+    letters = [c for c in text if c.isalpha()]
+    if not letters:
+        return 0.0
+    return sum(1 for c in letters if _script_of(c) == script) / len(letters)
+
+
+def _likely_other_language(words: List[str], code: str) -> Optional[str]:
+    """Another Latin-script language whose function words clearly dominate."""
+    if code not in _STOPWORDS or len(words) < 20:
+        return None
+    hits = {lang: sum(1 for w in words if w in sw) for lang, sw in _STOPWORDS.items()}
+    best = max(hits, key=hits.get)
+    if best != code and hits[best] >= 5 and hits[best] >= 3 * max(hits[code], 1):
+        return best
+    return None
+
+
+def _shingles(words: List[str], n: int = 3) -> set:
+    return {tuple(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def _zero(feedback: str, outcome: str) -> Dict:
+    prescore_outcomes.inc(outcome=outcome)
+    return {"score": 0, "feedback": feedback, "rubric": {"grammar": 0, "vocab": 0, "coherence": 0}}
+
+
+def prescore(language_code: str, prompt_text: str, user_text: str,
+             min_words: Optional[int] = None, max_words: Optional[int] = None) -> Optional[Dict]:
+    """A grade for texts that are clearly not an attempt, or None (ask the model)."""
+    code = (language_code or "").lower().split("-", 1)[0]
+    words = _words(user_text)
+    n = len(words)
+
+    if n == 0:
+        return _zero("No text was submitted.", "empty")
+    script = _SCRIPTS.get(code)
+    if script and _script_share(user_text, script) < PRESCORE_MIN_SCRIPT_SHARE:
+        return _zero("The text is not written in the language being assessed.", "wrong_script")
+    if code in _UNSPACED:
+        prescore_outcomes.inc(outcome="llm")
+        return None
+
+    if min_words and n < min_words * PRESCORE_SHORT_RATIO:
+        return _zero(f"The text has {n} words; at least {min_words} were required.", "too_short")
+    if max_words and n > max_words * PRESCORE_LONG_RATIO:
+        return _zero(f"The text has {n} words; at most {max_words} were allowed.", "too_long")
+    if _likely_other_language(words, code):
+        return _zero("The text is not written in the language being assessed.", "wrong_language")
+
+    text_shingles = _shingles(words)
+    if text_shingles:
+        overlap = len(text_shingles & _shingles(_words(prompt_text))) / len(text_shingles)
+        if overlap >= PRESCORE_MAX_PROMPT_OVERLAP:
+            return _zero("The text repeats the prompt instead of answering it.", "prompt_copy")
+
+    if n >= 20 and len(set(words)) / n < PRESCORE_MIN_DIVERSITY:
+        return _zero("The text repeats the same few words.", "low_diversity")
+
+    prescore_outcomes.inc(outcome="llm")
+    return None
+
+
+def _avoided_ratio() -> float:
+    samples = {key[0]: v for _, key, v in prescore_outcomes.samples()}
+    total = sum(samples.values())
+    return (total - samples.get("llm", 0.0)) / total if total else 0.0
+
+
+Gauge("fluentz_writing_prescore_avoided_ratio", "Share of writing submissions graded without a model call",
+      fn=_avoided_ratio)
@@ -0,0 +1,86 @@
+"""
+Concurrency with slow model calls in flight.
+
+Fires --requests /assessment/ai/start calls at once (distinct users, empty
+item bank and MCQ pool, LLM cache off, so each one waits on the model for
+--llm-seconds) while probing /health. The model waits overlap, so the
+burst costs one round trip plus the CPU and DB time of the requests
+themselves (client, server and SQLite share this process, so that part
+grows with --requests on a small machine). A stack that waits on the model
+in threadpool threads needs at least requests / 40 round trips, and /health
+queues behind them.
+
+    cd backend && python -m bench.bench_concurrency --requests 200 --llm-seconds 1.5
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+from . import common
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--llm-seconds", type=float, default=1.5)
+    ap.add_argument("--max-concurrency", type=int, default=256, help="LLM_MAX_CONCURRENCY for the run")
+    args = ap.parse_args()
+
+    common.use_sqlite(
+        LLM_CACHE_POLICIES="make_mcq=off,make_writing_prompt=off,grade_writing=off",
+        LLM_MAX_CONCURRENCY=args.max_concurrency,
+        LLM_MAX_QUEUE=args.requests,
+        MCQ_POOL_LOW_WATER=0,  # no background refills: every start calls the model
+        MCQ_SPEC_WORKERS=1,
+    )
+    from app.main import app, stop_mcq_pool
+
+    common.create_schema()
+    common.seed_users(args.requests)
+    common.use_slow_model(args.llm_seconds)
+    base_url = common.serve(app)
+    try:
+        asyncio.run(_run(base_url, args))
+    finally:
+        stop_mcq_pool()
+
+
+async def _run(base_url: str, args) -> None:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.requests + 8, max_keepalive_connections=args.requests + 8)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        health = []
+        done = asyncio.Event()
+
+        async def probe():
+            while not done.is_set():
+                t = time.perf_counter()
+                await client.get("/health")
+                health.append(time.perf_counter() - t)
+                await asyncio.sleep(0.02)
+
+        async def start(user_id: int):
+            t = time.perf_counter()
+            r = await client.post("/assessment/ai/start", json={"user_id": user_id, "language_id": 2})
+            return r.status_code, time.perf_counter() - t
+
+        prober = asyncio.create_task(probe())
+        started = time.perf_counter()
+        results = await asyncio.gather(*(start(u) for u in range(1, args.requests + 1)))
+        wall = time.perf_counter() - started
+        done.set()
+        await prober
+
+    latencies = [s for _, s in results]
+    print(f"{args.requests} concurrent /assessment/ai/start, model latency {args.llm_seconds:g}s")
+    print(f"  status codes:       {dict(Counter(code for code, _ in results))}")
+    print(f"  burst wall time:    {wall:.2f}s ({wall / args.llm_seconds:.1f} model round trips)")
+    print(f"  start p50 / p99:    {common.percentile(latencies, 0.5):.2f}s / {common.percentile(latencies, 0.99):.2f}s")
+    print(f"  /health during it:  p50 {common.percentile(health, 0.5) * 1000:.1f}ms, "
+          f"p99 {common.percentile(health, 0.99) * 1000:.1f}ms, max {max(health) * 1000:.1f}ms ({len(health)} probes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Login throughput against the number of password hash workers.
+
+Seeds users sharing one real Argon2 hash (the ARGON2_* settings in effect),
+then for each worker count fires --requests concurrent POST /auth/login
+calls and reports logins/s and /health latency during the burst.
+
+Measured on a 1-core machine (default Argon2 settings, 24 logins per run):
+3.3 logins/s with 1 worker, 3.5 with 2, i.e. no scaling, since one core
+bounds the hashing; /health p99 stayed at 50-75ms. How throughput grows
+with more cores has not been measured yet; run this on the target host.
+
+    cd backend && python -m bench.bench_login --requests 200
+    cd backend && python -m bench.bench_login --workers 1,2,4,8
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from . import common
+
+PASSWORD = "bench-password"
+
+
+def main() -> None:
+    cores = os.cpu_count() or 1
+    default_workers = sorted({1, *(w for w in (2, 4, 8, 16, 32) if w < cores), cores})
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--workers", default=",".join(map(str, default_workers)),
+                    help="comma-separated PASSWORD_HASH_WORKERS values to run")
+    args = ap.parse_args()
+
+    common.use_sqlite(PASSWORD_HASH_MAX_PENDING=args.requests)
+    from app import security
+    from app.main import app
+
+    common.create_schema()
+    common.seed_users(args.requests, password_hash=security.hash_password(PASSWORD))
+    base_url = common.serve(app)
+
+    print(f"{args.requests} concurrent /auth/login per run, {cores} cores, "
+          f"argon2 t={security.ARGON2_TIME_COST} m={security.ARGON2_MEMORY_COST}KiB p={security.ARGON2_PARALLELISM}")
+    baseline = None
+    try:
+        for workers in [int(w) for w in args.workers.split(",")]:
+            security.shutdown_hash_pool()
+            security.PASSWORD_HASH_WORKERS = workers
+            rate, p50, p99, health, codes = asyncio.run(_run(base_url, args.requests, workers))
+            baseline = baseline or rate
+            print(f"  workers {workers:>3}: {rate:7.1f} logins/s ({rate / baseline:4.1f}x)  "
+                  f"login p50 {p50:.2f}s p99 {p99:.2f}s  /health p99 {health * 1000:.1f}ms  {codes}")
+    finally:
+        security.shutdown_hash_pool()
+
+
+async def _run(base_url: str, requests: int, workers: int):
+    import httpx
+    from collections import Counter
+
+    limits = httpx.Limits(max_connections=requests + 8, max_keepalive_connections=requests + 8)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        async def login(user_id: int):
+            t = time.perf_counter()
+            r = await client.post("/auth/login", json={"email": f"u{user_id}@example.com", "password": PASSWORD})
+            return r.status_code, time.perf_counter() - t
+
+        # start the worker processes outside the measurement
+        await asyncio.gather(*(login(u) for u in range(1, workers + 1)))
+
+        health = []
+        done = asyncio.Event()
+
+        async def probe():
+            while not done.is_set():
+                t = time.perf_counter()
+                await client.get("/health")
+                health.append(time.perf_counter() - t)
+                await asyncio.sleep(0.02)
+
+        prober = asyncio.create_task(probe())
+        started = time.perf_counter()
+        results = await asyncio.gather(*(login(u) for u in range(1, requests + 1)))
+        wall = time.perf_counter() - started
+        done.set()
+        await prober
+
+    latencies = [s for _, s in results]
+    return (requests / wall, common.percentile(latencies, 0.5), common.percentile(latencies, 0.99),
+            common.percentile(health, 0.99), dict(Counter(code for code, _ in results)))
+
+
+if __name__ == "__main__":
+    main()
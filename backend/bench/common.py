@@ -0,0 +1,133 @@
+"""
+Shared setup for the benchmarks: a throwaway SQLite database, seeded users,
+a stand-in model with fixed latency, and the app served by uvicorn on a
+local port. Call use_sqlite() before anything imports app.
+"""
+import asyncio
+import itertools
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+
+def use_sqlite(**env) -> str:
+    tmp = tempfile.mkdtemp(prefix="fluentz-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.sqlite3"
+    os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{tmp}/bench.sqlite3"
+    os.environ["DB_REPLICA_HOST"] = ""
+    os.environ["LLM_CACHE_PATH"] = f"{tmp}/llm_cache.sqlite3"
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    for k, v in env.items():
+        os.environ[k] = str(v)
+    return tmp
+
+
+def create_schema() -> None:
+    from app.db import engine
+    from app.models import Base
+    from app.sqlite_compat import use_sqlite_schema
+
+    use_sqlite_schema()
+    Base.metadata.create_all(engine)
+
+
+def seed_users(n: int, password_hash: str = "x") -> None:
+    """Languages 1-2 and n verified users with completed profiles."""
+    from datetime import date
+    from app.db import SessionLocal
+    from app.models import User, LearnerProfile, UserLanguage, Language
+
+    db = SessionLocal()
+    try:
+        db.add_all([Language(id=1, code="en", name="English"), Language(id=2, code="es", name="Spanish")])
+        for u in range(1, n + 1):
+            db.add(User(id=u, full_name=f"User {u}", email=f"u{u}@example.com", password_hash=password_hash,
+                        onboarding_status="profile_completed", is_email_verified=True))
+        db.flush()
+        for u in range(1, n + 1):
+            db.add(LearnerProfile(user_id=u, date_of_birth=date(1990, 1, 1), gender="other"))
+            db.add(UserLanguage(user_id=u, language_id=1, type="native"))
+            db.add(UserLanguage(user_id=u, language_id=2, type="target"))
+        db.commit()
+    finally:
+        db.close()
+
+
+# =========================
+# Stand-in model
+# =========================
+_MCQ = {"prompt": "Choose the right word.", "options": {"A": "a", "B": "b", "C": "c", "D": "d"},
+        "correct": "A", "explanation": "-"}
+
+
+class _Reply:
+    def __init__(self, text: str):
+        self.output_text = text
+
+
+def _answer(prompt: str, n: int) -> _Reply:
+    if "writing prompt" in prompt:
+        return _Reply(json.dumps({"prompt": f"Write about your day ({n}).", "min_words": 5, "max_words": 80}))
+    if "Grade" in prompt:
+        return _Reply(json.dumps({"score": 7, "feedback": "-", "rubric": {"grammar": 2, "vocab": 2, "coherence": 3}}))
+    return _Reply(json.dumps(dict(_MCQ, prompt=f"{_MCQ['prompt']} ({n})")))
+
+
+_calls = itertools.count(1)  # every reply is distinct
+
+
+class _Responses:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def create(self, model, input, **kw):
+        time.sleep(self.seconds)
+        return _answer(input, next(_calls))
+
+
+class _AsyncResponses(_Responses):
+    async def create(self, model, input, **kw):
+        await asyncio.sleep(self.seconds)
+        return _answer(input, next(_calls))
+
+
+class _Client:
+    def __init__(self, responses):
+        self.responses = responses
+
+    def with_options(self, **kw):
+        return self
+
+
+def use_slow_model(seconds: float) -> None:
+    """Every model call takes `seconds` and succeeds."""
+    from app.llm_client import llm_client
+    llm_client.client = _Client(_Responses(seconds))
+    llm_client.async_client = _Client(_AsyncResponses(seconds))
+
+
+# =========================
+# Server
+# =========================
+def serve(app) -> str:
+    """Runs app under uvicorn in a daemon thread; returns its base URL."""
+    import uvicorn
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
+
+
+def percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
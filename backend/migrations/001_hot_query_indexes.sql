@@ -0,0 +1,27 @@
+-- Secondary indexes for the matching candidate query and verify-otp
+-- (declared on the models in app/models.py). Both are online DDL on
+-- InnoDB: reads and writes continue while the index is built.
+--
+-- Apply with:  mysql "$DB_NAME" < migrations/001_hot_query_indexes.sql
+
+-- matching_service._candidate_ids_query / matching_index.rebuild:
+--   WHERE type = ? AND language_id = ?   (joined back on user_id)
+ALTER TABLE user_languages
+    ADD INDEX ix_user_languages_type_language (type, language_id, user_id),
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+-- verify-otp:
+--   WHERE user_id = ? AND used_at IS NULL ORDER BY created_at DESC, id DESC LIMIT 1
+-- Leads with user_id, so it also backs the FK; MySQL drops the FK's own
+-- implicit index once this one exists.
+ALTER TABLE email_otp_codes
+    ADD INDEX ix_email_otp_codes_user_active (user_id, used_at, created_at, id),
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+-- Check (key should name the new index, no "Using filesort"):
+--   EXPLAIN SELECT ul_native.user_id FROM user_languages ul_native
+--     JOIN user_languages ul_target ON ul_target.user_id = ul_native.user_id
+--      AND ul_target.type = 'target' AND ul_target.language_id = 1
+--    WHERE ul_native.type = 'native' AND ul_native.language_id = 2;
+--   EXPLAIN SELECT * FROM email_otp_codes WHERE user_id = 1 AND used_at IS NULL
+--    ORDER BY created_at DESC, id DESC LIMIT 1;
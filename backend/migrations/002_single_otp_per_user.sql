@@ -0,0 +1,57 @@
+-- One email_otp_codes row per user (app/otp.py overwrites it on resend).
+-- Replaces ix_email_otp_codes_user_active from 001: verify-otp now looks
+-- the row up by user_id alone.
+--
+-- Order: deploy the code that overwrites the row first, then apply this
+-- right away.
+--   * The old code inserts a row per resend. A row inserted for a user
+--     who already has one while the unique index is built makes the
+--     ALTER fail with a duplicate-key error. If old processes cannot be
+--     drained first, stop OTP writes (register, resend-otp) while it runs.
+--   * Until the cleanup below finishes, verify-otp returns an error for
+--     users who still have several codes from the old code, so keep the
+--     gap short.
+-- The file can be rerun if the ALTER fails: the cleanup starts over and
+-- only deletes what is left.
+--
+-- Apply with:  mysql "$DB_NAME" < migrations/002_single_otp_per_user.sql
+
+-- both deletes run in batches of 5000 rows (short transactions, no long
+-- lock on the table) until nothing is left
+DROP PROCEDURE IF EXISTS fluentz_single_otp_cleanup;
+
+DELIMITER //
+CREATE PROCEDURE fluentz_single_otp_cleanup()
+BEGIN
+    -- used and expired codes
+    REPEAT
+        DELETE FROM email_otp_codes
+         WHERE used_at IS NOT NULL OR expires_at < UTC_TIMESTAMP()
+         LIMIT 5000;
+    UNTIL ROW_COUNT() = 0 END REPEAT;
+
+    -- then all but each user's newest remaining code (the old code's
+    -- verify only read the newest one); the derived table is materialized,
+    -- which lets the DELETE read the table it deletes from
+    REPEAT
+        DELETE e FROM email_otp_codes e
+          JOIN (SELECT DISTINCT older.id
+                  FROM email_otp_codes older
+                  JOIN email_otp_codes newer ON newer.user_id = older.user_id AND newer.id > older.id
+                 LIMIT 5000) batch ON batch.id = e.id;
+    UNTIL ROW_COUNT() = 0 END REPEAT;
+END //
+DELIMITER ;
+
+CALL fluentz_single_otp_cleanup();
+DROP PROCEDURE fluentz_single_otp_cleanup;
+
+-- add the unique index before dropping the old one, so the user_id FK
+-- always has an index
+ALTER TABLE email_otp_codes
+    ADD UNIQUE INDEX ux_email_otp_codes_user (user_id),
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE email_otp_codes
+    DROP INDEX ix_email_otp_codes_user_active,
+    ALGORITHM=INPLACE, LOCK=NONE;
@@ -0,0 +1,36 @@
+-- Tables for the offline recommendations job (app/matching_batch.py) and
+-- the stored rankings /matching/recommend serves on a cache miss. New
+-- tables only; /profile/complete writes to both, so apply this before
+-- deploying code that uses them.
+--
+-- Apply with:  mysql "$DB_NAME" < migrations/003_match_tables.sql
+
+-- one row per (native, target) candidate bucket: when a profile last
+-- entered or left it, and when the job last recomputed its rankings
+CREATE TABLE IF NOT EXISTS match_pairs (
+    native_language_id SMALLINT NOT NULL,
+    target_language_id SMALLINT NOT NULL,
+    touched_at DATETIME NOT NULL,
+    refreshed_at DATETIME NULL,
+    PRIMARY KEY (native_language_id, target_language_id),
+    CONSTRAINT fk_match_pairs_native FOREIGN KEY (native_language_id)
+        REFERENCES languages (id) ON DELETE CASCADE,
+    CONSTRAINT fk_match_pairs_target FOREIGN KEY (target_language_id)
+        REFERENCES languages (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- each user's top-K candidates, read in rank order by user_id
+CREATE TABLE IF NOT EXISTS match_recommendations (
+    user_id BIGINT NOT NULL,
+    `rank` INT NOT NULL,
+    candidate_user_id BIGINT NOT NULL,
+    score DOUBLE NOT NULL,
+    computed_at DATETIME NOT NULL,
+    PRIMARY KEY (user_id, `rank`),
+    -- backs the FK (cascading deletes of a candidate's rows)
+    KEY ix_match_recommendations_candidate (candidate_user_id),
+    CONSTRAINT fk_match_recommendations_user FOREIGN KEY (user_id)
+        REFERENCES users (id) ON DELETE CASCADE,
+    CONSTRAINT fk_match_recommendations_candidate FOREIGN KEY (candidate_user_id)
+        REFERENCES users (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,53 @@
+-- Item bank (app/item_bank.py): generated items are kept in
+-- assessment_items with no session and reused across learners;
+-- assessment_item_exposures records who saw (and answered) which item.
+-- The assessment endpoints read these columns, so apply this before
+-- deploying the item bank code. Every statement is online DDL on InnoDB
+-- (MySQL 8.0): reads and writes continue while it runs.
+--
+-- Apply with:  mysql "$DB_NAME" < migrations/004_item_bank.sql
+
+-- bank items have no session or step (rebuilds the table in place)
+ALTER TABLE assessment_items
+    MODIFY session_id BIGINT NULL,
+    MODIFY step INT NULL,
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE assessment_items
+    ADD COLUMN language_id SMALLINT NULL,
+    ADD COLUMN content_hash VARCHAR(64) NULL,
+    ADD COLUMN times_served INT NOT NULL DEFAULT 0,
+    ADD COLUMN times_correct INT NOT NULL DEFAULT 0,
+    ADD COLUMN difficulty FLOAT NULL,
+    ADD COLUMN calibrated_at DATETIME NULL,
+    ALGORITHM=INSTANT;
+
+-- content_hash: one bank row per distinct generated item
+ALTER TABLE assessment_items
+    ADD UNIQUE INDEX content_hash (content_hash),
+    ADD INDEX ix_assessment_items_bank (language_id, item_type, target_cefr, times_served),
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+-- the new column is NULL everywhere, so there is nothing to check; with
+-- checks off, adding the FK is in place instead of a table copy
+SET SESSION foreign_key_checks = 0;
+ALTER TABLE assessment_items
+    ADD CONSTRAINT fk_assessment_items_language FOREIGN KEY (language_id)
+        REFERENCES languages (id) ON DELETE RESTRICT,
+    ALGORITHM=INPLACE, LOCK=NONE;
+SET SESSION foreign_key_checks = 1;
+
+CREATE TABLE IF NOT EXISTS assessment_item_exposures (
+    user_id BIGINT NOT NULL,
+    item_id BIGINT NOT NULL,
+    is_correct TINYINT(1) NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    answered_at DATETIME NULL,
+    PRIMARY KEY (user_id, item_id),
+    -- backs the FK and item_bank.calibrate's GROUP BY item_id
+    KEY ix_assessment_item_exposures_item (item_id),
+    CONSTRAINT fk_assessment_item_exposures_user FOREIGN KEY (user_id)
+        REFERENCES users (id) ON DELETE CASCADE,
+    CONSTRAINT fk_assessment_item_exposures_item FOREIGN KEY (item_id)
+        REFERENCES assessment_items (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,32 @@
+-- Writing grading jobs (app/grading_queue.py): submit-writing stores a row
+-- and returns its id, workers grade it, clients poll it. New table only;
+-- apply before deploying the grading queue code.
+--
+-- Apply with:  mysql "$DB_NAME" < migrations/005_grading_jobs.sql
+
+CREATE TABLE IF NOT EXISTS assessment_grading_jobs (
+    id VARCHAR(32) NOT NULL,
+    user_id BIGINT NOT NULL,
+    language_id SMALLINT NOT NULL,
+    status ENUM('queued','running','done','failed') NOT NULL DEFAULT 'queued',
+    core_estimate ENUM('A1','A2','B1','B2','C1','C2') NOT NULL,
+    writing_item_id BIGINT NULL,
+    prompt_text TEXT NOT NULL,
+    user_text TEXT NOT NULL,
+    result_json TEXT NULL,
+    error TEXT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at DATETIME NULL,
+    finished_at DATETIME NULL,
+    PRIMARY KEY (id),
+    -- startup recovery: queued jobs and running ones started too long ago
+    KEY ix_assessment_grading_jobs_status (status, started_at),
+    KEY ix_assessment_grading_jobs_user (user_id),
+    KEY ix_assessment_grading_jobs_item (writing_item_id),
+    CONSTRAINT fk_assessment_grading_jobs_user FOREIGN KEY (user_id)
+        REFERENCES users (id) ON DELETE CASCADE,
+    CONSTRAINT fk_assessment_grading_jobs_language FOREIGN KEY (language_id)
+        REFERENCES languages (id) ON DELETE RESTRICT,
+    CONSTRAINT fk_assessment_grading_jobs_item FOREIGN KEY (writing_item_id)
+        REFERENCES assessment_items (id) ON DELETE SET NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
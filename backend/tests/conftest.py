@@ -0,0 +1,176 @@
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import date
+
+# The app builds its engines at import time, so point it at a throwaway
+# SQLite file before anything imports app.db.
+_tmp = tempfile.mkdtemp(prefix="fluentz-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/test.sqlite3"
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{_tmp}/test.sqlite3"
+os.environ["DB_REPLICA_HOST"] = ""
+os.environ["LLM_CACHE_PATH"] = f"{_tmp}/llm_cache.sqlite3"
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import event
+
+from app.db import engine, SessionLocal
+from app.models import Base, User, LearnerProfile, UserLanguage, UserInterest, Interest, Language
+from app.reference_data import reference_catalog
+from app.sqlite_compat import use_sqlite_schema
+
+use_sqlite_schema()
+
+
+def _reset_schema() -> None:
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+
+@pytest.fixture
+def db():
+    _reset_schema()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def _seed_population(db, n: int, seed: int = 1) -> None:
+    """
+    Replaces the database with n learners. Odd and even user ids speak
+    languages 1 and 2 natively and learn the other one (so everyone has
+    candidates), some also learn 3 or 4; each has a few interests.
+    """
+    db.rollback()
+    _reset_schema()
+    rnd = random.Random(seed)
+    for i in range(1, 5):
+        db.add(Language(id=i, code=f"l{i}", name=f"Lang{i}"))
+    for i in range(1, 30):
+        db.add(Interest(id=i, name=f"interest{i}"))
+    for u in range(1, n + 1):
+        db.add(User(id=u, full_name=f"User {u}", email=f"u{u}@example.com", password_hash="x",
+                    onboarding_status="profile_completed", is_email_verified=True))
+    db.flush()
+    for u in range(1, n + 1):
+        db.add(LearnerProfile(user_id=u, gender="other",
+                              date_of_birth=date(rnd.randint(1970, 2005), rnd.randint(1, 12), rnd.randint(1, 28))))
+        native = 1 + u % 2
+        db.add(UserLanguage(user_id=u, language_id=native, type="native"))
+        db.add(UserLanguage(user_id=u, language_id=3 - native, type="target"))
+        if rnd.random() < 0.5:
+            db.add(UserLanguage(user_id=u, language_id=rnd.randint(3, 4), type="target"))
+        for iid in rnd.sample(range(1, 30), rnd.randint(0, 6)):
+            db.add(UserInterest(user_id=u, interest_id=iid))
+    db.commit()
+    reference_catalog.reload(db)
+
+
+@contextmanager
+def _count_statements(bind=engine):
+    """Collects every statement run on `bind` inside the block."""
+    statements = []
+
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(bind, "before_cursor_execute", _before)
+    try:
+        yield statements
+    finally:
+        event.remove(bind, "before_cursor_execute", _before)
+
+
+@pytest.fixture
+def populate(db):
+    return lambda n, seed=1: _seed_population(db, n, seed)
+
+
+@pytest.fixture
+def count_statements():
+    return _count_statements
+
+
+# =========================
+# Stand-in model
+# =========================
+GRADE = {"rubric": {"grammar": 3, "vocab": 3, "coherence": 3}, "score": 9, "feedback": "Clear and well organised."}
+
+
+class _Reply:
+    def __init__(self, text):
+        self.output_text = text
+
+
+class _Delta:
+    type = "response.output_text.delta"
+
+    def __init__(self, delta):
+        self.delta = delta
+
+
+class FakeModel:
+    """Answers every prompt with GRADE (or a batch of them) and records the prompts."""
+
+    def __init__(self):
+        self.prompts = []
+        self.responses = self
+
+    def with_options(self, **kw):
+        return self
+
+    def _text(self, prompt):
+        self.prompts.append(prompt)
+        if "Grade each of these" in prompt:
+            n = int(prompt.split("Grade each of these ", 1)[1].split()[0])
+            return json.dumps({"results": [GRADE] * n})
+        return json.dumps(GRADE)
+
+    def create(self, model, input, **kw):
+        return _Reply(self._text(input))
+
+
+class FakeAsyncModel(FakeModel):
+    async def create(self, model, input, stream=False, **kw):
+        text = self._text(input)
+        if not stream:
+            return _Reply(text)
+
+        async def events():
+            for i in range(0, len(text), 8):
+                await asyncio.sleep(0.005)
+                yield _Delta(text[i:i + 8])
+        return events()
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Replaces the OpenAI clients; `.prompts` lists every model call made."""
+    from app.llm_client import llm_client
+
+    sync_model, async_model = FakeModel(), FakeAsyncModel()
+    async_model.prompts = sync_model.prompts
+    monkeypatch.setattr(llm_client, "client", sync_model)
+    monkeypatch.setattr(llm_client, "async_client", async_model)
+    return sync_model
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    """TestClient for the app without its startup work (pool warm-up, index build, ...)."""
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    monkeypatch.setattr(app.router, "on_startup", [])
+    monkeypatch.setattr(app.router, "on_shutdown", [])
+    with TestClient(app) as c:
+        yield c
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from app import main
+from app.admission import AdmissionController, Overloaded, admission_rejected
+from test_assessment_writing import TEXT, _writing_state
+
+
+def test_over_capacity_is_a_fast_429_with_retry_after(client, populate, fake_llm, monkeypatch):
+    from app.models_assessment import AssessmentGradingJob
+
+    populate(5)
+    limiter = AdmissionController(max_concurrency=1, max_queue=0, max_wait_seconds=5)
+    monkeypatch.setattr(main, "admission", limiter)
+    client.portal.call(limiter.acquire, 2)  # someone else holds the only slot
+    rejected = admission_rejected.value(reason="queue_full")
+
+    r = client.post("/assessment/ai/submit-writing/stream", json={"state_token": _writing_state(), "text": TEXT})
+
+    assert r.status_code == 429
+    assert r.headers["Retry-After"] == "2"  # one wave of the default 2s hold time
+    assert admission_rejected.value(reason="queue_full") == rejected + 1
+    assert fake_llm.prompts == []
+    db = main.SessionLocal()
+    try:
+        assert db.query(AssessmentGradingJob).count() == 0
+    finally:
+        db.close()
+
+
+def test_waiters_are_served_round_robin_across_users():
+    async def scenario():
+        limiter = AdmissionController(max_concurrency=1, max_queue=10, max_wait_seconds=5, max_per_user=3)
+        await limiter.acquire(9)
+        served = []
+
+        async def call(user_id):
+            async with limiter.slot(user_id):
+                served.append(user_id)
+                await asyncio.sleep(0)
+
+        tasks = [asyncio.create_task(call(u)) for u in (1, 1, 1, 2, 3)]
+        await asyncio.sleep(0)
+        assert limiter.queued() == 5
+        limiter.release(9)
+        await asyncio.gather(*tasks)
+        return served, limiter
+
+    served, limiter = asyncio.run(scenario())
+    assert served == [1, 2, 3, 1, 1]
+    assert (limiter.active(), limiter.queued()) == (0, 0)
+
+
+def test_per_user_cap_and_queue_timeout():
+    async def scenario():
+        limiter = AdmissionController(max_concurrency=1, max_queue=10, max_wait_seconds=0.05, max_per_user=1)
+        await limiter.acquire(1)
+        with pytest.raises(Overloaded) as per_user:
+            await limiter.acquire(1)
+        with pytest.raises(Overloaded) as timeout:
+            await limiter.acquire(2)
+        return limiter, per_user.value, timeout.value
+
+    limiter, per_user, timeout = asyncio.run(scenario())
+    assert (per_user.reason, timeout.reason) == ("per_user", "timeout")
+    assert timeout.retry_after >= 1
+    assert (limiter.active(), limiter.queued()) == (1, 0)  # the waiter that gave up left no trace
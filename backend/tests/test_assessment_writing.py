@@ -0,0 +1,185 @@
+import asyncio
+import json
+import time
+import uuid
+
+import pytest
+
+from app import main
+from app.grading_queue import grading_queue
+
+TEXT = ("Last summer I visited Lisbon with my sister. We walked through the old streets, "
+        "ate grilled sardines by the river and took the yellow tram up the hill. "
+        "In the evening we listened to fado in a small bar. I would like to go back next year.")
+
+
+def _writing_state(user_id=1, language_id=1):
+    # what answer-mcq hands out when the core questions are done
+    return main.sign_json({
+        "user_id": user_id,
+        "language_id": language_id,
+        "step": 9,
+        "estimated": "B1",
+        "phase": "writing",
+        "writing_item_id": None,
+        "writing_prompt": f"Describe a trip you enjoyed. ({uuid.uuid4().hex})",  # no LLM cache hits
+        "writing_limits": [20, 150],
+        "ts": int(time.time()),
+    })
+
+
+@pytest.fixture
+def learners(populate):
+    populate(5)
+
+
+def test_submit_writing_makes_one_model_call(client, learners, fake_llm, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(grading_queue, "submit", submitted.append)
+
+    r = client.post("/assessment/ai/submit-writing", json={"state_token": _writing_state(), "text": TEXT})
+    assert r.status_code == 200, r.text
+    assert r.json()["status"] == "queued"
+    assert fake_llm.prompts == []  # the prompt comes from the state token
+
+    client.portal.call(grading_queue._run, submitted)
+
+    assert len(fake_llm.prompts) == 1
+    assert "Describe a trip you enjoyed." in fake_llm.prompts[0]
+    status = client.get(f"/assessment/ai/grading/{submitted[0]}").json()
+    assert status["status"] == "done"
+    assert status["result"]["writing_score"] == 9
+
+
+def test_resubmitting_returns_the_open_job(client, learners, fake_llm, monkeypatch):
+    from app.models import LanguageAssessment
+    from app.models_assessment import AssessmentGradingJob
+
+    submitted = []
+    monkeypatch.setattr(grading_queue, "submit", submitted.append)
+    body = {"state_token": _writing_state(), "text": TEXT}
+
+    first = client.post("/assessment/ai/submit-writing", json=body).json()
+    again = client.post("/assessment/ai/submit-writing", json=body).json()
+    assert again == {"message": "Grading queued", "job_id": first["job_id"], "status": "queued"}
+    assert submitted == [first["job_id"]]
+
+    client.portal.call(grading_queue._run, submitted)
+    # a job finalized twice (e.g. recovered by another process) adds nothing
+    client.portal.call(grading_queue._run, submitted)
+
+    assert len(fake_llm.prompts) == 1
+    db = main.SessionLocal()
+    try:
+        assert db.query(AssessmentGradingJob).count() == 1
+        assert db.query(LanguageAssessment).filter_by(user_id=1, language_id=1).count() == 1
+    finally:
+        db.close()
+
+
+def test_streamed_submit_writing_makes_one_model_call(client, learners, fake_llm):
+    r = client.post("/assessment/ai/submit-writing/stream", json={"state_token": _writing_state(), "text": TEXT})
+    assert r.status_code == 200, r.text
+    assert "event: result" in r.text
+    assert '"status": "done"' in r.text
+    assert len(fake_llm.prompts) == 1
+
+
+def test_streamed_job_is_saved_when_the_client_disconnects(client, learners, fake_llm):
+    body = json.dumps({"state_token": _writing_state(), "text": TEXT}).encode()
+    sent = []
+
+    async def call_and_disconnect():
+        first_chunk = asyncio.Event()
+
+        async def receive():
+            if not sent:
+                sent.append("request")
+                return {"type": "http.request", "body": body, "more_body": False}
+            await first_chunk.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                first_chunk.set()
+
+        scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+                 "scheme": "http", "path": "/assessment/ai/submit-writing/stream", "raw_path": b"",
+                 "root_path": "", "query_string": b"", "headers": [(b"content-type", b"application/json")],
+                 "client": ("test", 1), "server": ("test", 80)}
+        await main.app(scope, receive, send)
+
+        # the response is gone; the grading task finishes on its own
+        for _ in range(200):
+            if not main._stream_grading_tasks:
+                break
+            await asyncio.sleep(0.01)
+
+    client.portal.call(call_and_disconnect)
+
+    from app.models_assessment import AssessmentGradingJob
+    from app.db import SessionLocal
+    db = SessionLocal()
+    try:
+        jobs = db.query(AssessmentGradingJob).all()
+    finally:
+        db.close()
+    assert [j.status for j in jobs] == ["done"]
+    assert len(fake_llm.prompts) == 1
+
+
+def test_status_gates_do_not_trust_another_workers_cache(client, learners, fake_llm):
+    from app.auth import CurrentUser, user_cache
+    from app.models import User
+
+    def stale_entry():
+        # this worker cached user 1 before another one finished their assessment
+        user_cache.put(CurrentUser(1, "u1@example.com", "User 1", "user", "profile_completed", True),
+                       user_cache.version(1))
+
+    db = main.SessionLocal()
+    try:
+        db.get(User, 1).onboarding_status = "assessed"
+        db.commit()
+    finally:
+        db.close()
+
+    stale_entry()
+    r = client.post("/assessment/ai/start", json={"user_id": 1, "language_id": 1})
+    assert r.status_code == 400, r.text
+    stale_entry()
+    r = client.post("/assessment/ai/submit-writing", json={"state_token": _writing_state(), "text": TEXT})
+    assert r.status_code == 400, r.text
+    assert fake_llm.prompts == []
+
+
+def test_streamed_and_plain_grades_are_cached_apart(fake_llm):
+    from app.ai_test import agrade_writing, agrade_writing_stream
+
+    args = ("Lang1", "B1", f"Describe a trip you enjoyed. ({uuid.uuid4().hex})", TEXT)
+
+    async def stream():
+        return [item async for item in agrade_writing_stream(*args)]
+
+    asyncio.run(stream())
+    asyncio.run(agrade_writing(*args))  # asks the model with its own prompt
+    assert len(fake_llm.prompts) == 2
+    assert "keys in this order: rubric" in fake_llm.prompts[0]
+    assert "keys in this order" not in fake_llm.prompts[1]
+
+    asyncio.run(stream())
+    asyncio.run(agrade_writing(*args))
+    assert len(fake_llm.prompts) == 2  # each served from its own entry
+
+
+def test_streamed_grading_reports_its_slot_hold_time(client, learners, fake_llm, monkeypatch):
+    from app.admission import admission
+
+    held = []
+    release = admission.release
+    monkeypatch.setattr(admission, "release",
+                        lambda user_id, held_seconds=0.0: (held.append(held_seconds), release(user_id, held_seconds)))
+
+    r = client.post("/assessment/ai/submit-writing/stream", json={"state_token": _writing_state(), "text": TEXT})
+    assert r.status_code == 200, r.text
+    assert len(held) == 1 and held[0] > 0
@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from app import db as app_db
+
+
+def _read_session():
+    gen = app_db.get_read_db()
+    return gen, next(gen)
+
+
+def _use_replica(monkeypatch, url):
+    monkeypatch.setattr(app_db, "_pools", dict(app_db._pools))
+    replica = app_db.build_engine(url, "replica")
+    monkeypatch.setattr(app_db, "read_engine", replica)
+    monkeypatch.setattr(app_db, "ReadSessionLocal", sessionmaker(bind=replica, autoflush=False, autocommit=False))
+    monkeypatch.setattr(app_db, "_replica_down_until", None)
+    return replica
+
+
+def test_replica_url_override(tmp_path):
+    env = dict(os.environ, DATABASE_REPLICA_URL=f"sqlite:///{tmp_path}/replica.sqlite3",
+               ASYNC_DATABASE_REPLICA_URL=f"sqlite+aiosqlite:///{tmp_path}/replica.sqlite3")
+    out = subprocess.run(
+        [sys.executable, "-c", "from app import db; print(db.read_engine is not db.engine, db.read_engine.url.database, "
+                               "db.async_read_engine is not db.async_engine)"],
+        env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True, text=True, check=True,
+    ).stdout.split()
+    assert out == ["True", f"{tmp_path}/replica.sqlite3", "True"]
+
+
+def test_reads_go_to_the_replica(monkeypatch, tmp_path):
+    replica = _use_replica(monkeypatch, f"sqlite:///{tmp_path}/replica.sqlite3")
+    with replica.begin() as conn:
+        conn.execute(text("CREATE TABLE replica_marker (x INTEGER)"))
+        conn.execute(text("INSERT INTO replica_marker VALUES (7)"))
+
+    gen, session = _read_session()
+    try:
+        assert session.get_bind() is replica
+        assert session.execute(text("SELECT x FROM replica_marker")).scalar_one() == 7
+    finally:
+        gen.close()
+
+
+def test_primary_takes_over_while_the_replica_is_down(monkeypatch, tmp_path):
+    # a directory that does not exist: every connection attempt fails
+    _use_replica(monkeypatch, f"sqlite:///{tmp_path}/missing/replica.sqlite3")
+    monkeypatch.setattr(app_db, "DB_REPLICA_RETRY_SECONDS", 30)
+    clock = [1000.0]
+    monkeypatch.setattr(app_db.time, "monotonic", lambda: clock[0])
+    fallbacks = app_db.replica_fallbacks.value()
+
+    for _ in range(2):  # failed, then skipped without trying
+        gen, session = _read_session()
+        try:
+            assert session.get_bind() is app_db.engine
+        finally:
+            gen.close()
+    assert app_db.replica_fallbacks.value() == fallbacks + 1
+    assert not app_db._use_replica(app_db.read_engine, app_db.engine)
+
+    clock[0] += 30  # retry window over: the replica is tried again
+    assert app_db._use_replica(app_db.read_engine, app_db.engine)
@@ -0,0 +1,37 @@
+from app import item_bank
+
+
+def _bank(db, populate, n_items):
+    populate(10)
+    ids = [item_bank.store_mcq(db, 1, "B1", {"prompt": f"Q{i}", "options": {"A": "a", "B": "b"}, "correct": "A"})
+           for i in range(n_items)]
+    db.commit()
+    return ids
+
+
+def test_learners_are_spread_across_the_bank(db, populate):
+    ids = _bank(db, populate, 3)
+
+    first_items = []
+    for user_id in (1, 2, 3):
+        item_id, _ = item_bank.pick_mcq(db, user_id, 1, "B1")
+        item_bank.record_exposure(db, user_id, item_id)
+        db.commit()
+        first_items.append(item_id)
+
+    assert sorted(first_items) == ids
+
+
+def test_calibrate_recounts_served_and_answers(db, populate):
+    ids = _bank(db, populate, 1)
+    for user_id, correct in ((1, True), (2, False), (3, None)):
+        item_bank.record_exposure(db, user_id, ids[0])
+        if correct is not None:
+            item_bank.record_answer(db, user_id, ids[0], correct)
+    db.commit()
+
+    assert item_bank.calibrate(db) == 1
+    item = db.get(item_bank.AssessmentItem, ids[0])
+    db.refresh(item)
+    assert (item.times_served, item.times_correct) == (3, 1)
+    assert item.difficulty == 1.0 - 2 / 4
@@ -0,0 +1,43 @@
+import asyncio
+import time
+
+from app.llm_cache import LlmCache
+
+
+def _last_used(cache, key_prompt):
+    from app.llm_cache import cache_key
+    return cache._conn.execute("SELECT last_used FROM llm_cache WHERE key = ?",
+                               (cache_key("m", key_prompt),)).fetchone()[0]
+
+
+def test_disk_hits_are_touched_with_the_next_write(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    LlmCache(path=path).put("grade_writing", "m", "p1", "r1")
+
+    cache = LlmCache(path=path)  # fresh memory tier: the next get reads the disk
+    cache._db_locked()
+    before = _last_used(cache, "p1")
+    updates = []
+    cache._conn.set_trace_callback(lambda sql: updates.append(sql) if sql.startswith("UPDATE") else None)
+    time.sleep(0.01)
+
+    assert cache.get("grade_writing", "m", "p1") == "r1"
+    assert updates == []  # a hit does not write
+
+    cache.put("grade_writing", "m", "p2", "r2")
+    assert len(updates) == 1
+    assert _last_used(cache, "p1") > before
+
+
+def test_async_get_and_put(tmp_path):
+    cache = LlmCache(path=str(tmp_path / "cache.sqlite3"))
+
+    async def run():
+        assert await cache.aget("grade_writing", "m", "p") is None
+        await cache.aput("grade_writing", "m", "p", "r")
+        memory_hit = await cache.aget("grade_writing", "m", "p")
+        cache._memory.clear()
+        disk_hit = await cache.aget("grade_writing", "m", "p")
+        return memory_hit, disk_hit
+
+    assert asyncio.run(run()) == ("r", "r")
@@ -0,0 +1,52 @@
+import asyncio
+
+from app.llm_client import CircuitBreaker, llm_client
+
+
+def _half_open(monkeypatch):
+    breaker = CircuitBreaker(failures=1, cooldown_seconds=0)
+    breaker.record(False)
+    assert breaker.state() == CircuitBreaker.HALF_OPEN
+    monkeypatch.setattr(llm_client, "breaker", breaker)
+    return breaker
+
+
+class _HangingModel:
+    def __init__(self):
+        self.responses = self
+
+    def with_options(self, **kw):
+        return self
+
+    async def create(self, model, input, **kw):
+        await asyncio.sleep(60)
+
+
+def test_cancelled_trial_call_releases_the_breaker(monkeypatch):
+    breaker = _half_open(monkeypatch)
+    monkeypatch.setattr(llm_client, "async_client", _HangingModel())
+
+    async def run():
+        task = asyncio.ensure_future(llm_client.acomplete("grade_writing", "prompt", str))
+        await asyncio.sleep(0.01)
+        assert not breaker.allow()  # the trial is running
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run())
+    assert breaker.allow()  # a new trial may start
+
+
+def test_stream_closed_early_releases_the_breaker(monkeypatch, fake_llm):
+    breaker = _half_open(monkeypatch)
+
+    async def run():
+        stream = llm_client.astream("grade_writing_stream", "prompt")
+        await stream.__anext__()
+        await stream.aclose()  # what a client disconnect does to the SSE generator
+
+    asyncio.run(run())
+    assert breaker.allow()
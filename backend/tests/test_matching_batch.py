@@ -0,0 +1,19 @@
+from datetime import datetime, timedelta
+
+from app.matching_batch import MATCH_BATCH_TOP_K, load_materialized, refresh_pair
+from app.matching_service import get_recommendations
+from app.models import MatchPair
+
+
+def test_materialized_rankings_match_the_live_path(db, populate):
+    populate(200)
+    pair = (1, 2)  # natives of 1 learning 2: the candidates of every odd user
+    db.add(MatchPair(native_language_id=1, target_language_id=2, touched_at=datetime.utcnow() - timedelta(minutes=1)))
+    db.commit()
+
+    assert refresh_pair(pair) > 0
+    for viewer in (1, 3, 5, 11):
+        stored = load_materialized(db, viewer, pair)
+        assert stored is not None
+        assert stored == get_recommendations(db, viewer, limit=MATCH_BATCH_TOP_K)
+    assert any(r["shared_interests"] for r in stored)
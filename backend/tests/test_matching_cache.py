@@ -0,0 +1,73 @@
+from datetime import date
+
+import pytest
+
+from app import main
+from app.matching_cache import recommendation_cache
+from app.matching_index import MatchingIndex
+from app.matching_service import get_recommendations
+
+
+@pytest.fixture
+def indexed(db, monkeypatch):
+    index = MatchingIndex()
+    monkeypatch.setattr(main, "matching_index", index)
+    recommendation_cache.clear()
+    yield index
+    recommendation_cache.clear()
+
+
+def _recommend(client, user_id):
+    r = client.post("/matching/recommend", json={"user_id": user_id, "limit": 10})
+    assert r.status_code == 200
+    return [(m["id"], m["score"]) for m in r.json()["recommended_matches"]]
+
+
+def test_profile_update_drops_the_entries_it_affects(client, db, populate, indexed):
+    populate(60)
+    indexed.rebuild(db)
+    # user 1 speaks 2 and learns 1: a candidate for user 2 (speaks 1, learns 2);
+    # user 3 draws from the same pool as user 1 and does not see user 1
+    for uid in (1, 2, 3):
+        _recommend(client, uid)
+    assert recommendation_cache.get_page(3, 10) is not None
+    generation = recommendation_cache.generation()
+
+    r = client.post("/profile/complete", json={
+        "user_id": 1, "date_of_birth": "1990-05-05", "gender": "other",
+        "native_language_id": 2, "target_language_ids": [1], "interest_ids": [1, 2, 3, 4, 5],
+    })
+    assert r.status_code == 200
+
+    assert recommendation_cache.generation() > generation
+    assert recommendation_cache.get_page(1, 10) is None
+    assert recommendation_cache.get_page(2, 10) is None
+    assert recommendation_cache.get_page(3, 10) is not None
+
+    # the next visit sees the new profile
+    live = [(r["user_id"], r["score"]) for r in get_recommendations(db, 2, limit=10)]
+    assert _recommend(client, 2) == live
+    assert _recommend(client, 2) == live  # now served from the cache
+    assert recommendation_cache.get_page(2, 10) is not None
+
+
+def test_repeat_visit_is_served_from_the_cache(client, db, populate, indexed, count_statements):
+    populate(40)
+    indexed.rebuild(db)
+    first = _recommend(client, 2)
+
+    with count_statements() as statements:
+        assert _recommend(client, 2) == first
+    assert not [s for s in statements if "user_languages" in s or "user_interests" in s]
+
+
+def test_ranking_computed_across_an_invalidation_is_not_cached(indexed):
+    generation = recommendation_cache.generation()
+    recommendation_cache.invalidate(7, [(1, 2)])  # a profile changed mid-computation
+
+    recommendation_cache.put(5, (1, 2), [{"user_id": 9, "score": 0.5}], complete=True, generation=generation)
+    assert recommendation_cache.get_page(5, 10) is None
+
+    recommendation_cache.put(5, (1, 2), [{"user_id": 9, "score": 0.5}], complete=True,
+                             generation=recommendation_cache.generation())
+    assert recommendation_cache.get_page(5, 10) == [{"user_id": 9, "score": 0.5}]
@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, update
+
+from app.matching_index import MatchingIndex
+from app.models import LearnerProfile, UserLanguage
+
+
+def test_sync_picks_up_edits_from_other_workers(db, populate):
+    populate(50)
+    index = MatchingIndex()
+    index.rebuild(db)
+    assert index.pool_of(1) == (1, 2)
+
+    # another worker moves user 1 from learning language 1 to language 3
+    db.execute(delete(UserLanguage).where(UserLanguage.user_id == 1, UserLanguage.type == "target"))
+    db.add(UserLanguage(user_id=1, language_id=3, type="target"))
+    db.execute(update(LearnerProfile).where(LearnerProfile.user_id == 1)
+               .values(updated_at=datetime.utcnow() + timedelta(minutes=5)))
+    db.commit()
+
+    changed = index.sync(db)
+    assert set(changed) == {1}
+    assert (2, 3) in changed[1]
+    assert index.pool_of(1) == (3, 2)
+
+    # nothing moved since: nothing reported
+    assert index.sync(db) == {}
@@ -0,0 +1,53 @@
+import random
+from datetime import date
+
+import pytest
+
+from app.matching_scorer import CandidateBatch, bits_to_interests, interests_to_bits, rank
+from app.matching_service import WEIGHT_AGE, WEIGHT_INTERESTS, _age_score, _calculate_age, _interest_score
+
+
+def _python_score(mine, my_age, interests, dob):
+    i_score = _interest_score(mine, interests)
+    a_score = _age_score(my_age, _calculate_age(dob) if dob else None)
+    return i_score if a_score is None else WEIGHT_INTERESTS * i_score + WEIGHT_AGE * a_score
+
+
+def _population(rnd, n):
+    rows = []
+    for uid in range(1, n + 1):
+        dob = None if rnd.random() < 0.2 else date(rnd.randint(1960, 2008), rnd.randint(1, 12), rnd.randint(1, 28))
+        rows.append((uid, dob, set(rnd.sample(range(1, 40), rnd.randint(0, 6)))))
+    return rows
+
+
+@pytest.mark.parametrize("mine, my_age", [
+    ({3, 7, 12}, 30),
+    ({3, 7, 12}, None),       # viewer without a birth date: interests only
+    (set(), 25),              # no interests: Jaccard is 0 for everyone
+    ({2, 90, 130}, 41),       # ids beyond every candidate's still count in the union
+])
+def test_batch_score_equals_the_per_candidate_score(mine, my_age):
+    rows = _population(random.Random(7), 300)
+    batch = CandidateBatch([(uid, dob, interests_to_bits(ids)) for uid, dob, ids in rows])
+
+    scores = batch.score(interests_to_bits(mine), my_age, WEIGHT_INTERESTS, WEIGHT_AGE)
+
+    assert list(scores) == [_python_score(mine, my_age, ids, dob) for _, dob, ids in rows]
+
+
+def test_rank_orders_by_score_then_user_id():
+    rows = _population(random.Random(3), 200)
+    batch = CandidateBatch([(uid, dob, interests_to_bits(ids)) for uid, dob, ids in rows])
+    mine = {1, 2, 3, 4}
+
+    ranked = [(int(batch.user_ids[i]), s) for i, s in rank(batch, interests_to_bits(mine), 35, 50,
+                                                               WEIGHT_INTERESTS, WEIGHT_AGE, exclude_user_id=4)]
+
+    expected = sorted(((uid, _python_score(mine, 35, ids, dob)) for uid, dob, ids in rows if uid != 4),
+                      key=lambda r: (-r[1], r[0]))[:50]
+    assert ranked == expected
+
+
+def test_bits_round_trip():
+    assert bits_to_interests(interests_to_bits([0, 5, 64, 129])) == [0, 5, 64, 129]
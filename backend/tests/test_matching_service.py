@@ -0,0 +1,95 @@
+from datetime import date
+
+from sqlalchemy import select
+
+from app.matching_index import MatchingIndex
+from app.matching_service import (
+    WEIGHT_AGE, WEIGHT_INTERESTS, _age_score, _calculate_age, _interest_score, get_recommendations,
+)
+from app.models import LearnerProfile, User, UserInterest, UserLanguage
+
+
+def _recommend(db, count_statements, user_id=1):
+    with count_statements() as statements:
+        recs = get_recommendations(db, user_id, limit=20)
+    return recs, len(statements)
+
+
+def test_query_count_does_not_grow_with_candidates(db, populate, count_statements):
+    populate(40)
+    small, small_count = _recommend(db, count_statements)
+
+    populate(400)
+    large, large_count = _recommend(db, count_statements)
+
+    assert small and len(large) == 20
+    assert small_count == large_count
+    assert large_count == 5
+
+
+def test_recommend_does_not_cache_the_user_read(db, populate, client):
+    from app.auth import user_cache
+
+    populate(40)
+    user_cache.invalidate(1)
+    r = client.post("/matching/recommend", json={"user_id": 1})
+    assert r.status_code == 200 and r.json()["recommended_matches"]
+    # the handler's session may be a lagging replica
+    assert user_cache.get(1) is None
+
+
+def _baseline(db, user_id, limit):
+    """The pre-batching algorithm: score every candidate in Python, stable sort by score."""
+    def languages(uid, kind):
+        return sorted(int(l) for l in db.execute(
+            select(UserLanguage.language_id).where(UserLanguage.user_id == uid, UserLanguage.type == kind)).scalars())
+
+    def interests(uid):
+        return set(int(i) for i in db.execute(
+            select(UserInterest.interest_id).where(UserInterest.user_id == uid)).scalars())
+
+    me = db.get(LearnerProfile, user_id)
+    my_native, my_target = languages(user_id, "native")[0], languages(user_id, "target")[0]
+    my_age = _calculate_age(me.date_of_birth)
+    mine = interests(user_id)
+    results = []
+    for prof in db.execute(select(LearnerProfile).order_by(LearnerProfile.user_id)).scalars():
+        uid = int(prof.user_id)
+        if uid == user_id or my_target not in languages(uid, "native") or my_native not in languages(uid, "target"):
+            continue
+        i_score = _interest_score(mine, interests(uid))
+        a_score = _age_score(my_age, _calculate_age(prof.date_of_birth))
+        results.append((uid, i_score if a_score is None else WEIGHT_INTERESTS * i_score + WEIGHT_AGE * a_score))
+    results.sort(key=lambda r: r[1], reverse=True)
+    return results[:limit]
+
+
+def _add_twins(db, first_id, count):
+    # same birth date, interests and languages: equal scores for every viewer
+    for uid in range(first_id, first_id + count):
+        db.add(User(id=uid, full_name=f"Twin {uid}", email=f"t{uid}@example.com", password_hash="x",
+                    onboarding_status="profile_completed", is_email_verified=True))
+        db.flush()
+        db.add(LearnerProfile(user_id=uid, gender="other", date_of_birth=date(1990, 5, 5)))
+        db.add(UserLanguage(user_id=uid, language_id=1, type="native"))
+        db.add(UserLanguage(user_id=uid, language_id=2, type="target"))
+        for iid in (1, 2, 3):
+            db.add(UserInterest(user_id=uid, interest_id=iid))
+    db.commit()
+
+
+def test_ranking_matches_the_baseline_with_ties(db, populate):
+    populate(200)
+    _add_twins(db, 1001, 8)
+    index = MatchingIndex()
+    index.rebuild(db)
+
+    tied = 0
+    for viewer in (1, 2, 3, 7, 10, 1001):
+        expected = _baseline(db, viewer, 60)
+        live = [(r["user_id"], r["score"]) for r in get_recommendations(db, viewer, limit=60)]
+        indexed = [(r["user_id"], r["score"]) for r in index.recommend(viewer, limit=60)]
+        assert live == expected
+        assert indexed == expected
+        tied += len(expected) - len({score for _, score in expected})
+    assert tied > 10  # the fixture really has ties
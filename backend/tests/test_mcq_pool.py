@@ -0,0 +1,78 @@
+import itertools
+import time
+
+import pytest
+
+from app import mcq_pool as pool_module
+from app.mcq_pool import McqPool, pool_hits, pool_misses
+
+
+@pytest.fixture
+def generated(monkeypatch):
+    """Stands in for make_mcq; lists the (language, level) of every generation."""
+    calls, n = [], itertools.count(1)
+
+    def make_mcq(language_name, target_cefr):
+        calls.append((language_name, target_cefr))
+        return {"prompt": f"{language_name} {target_cefr} #{next(n)}", "options": {"A": "a", "B": "b"}, "correct": "A"}
+
+    monkeypatch.setattr(pool_module, "make_mcq", make_mcq)
+    return calls
+
+
+def _settle(pool):
+    deadline = time.monotonic() + 5
+    while pool._refilling and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not pool._refilling
+
+
+def test_empty_pool_misses_then_refills_to_the_high_water_mark(generated):
+    pool = McqPool(low_water=2, high_water=3, workers=1)
+    hits, misses = pool_hits.value(), pool_misses.value()
+    try:
+        assert pool.take("Lang1", "B1") is None
+        assert pool_misses.value() == misses + 1
+        _settle(pool)
+
+        # the level asked for and both possible next levels
+        assert {key for key in generated} == {("Lang1", "A2"), ("Lang1", "B1"), ("Lang1", "B2")}
+        assert pool.size() == 9
+
+        q = pool.take("Lang1", "B1")
+        assert q["prompt"].startswith("Lang1 B1 ")
+        assert pool_hits.value() == hits + 1
+        assert len(generated) == 9  # 2 left for B1: at the low-water mark, no refill
+    finally:
+        pool.shutdown()
+
+
+def test_get_generates_inline_only_on_a_miss(generated):
+    pool = McqPool(low_water=1, high_water=2, workers=1)
+    misses = pool_misses.value()
+    try:
+        q = pool.get("Lang1", "C2")
+        assert q["prompt"].startswith("Lang1 C2 ")
+        assert pool_misses.value() == misses + 1
+        _settle(pool)
+
+        pooled = list(pool._queues[("Lang1", "C2")])
+        before = len(generated)
+        assert pool.get("Lang1", "C2") == pooled[0]
+        _settle(pool)
+        assert ("Lang1", "C2") not in generated[before:]  # one left: at the low-water mark
+    finally:
+        pool.shutdown()
+
+
+def test_put_keeps_the_pool_bounded(generated):
+    pool = McqPool(low_water=1, high_water=2, workers=1)
+    try:
+        q = {"prompt": "spare", "options": {"A": "a"}, "correct": "A"}
+        assert pool.put("Lang2", "B1", q)
+        assert pool.put("Lang2", "B1", q)
+        assert not pool.put("Lang2", "B1", q)
+        assert pool.size() == 2
+        assert generated == []
+    finally:
+        pool.shutdown()
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from app import mcq_speculation
+from app.mcq_pool import McqPool
+from app.mcq_speculation import Speculator, spec_hits, spec_misses, spec_recycled, spec_started
+
+
+@pytest.fixture
+def speculator(monkeypatch):
+    """A Speculator whose branches are generated by a stand-in and recycled into a private pool."""
+    pool = McqPool(low_water=0, high_water=2, workers=1)
+    fetched = []
+
+    def fetch(language_name, level):
+        fetched.append(level)
+        if level == "A1":
+            raise RuntimeError("model unavailable")
+        return {"prompt": f"{language_name} {level}", "options": {"A": "a", "B": "b"}, "correct": "A"}
+
+    monkeypatch.setattr(mcq_speculation, "_fetch", fetch)
+    monkeypatch.setattr(mcq_speculation, "mcq_pool", pool)
+    spec = Speculator(workers=2)
+    spec.pool, spec.fetched = pool, fetched
+    yield spec
+    spec.shutdown()
+    pool.shutdown()
+
+
+def test_the_answered_branch_is_served_and_the_other_recycled(speculator):
+    started, hits, recycled = spec_started.value(), spec_hits.value(), spec_recycled.value()
+
+    spec_id = speculator.speculate("Lang1", "B1")
+    assert spec_started.value() == started + 2
+    assert speculator.claim(spec_id, "B2")["prompt"] == "Lang1 B2"
+    assert spec_hits.value() == hits + 1
+
+    speculator._executor.shutdown(wait=True)  # the losing branch may still be running
+    assert spec_recycled.value() == recycled + 1
+    assert speculator.pool.take("Lang1", "A2")["prompt"] == "Lang1 A2"
+    assert sorted(speculator.fetched) == ["A2", "B2"]
+
+
+def test_async_claim(speculator):
+    hits = spec_hits.value()
+    spec_id = speculator.speculate("Lang1", "B1")
+    assert asyncio.run(speculator.aclaim(spec_id, "A2"))["prompt"] == "Lang1 A2"
+    assert spec_hits.value() == hits + 1
+
+
+def test_unknown_used_or_failed_speculations_miss(speculator):
+    misses = spec_misses.value()
+    assert speculator.claim(None, "B1") is None
+    assert speculator.claim("not-a-spec", "B1") is None
+
+    spec_id = speculator.speculate("Lang1", "B1")
+    assert speculator.claim(spec_id, "B2") is not None
+    assert speculator.claim(spec_id, "B2") is None  # already claimed
+
+    spec_id = speculator.speculate("Lang1", "A2")  # the A1 branch fails
+    assert speculator.claim(spec_id, "A1") is None
+    assert spec_misses.value() == misses + 4
+
+
+def test_levels_the_bank_can_serve_are_not_generated(speculator):
+    assert speculator.speculate("Lang1", "B1", skip=("A2", "B2")) is None
+    spec_id = speculator.speculate("Lang1", "B1", skip=("A2",))
+    assert speculator.claim(spec_id, "B2") is not None
+    assert speculator.fetched == ["B2"]
+
+
+def test_release_recycles_every_branch(speculator):
+    recycled = spec_recycled.value()
+    spec_id = speculator.speculate("Lang2", "B1")
+    speculator.release(spec_id)
+    speculator._executor.shutdown(wait=True)
+
+    assert spec_recycled.value() == recycled + 2
+    assert speculator.pool.size() == 2
@@ -0,0 +1,79 @@
+import asyncio
+import re
+import uuid
+
+from app.metrics import Counter, Histogram
+from test_assessment_writing import TEXT
+
+_SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[^"}]|"(?:[^"\\]|\\.)*")*\})? (\S+)$')
+
+
+def _scrape(client):
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = {}
+    for line in r.text.splitlines():
+        if line.startswith("#"):
+            assert re.match(r"^# (HELP \S+ .+|TYPE \S+ (counter|gauge|histogram))$", line), line
+            continue
+        m = _SAMPLE.match(line)
+        assert m, f"not a sample line: {line!r}"
+        samples[m.group(1) + (m.group(2) or "")] = float(m.group(3))
+    return samples
+
+
+def test_requests_are_recorded_by_route_template(client, populate):
+    populate(10)
+    route = 'method="GET",route="/assessment/ai/grading/{job_id}"'
+    before = _scrape(client)
+
+    assert client.get("/assessment/ai/grading/424242").status_code == 404
+    assert client.get("/no/such/path").status_code == 404
+    assert client.post("/matching/recommend", json={"user_id": 1}).status_code == 200
+    after = _scrape(client)
+
+    def delta(key):
+        return after.get(key, 0) - before.get(key, 0)
+
+    assert delta(f"fluentz_http_request_seconds_count{{{route}}}") == 1
+    assert delta(f'fluentz_http_responses_total{{{route},status="404"}}') == 1
+    assert delta('fluentz_http_responses_total{method="GET",route="unmatched",status="404"}') == 1
+    assert not [k for k in after if "424242" in k or "/no/such/path" in k]
+
+    # the matching request's DB work is attributed to it
+    assert delta('fluentz_http_request_db_statements_count{route="/matching/recommend"}') == 1
+    assert delta('fluentz_http_request_db_statements_sum{route="/matching/recommend"}') >= 1
+    assert delta("fluentz_db_statements_total") >= 1
+    assert after["fluentz_http_requests_in_flight"] == 1  # the scrape itself
+
+
+def test_ai_test_calls_are_timed_by_source(client, fake_llm):
+    from app.ai_test import agrade_writing
+
+    args = ("Lang1", "B1", f"Describe a trip you enjoyed. ({uuid.uuid4().hex})", TEXT)
+    before = _scrape(client)
+    asyncio.run(agrade_writing(*args))
+    asyncio.run(agrade_writing(*args))
+    after = _scrape(client)
+
+    for source in ("model", "cache"):
+        key = f'fluentz_ai_call_seconds_count{{fn="grade_writing",source="{source}"}}'
+        assert after[key] - before.get(key, 0) == 1
+
+
+def test_histogram_exposition():
+    h = Histogram("fluentz_test_histogram_seconds", "test", labels=("route",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 5.0):
+        h.observe(v, route='/a "b"')
+    c = Counter("fluentz_test_total", "test")
+    c.inc(2)
+
+    assert h.render()[2:] == [
+        'fluentz_test_histogram_seconds_bucket{route="/a \\"b\\"",le="0.1"} 1',
+        'fluentz_test_histogram_seconds_bucket{route="/a \\"b\\"",le="1"} 2',
+        'fluentz_test_histogram_seconds_bucket{route="/a \\"b\\"",le="+Inf"} 3',
+        'fluentz_test_histogram_seconds_sum{route="/a \\"b\\""} 5.55',
+        'fluentz_test_histogram_seconds_count{route="/a \\"b\\""} 3',
+    ]
+    assert c.render() == ["# HELP fluentz_test_total test", "# TYPE fluentz_test_total counter", "fluentz_test_total 2"]
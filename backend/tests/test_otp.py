@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import main
+from app.models import EmailOtpCode, User
+from app.otp import OTP_RESEND_COOLDOWN_SECONDS, purge_expired
+
+
+@pytest.fixture
+def sent(client, db, populate, monkeypatch):
+    """Users 1-3 awaiting verification; lists the codes mailed out."""
+    populate(3)
+    for user in db.query(User):
+        user.is_email_verified = False
+        user.onboarding_status = "registered"
+    db.commit()
+    codes = []
+    monkeypatch.setattr(main, "send_otp_email", lambda email, otp: codes.append(otp))
+    return codes
+
+
+def _resend(client):
+    return client.post("/auth/resend-otp", json={"email": "u1@example.com"})
+
+
+def _rows(db, user_id=1):
+    db.expire_all()
+    return db.query(EmailOtpCode).filter(EmailOtpCode.user_id == user_id).all()
+
+
+def test_resend_is_refused_during_the_cooldown(client, db, sent):
+    assert _resend(client).status_code == 200
+    r = _resend(client)
+    assert r.status_code == 429
+    assert 1 <= int(r.headers["Retry-After"]) <= OTP_RESEND_COOLDOWN_SECONDS
+    assert len(sent) == 1
+    assert len(_rows(db)) == 1
+
+
+def test_resend_after_the_cooldown_overwrites_the_row(client, db, sent):
+    assert _resend(client).status_code == 200
+    [row] = _rows(db)
+    row.created_at = datetime.utcnow() - timedelta(seconds=OTP_RESEND_COOLDOWN_SECONDS + 1)
+    first_id = row.id
+    db.commit()
+
+    assert _resend(client).status_code == 200
+    [row] = _rows(db)
+    assert row.id == first_id
+    assert len(sent) == 2
+
+    if sent[0] != sent[1]:  # the replaced code no longer works
+        r = client.post("/auth/verify-otp", json={"email": "u1@example.com", "otp": sent[0]})
+        assert r.status_code == 400
+    r = client.post("/auth/verify-otp", json={"email": "u1@example.com", "otp": sent[1]})
+    assert r.status_code == 200, r.text
+    assert _rows(db) == []  # verified codes are deleted
+
+
+def test_purge_deletes_expired_and_used_codes_in_batches(client, db, sent):
+    now = datetime.utcnow()
+    db.add_all([
+        EmailOtpCode(user_id=1, otp_hash="a", expires_at=now - timedelta(minutes=1), created_at=now),
+        EmailOtpCode(user_id=2, otp_hash="b", expires_at=now + timedelta(minutes=5), used_at=now, created_at=now),
+        EmailOtpCode(user_id=3, otp_hash="c", expires_at=now + timedelta(minutes=5), created_at=now),
+    ])
+    db.commit()
+
+    assert client.portal.call(purge_expired, 1) == 2
+    assert [r.user_id for r in _rows(db, 3)] == [3]
+    assert _rows(db, 1) == [] and _rows(db, 2) == []
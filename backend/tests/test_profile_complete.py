@@ -0,0 +1,71 @@
+import pytest
+
+from app import main
+from app.matching_index import MatchingIndex
+from app.models import LearnerProfile, UserInterest, UserLanguage
+
+
+@pytest.fixture
+def learner(client, db, populate, monkeypatch):
+    """User 1 speaks 2, learns 1 and has interests 1-3; their native row carries a level."""
+    populate(3)
+    monkeypatch.setattr(main, "matching_index", MatchingIndex())
+    db.query(UserLanguage).filter(UserLanguage.user_id == 1, UserLanguage.type == "target",
+                                  UserLanguage.language_id != 1).delete()
+    db.query(UserInterest).filter(UserInterest.user_id == 1).delete()
+    db.add_all([UserInterest(user_id=1, interest_id=i) for i in (1, 2, 3)])
+    db.get(UserLanguage, (1, 2, "native")).proficiency_level = "advanced"
+    db.commit()
+
+
+def _complete(client, count_statements, **changes):
+    body = dict(user_id=1, date_of_birth="1991-02-03", gender="female", native_language_id=2,
+                target_language_ids=[1], interest_ids=[1, 2, 3])
+    body.update(changes)
+    with count_statements() as statements:
+        r = client.post("/profile/complete", json=body)
+    assert r.status_code == 200, r.text
+    return [s.split()[0].upper() + " " + _table(s) for s in statements]
+
+
+def _table(statement):
+    for name in ("learner_profile", "user_languages", "user_interests"):
+        if name in statement:
+            return name
+    return ""
+
+
+def _stored(db):
+    db.expire_all()
+    languages = {(l.language_id, l.type): l.proficiency_level for l in db.query(UserLanguage).filter_by(user_id=1)}
+    interests = {i.interest_id for i in db.query(UserInterest).filter_by(user_id=1)}
+    return languages, interests
+
+
+def test_only_the_difference_is_written(client, db, learner, count_statements):
+    writes = _complete(client, count_statements, target_language_ids=[1, 3], interest_ids=[2, 3, 4, 5])
+
+    languages, interests = _stored(db)
+    assert languages == {(2, "native"): "advanced", (1, "target"): None, (3, "target"): None}
+    assert interests == {2, 3, 4, 5}
+    assert db.get(LearnerProfile, 1).gender == "female"
+
+    assert writes.count("INSERT learner_profile") == 1  # the upsert
+    assert writes.count("INSERT user_languages") == 1
+    assert "DELETE user_languages" not in writes
+    assert writes.count("DELETE user_interests") == 1
+    assert writes.count("INSERT user_interests") == 1
+
+
+def test_statement_count_does_not_grow_with_the_change(client, db, learner, count_statements):
+    def link_writes(statements):
+        return sorted(w for w in statements if w.endswith(("user_languages", "user_interests"))
+                      and w.split()[0] in ("INSERT", "DELETE", "UPDATE"))
+
+    assert link_writes(_complete(client, count_statements)) == []
+    assert link_writes(_complete(client, count_statements, interest_ids=[1, 2, 3, 4])) == ["INSERT user_interests"]
+
+    # 26 rows change, still one statement per kind
+    large = _complete(client, count_statements, interest_ids=list(range(5, 25)), fluent_language_ids=[3, 4])
+    assert link_writes(large) == ["DELETE user_interests", "INSERT user_interests", "INSERT user_languages"]
+    assert _stored(db)[1] == set(range(5, 25))
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+from sqlalchemy import or_, select, text, update
+
+from app.matching_service import _candidate_ids_query
+from app.models import EmailOtpCode
+
+# EXPLAIN QUERY PLAN on the test database (SQLite): no table is scanned and
+# the expected index is picked. MySQL chooses its own plans, but a query that
+# no longer matches an index shows up here as a SCAN.
+
+
+def _plan(db, stmt):
+    sql = str(stmt.compile(dialect=db.bind.dialect, compile_kwargs={"literal_binds": True}))
+    return [row[-1] for row in db.execute(text("EXPLAIN QUERY PLAN " + sql)).all()]
+
+
+def _assert_searches(plan, index):
+    assert plan, "empty plan"
+    assert not [step for step in plan if step.startswith("SCAN")], plan
+    assert any(f"INDEX {index} " in step for step in plan), plan
+
+
+def test_candidate_query_uses_the_language_index(db, populate):
+    populate(40)
+    plan = _plan(db, _candidate_ids_query(1, 1, 2))
+    _assert_searches(plan, "ix_user_languages_type_language")
+
+
+def test_otp_lookups_use_the_user_index(db):
+    _assert_searches(_plan(db, select(EmailOtpCode).where(EmailOtpCode.user_id == 3)), "ux_email_otp_codes_user")
+    # the resend overwrite in otp.issue_otp
+    overwrite = (
+        update(EmailOtpCode)
+        .where(EmailOtpCode.user_id == 3)
+        .where(or_(EmailOtpCode.created_at <= datetime.utcnow(), EmailOtpCode.used_at.is_not(None)))
+        .values(attempts_left=5)
+    )
+    _assert_searches(_plan(db, overwrite), "ux_email_otp_codes_user")
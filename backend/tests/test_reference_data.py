@@ -0,0 +1,47 @@
+import json
+
+from app.matching_index import matching_index
+from app.models import Interest, Language
+from app.reference_data import ReferenceCatalog, reference_catalog, refresh_reference_catalog
+
+
+def test_other_workers_pick_up_a_reload(db, populate):
+    populate(5)
+    worker_a, worker_b = ReferenceCatalog(), ReferenceCatalog()
+    worker_a.reload(db)
+    worker_b.reload(db)
+    version = worker_b.version()
+
+    db.add(Language(id=50, code="xh", name="Xhosa"))
+    db.commit()
+    worker_a.reload(db)  # POST /meta/reload landed on worker a
+    assert worker_b.languages_response() != worker_a.languages_response()
+
+    # worker b's periodic sync
+    assert worker_b.reload(db, only_if_changed=True)
+    assert worker_b.languages_response() == worker_a.languages_response()
+    assert not worker_b.reload(db, only_if_changed=True)
+    assert worker_b.version() == version + 1
+
+
+def test_sync_updates_the_matching_index_names(db, populate):
+    populate(5)
+    db.get(Interest, 1).name = "Board games"
+    db.commit()
+
+    assert refresh_reference_catalog()
+    assert reference_catalog.interest_names([1]) == {1: "Board games"}
+    assert matching_index._interest_names[1] == "Board games"
+
+
+def test_names_sort_like_the_database_collation(db, populate):
+    populate(5)
+    names = ["Zulu", "Árabe", "english", "alemán", "Éwé"]
+    db.add_all([Language(id=60 + i, code=f"c{i}", name=n) for i, n in enumerate(names)])
+    db.commit()
+
+    catalog = ReferenceCatalog()
+    catalog.reload(db)
+    body, _ = catalog.languages_response()
+    listed = [l["name"] for l in json.loads(body) if l["name"] in names]
+    assert listed == ["alemán", "Árabe", "english", "Éwé", "Zulu"]
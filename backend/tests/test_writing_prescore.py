@@ -0,0 +1,27 @@
+import pytest
+
+from app.writing_prescore import prescore
+
+PROMPT = "Describe your last holiday."
+
+
+@pytest.mark.parametrize("code, text", [
+    ("hy", "Անցյալ ամառ ես գնացի ծով ընտանիքիս հետ և շատ լողացի"),
+    ("ka", "გასულ ზაფხულს ოჯახთან ერთად ზღვაზე წავედი და ბევრი ვიცურავე"),
+    ("bn", "গত গ্রীষ্মে আমি পরিবারের সাথে সমুদ্রে গিয়েছিলাম এবং অনেক সাঁতার কেটেছি"),
+    ("sr", "Prošlog leta sam sa porodicom otišao na more i mnogo sam plivao"),
+    ("sr", "Прошлог лета сам са породицом отишао на море и много сам пливао"),
+    ("xx", "Some text in a language the pre-scorer knows nothing about at all"),
+])
+def test_scripts_it_does_not_know_go_to_the_model(code, text):
+    assert prescore(code, PROMPT, text, 5, 100) is None
+
+
+@pytest.mark.parametrize("code, text", [
+    ("en", "Прошлым летом я ездил на море с семьей и много плавал"),
+    ("ru", "Last summer I went to the seaside with my family and swam a lot"),
+    ("hy", "Last summer I went to the seaside with my family and swam a lot"),
+])
+def test_wrong_script_scores_zero(code, text):
+    g = prescore(code, PROMPT, text, 5, 100)
+    assert g is not None and g["score"] == 0
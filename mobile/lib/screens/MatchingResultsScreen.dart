@@ -17,8 +17,13 @@ class MatchingResultsScreen extends StatefulWidget {
 class _MatchingResultsScreenState extends State<MatchingResultsScreen> {
   static const int _backendPort = 8000;
 
+  static const int _pageSize = 20;
+
   bool _loading = true;
+  bool _loadingMore = false;
+  String? _nextCursor;
   List<Map<String, dynamic>> _matches = [];
+  final _scrollCtrl = ScrollController();
 
   String _baseUrl() {
     if (kIsWeb) return "http://127.0.0.1:$_backendPort";
@@ -40,38 +45,65 @@ class _MatchingResultsScreenState extends State<MatchingResultsScreen> {
   @override
   void initState() {
     super.initState();
+    _scrollCtrl.addListener(_onScroll);
     _loadMatches();
   }
 
+  @override
+  void dispose() {
+    _scrollCtrl.dispose();
+    super.dispose();
+  }
+
+  void _onScroll() {
+    if (_nextCursor == null || _loading || _loadingMore) return;
+    if (_scrollCtrl.position.extentAfter < 300) _loadMore();
+  }
+
+  Future<Map<String, dynamic>?> _fetchPage(String? cursor) async {
+    final url = Uri.parse("${_baseUrl()}/matching/recommend");
+    final res = await http.post(
+      url,
+      headers: const {"Content-Type": "application/json"},
+      body: jsonEncode({
+        "user_id": widget.userId,
+        "limit": _pageSize,
+        if (cursor != null) "cursor": cursor,
+      }),
+    );
+
+    if (!mounted) return null;
+
+    if (res.statusCode != 200) {
+      showAuthError(context,
+          _extractDetail(res.body, fallback: "Failed to load matches"));
+      return null;
+    }
+
+    return jsonDecode(res.body) as Map<String, dynamic>;
+  }
+
+  List<Map<String, dynamic>> _parseMatches(Map<String, dynamic> data) {
+    final list = (data["recommended_matches"] as List?) ?? [];
+    return list
+        .whereType<Map>()
+        .map((e) => e.map((k, v) => MapEntry(k.toString(), v)))
+        .cast<Map<String, dynamic>>()
+        .toList();
+  }
+
   Future<void> _loadMatches() async {
     setState(() => _loading = true);
 
     try {
-      final url = Uri.parse("${_baseUrl()}/matching/recommend");
-      final res = await http.post(
-        url,
-        headers: const {"Content-Type": "application/json"},
-        body: jsonEncode({"user_id": widget.userId}),
-      );
-
+      final data = await _fetchPage(null);
       if (!mounted) return;
 
-      if (res.statusCode != 200) {
-        showAuthError(context,
-            _extractDetail(res.body, fallback: "Failed to load matches"));
-        setState(() => _loading = false);
-        return;
+      if (data != null) {
+        _matches = _parseMatches(data);
+        _nextCursor = data["next_cursor"]?.toString();
       }
 
-      final data = jsonDecode(res.body) as Map<String, dynamic>;
-      final list = (data["recommended_matches"] as List?) ?? [];
-
-      _matches = list
-          .whereType<Map>()
-          .map((e) => e.map((k, v) => MapEntry(k.toString(), v)))
-          .cast<Map<String, dynamic>>()
-          .toList();
-
       setState(() => _loading = false);
     } catch (_) {
       if (!mounted) return;
@@ -81,6 +113,27 @@ class _MatchingResultsScreenState extends State<MatchingResultsScreen> {
     }
   }
 
+  Future<void> _loadMore() async {
+    setState(() => _loadingMore = true);
+
+    try {
+      final data = await _fetchPage(_nextCursor);
+      if (!mounted) return;
+
+      if (data != null) {
+        _matches.addAll(_parseMatches(data));
+        _nextCursor = data["next_cursor"]?.toString();
+      }
+
+      setState(() => _loadingMore = false);
+    } catch (_) {
+      if (!mounted) return;
+      setState(() => _loadingMore = false);
+      showAuthError(
+          context, "Cannot reach server. Make sure backend is running.");
+    }
+  }
+
   @override
   Widget build(BuildContext context) {
     return Scaffold(
@@ -114,10 +167,13 @@ class _MatchingResultsScreenState extends State<MatchingResultsScreen> {
                   ),
                 )
               : ListView.separated(
+                  controller: _scrollCtrl,
                   padding: const EdgeInsets.all(16),
-                  itemCount: _matches.length,
+                  itemCount: _matches.length + (_loadingMore ? 1 : 0),
                   separatorBuilder: (_, __) => const SizedBox(height: 12),
-                  itemBuilder: (_, i) => _MatchCard(m: _matches[i]),
+                  itemBuilder: (_, i) => i < _matches.length
+                      ? _MatchCard(m: _matches[i])
+                      : const Center(child: CircularProgressIndicator()),
                 ),
     );
   }
@@ -24,6 +24,8 @@ class AiAssessmentScreen extends StatefulWidget {
 
 class _AiAssessmentScreenState extends State<AiAssessmentScreen> {
   static const int _backendPort = 8000;
+  static const Duration _gradingPollInterval = Duration(seconds: 2);
+  static const int _gradingPollAttempts = 90;
 
   bool _loading = false;
 
@@ -267,7 +269,20 @@ class _AiAssessmentScreenState extends State<AiAssessmentScreen> {
         return;
       }
 
-      _finalResult = jsonDecode(res.body) as Map<String, dynamic>;
+      // grading runs in the background; poll the job until it finishes
+      // (texts that need no model call come back already graded)
+      final submitted = jsonDecode(res.body) as Map<String, dynamic>;
+      final result = submitted["status"] == "done"
+          ? submitted["result"] as Map<String, dynamic>
+          : await _pollGrading(submitted["job_id"].toString());
+      if (!mounted) return;
+
+      if (result == null) {
+        setState(() => _loading = false);
+        return;
+      }
+
+      _finalResult = result;
       setState(() => _loading = false);
     } catch (_) {
       if (!mounted) return;
@@ -276,6 +291,45 @@ class _AiAssessmentScreenState extends State<AiAssessmentScreen> {
     }
   }
 
+  Future<Map<String, dynamic>?> _pollGrading(String jobId) async {
+    final url = Uri.parse("${_baseUrl()}/assessment/ai/grading/$jobId");
+
+    for (var attempt = 0; attempt < _gradingPollAttempts; attempt++) {
+      await Future.delayed(_gradingPollInterval);
+      if (!mounted) return null;
+
+      final http.Response res;
+      try {
+        res = await http.get(url);
+      } catch (_) {
+        continue; // flaky network: keep polling
+      }
+      if (!mounted) return null;
+
+      if (res.statusCode != 200) {
+        showAuthError(context,
+            _extractDetail(res.body, fallback: "Failed to get your result"));
+        return null;
+      }
+
+      final data = jsonDecode(res.body) as Map<String, dynamic>;
+      if (data["status"] == "done") {
+        return data["result"] as Map<String, dynamic>;
+      }
+      if (data["status"] == "failed") {
+        showAuthError(context,
+            (data["detail"] ?? "Grading failed. Please try again.").toString());
+        return null;
+      }
+    }
+
+    if (mounted) {
+      showAuthError(
+          context, "Grading is taking longer than usual. Please try again.");
+    }
+    return null;
+  }
+
   @override
   Widget build(BuildContext context) {
     final isDone = _finalResult != null;